@@ -0,0 +1,169 @@
+"""
+Streaming exports of referral relationships and commissions for payout audits.
+
+Rows are produced by generators over ``QuerySet.iterator(chunk_size=...)`` (or
+key-paged Realtime Database reads) and written straight into a
+``StreamingHttpResponse``, so memory stays flat however many rows there are
+and the header row goes out before the first query finishes.
+"""
+import csv
+import json
+import logging
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from myproject.models import ReferralCommission, UserProfile
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the value instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def parse_date_range(start, end):
+    """Turn ``YYYY-MM-DD`` strings into an aware ``[start, end)`` datetime range.
+
+    Either bound may be empty. The end date is inclusive. Raises
+    ``ValueError`` on malformed dates.
+    """
+    tz = timezone.get_current_timezone()
+    start_at = end_at = None
+    if start:
+        start_at = timezone.make_aware(datetime.combine(datetime.strptime(start, '%Y-%m-%d').date(), time.min), tz)
+    if end:
+        end_at = timezone.make_aware(
+            datetime.combine(datetime.strptime(end, '%Y-%m-%d').date() + timedelta(days=1), time.min), tz
+        )
+    return start_at, end_at
+
+
+def _filter_range(queryset, field, start_at, end_at):
+    if start_at:
+        queryset = queryset.filter(**{f'{field}__gte': start_at})
+    if end_at:
+        queryset = queryset.filter(**{f'{field}__lt': end_at})
+    return queryset
+
+
+def commission_rows(start_at=None, end_at=None):
+    """Yield one tuple per ``ReferralCommission``, oldest first."""
+    queryset = _filter_range(ReferralCommission.objects.all(), 'date_earned', start_at, end_at)
+    yield from (
+        queryset.order_by('id')
+        .values_list(
+            'id', 'date_earned', 'referrer__username', 'referred_user__username', 'investment_id',
+            'commission_type', 'level', 'commission_rate', 'commission_amount',
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+COMMISSION_COLUMNS = (
+    'id', 'date_earned', 'referrer', 'referred_user', 'investment_id',
+    'commission_type', 'level', 'commission_rate', 'commission_amount',
+)
+
+
+def referral_rows(start_at=None, end_at=None):
+    """Yield one tuple per ``UserProfile`` that has a referrer."""
+    queryset = _filter_range(
+        UserProfile.objects.filter(referred_by__isnull=False), 'date_joined', start_at, end_at
+    )
+    yield from (
+        queryset.order_by('id')
+        .values_list('user__username', 'referral_code', 'referred_by__username', 'date_joined')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+REFERRAL_COLUMNS = ('username', 'referral_code', 'referred_by', 'date_joined')
+
+
+def referral_code_rows(start_at=None, end_at=None, page_size=EXPORT_CHUNK_SIZE):
+    """Yield one tuple per Realtime Database ``referral_codes`` entry.
+
+    Reads the node a page at a time ordered by key; the date range is
+    applied to each entry's ``created_at``.
+    """
+    from myproject.firebase_app import get_database_reference
+    from myproject.firebase_index import REFERRAL_CODES_NODE
+
+    codes_ref = get_database_reference(REFERRAL_CODES_NODE)
+    last_key = None
+    while True:
+        query = codes_ref.order_by_key()
+        if last_key is not None:
+            query = query.start_at(last_key)
+        page = query.limit_to_first(page_size + (1 if last_key is not None else 0)).get() or {}
+        page.pop(last_key, None)
+        if not page:
+            return
+
+        for code, entry in page.items():
+            if not isinstance(entry, dict):
+                continue
+            created_at = entry.get('created_at') or ''
+            if start_at or end_at:
+                try:
+                    created = datetime.fromisoformat(str(created_at).replace('Z', '+00:00'))
+                    if timezone.is_naive(created):
+                        created = timezone.make_aware(created)
+                except ValueError:
+                    continue
+                if (start_at and created < start_at) or (end_at and created >= end_at):
+                    continue
+            yield (
+                code, entry.get('firebase_key', ''), entry.get('username', ''),
+                entry.get('phone_number', ''), created_at,
+            )
+        last_key = list(page)[-1]
+
+
+REFERRAL_CODE_COLUMNS = ('referral_code', 'firebase_key', 'username', 'phone_number', 'created_at')
+
+
+# dataset name -> (row generator, column names)
+EXPORT_DATASETS = {
+    'commissions': (commission_rows, COMMISSION_COLUMNS),
+    'referrals': (referral_rows, REFERRAL_COLUMNS),
+    'referral_codes': (referral_code_rows, REFERRAL_CODE_COLUMNS),
+}
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is None:
+        return ''
+    return str(value) if not isinstance(value, (int, float, str)) else value
+
+
+def stream_csv(rows, columns):
+    """Yield CSV-encoded lines: the header first, then one line per row."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_cell(value) for value in row])
+
+
+def stream_ndjson(rows, columns):
+    """Yield one JSON object per line."""
+    for row in rows:
+        yield json.dumps(dict(zip(columns, (_cell(value) for value in row))), ensure_ascii=False) + '\n'
+
+
+def stream_export(dataset, export_format, start_at=None, end_at=None):
+    """Return a generator of encoded chunks for ``dataset`` in ``export_format``."""
+    row_generator, columns = EXPORT_DATASETS[dataset]
+    rows = row_generator(start_at, end_at)
+    if export_format == 'ndjson':
+        return stream_ndjson(rows, columns)
+    return stream_csv(rows, columns)
@@ -0,0 +1,188 @@
+"""
+Paged listing and cached count of Firebase users for the admin dashboard.
+
+Users live in the Firestore ``users`` collection and the Realtime Database
+``users`` node, both keyed by the Firebase key. ``firebase_user_page()``
+reads one key-ordered page from each source after a cursor and merges
+them. Firestore wins when both sources hold the same key, and a set of
+phone numbers drops duplicates within the page.
+
+``firebase_user_count()`` serves the total from the cache and refreshes it
+on a background thread once it is older than
+``ADMIN_FIREBASE_COUNT_REFRESH`` seconds. The count is the union of
+key-only reads: a shallow RTDB read and Firestore document references.
+No user record is downloaded.
+
+While the ``FirebaseProfile`` mirror of RTDB ``users`` is fresh (see
+``myproject.firebase_mirror``), RTDB pages, the count and ``search`` are
+indexed SQL queries on it instead. The count then covers RTDB users only.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+FIREBASE_USERS_PAGE_SIZE = 50
+MAX_FIREBASE_USERS_PAGE_SIZE = 200
+USERS_NODE = 'users'
+COUNT_CACHE_KEY = 'admindashboard:firebase_user_count'
+# The cached count is kept well past its refresh age so a failed refresh
+# still leaves the last known value on the dashboard
+COUNT_CACHE_TTL = 24 * 60 * 60
+
+_refreshing = threading.Lock()
+
+
+def _firestore_page(cursor, limit):
+    from myproject.firebase_app import get_firestore_client
+
+    query = get_firestore_client().collection(USERS_NODE).order_by('__name__')
+    if cursor:
+        query = query.start_after({'__name__': cursor})
+    return {doc.id: doc.to_dict() or {} for doc in query.limit(limit).stream()}
+
+
+def _realtime_page(cursor, limit):
+    from myproject.firebase_app import get_database_reference
+
+    query = get_database_reference(USERS_NODE).order_by_key()
+    if cursor:
+        query = query.start_at(cursor)
+    page = query.limit_to_first(limit + (1 if cursor else 0)).get() or {}
+    page.pop(cursor, None)
+    return {key: value for key, value in page.items() if isinstance(value, dict)}
+
+
+def _mirror_page(cursor, limit, search=None):
+    from myproject.models import FirebaseProfile
+
+    profiles = FirebaseProfile.objects.order_by('firebase_uid')
+    if cursor:
+        profiles = profiles.filter(firebase_uid__gt=cursor)
+    if search:
+        profiles = profiles.filter(
+            Q(phone_number__startswith=search) | Q(referral_code=search)
+            | Q(email__istartswith=search) | Q(display_name__istartswith=search)
+        )
+    return {
+        profile.firebase_uid: {
+            'username': profile.display_name,
+            'phone_number': profile.phone_number,
+            'email': profile.email,
+            'referral_code': profile.referral_code,
+            'balance': profile.balance,
+            'created_at': profile.date_joined,
+        }
+        for profile in profiles[:limit]
+    }
+
+
+def _use_mirror():
+    from myproject.firebase_mirror import mirror_is_fresh
+
+    try:
+        return mirror_is_fresh()
+    except Exception as e:
+        logger.warning(f"Could not check the Firebase user mirror: {e}")
+        return False
+
+
+def firebase_user_page(cursor=None, page_size=FIREBASE_USERS_PAGE_SIZE, search=None):
+    """Return ``(users, next_cursor)`` for the page of keys after ``cursor``.
+
+    ``next_cursor`` is None on the last page. Each user dict carries its
+    key as ``id`` and ``source`` ('firestore' or 'realtime'). ``search``
+    (a phone or referral code, or the start of an email or name) is only
+    served from the mirror; without a fresh mirror it returns no users.
+    """
+    page_size = min(max(int(page_size), 1), MAX_FIREBASE_USERS_PAGE_SIZE)
+    # One extra key from each source tells whether another page follows
+    fetch = page_size + 1
+    mirrored = _use_mirror()
+    if search and not mirrored:
+        return [], None
+    sources = []
+    if not search:
+        try:
+            sources.append(('firestore', _firestore_page(cursor, fetch)))
+        except Exception as e:
+            logger.warning(f"Could not page Firestore users: {e}")
+    try:
+        if mirrored:
+            sources.append(('realtime', _mirror_page(cursor, fetch, search)))
+        else:
+            sources.append(('realtime', _realtime_page(cursor, fetch)))
+    except Exception as e:
+        logger.warning(f"Could not page Realtime Database users: {e}")
+
+    merged = {}
+    for source, records in sources:
+        for key, record in records.items():
+            if key not in merged:
+                merged[key] = dict(record, id=key, source=source)
+
+    # Every key past either source's window sorts after ``page_size`` others,
+    # so the first ``page_size`` merged keys are complete
+    keys = sorted(merged)
+    users = []
+    seen_phones = set()
+    for key in keys[:page_size]:
+        user = merged[key]
+        phone = user.get('phone_number')
+        if phone and phone in seen_phones:
+            continue
+        if phone:
+            seen_phones.add(phone)
+        user.pop('password', None)
+        user.pop('transactions', None)
+        users.append(user)
+    next_cursor = keys[page_size - 1] if len(keys) > page_size else None
+    return users, next_cursor
+
+
+def count_firebase_users():
+    """Count distinct Firebase user keys across both sources without reading records."""
+    from myproject.firebase_app import get_database_reference, get_firestore_client
+
+    keys = set()
+    keys.update(get_database_reference(USERS_NODE).get(shallow=True) or {})
+    keys.update(ref.id for ref in get_firestore_client().collection(USERS_NODE).list_documents())
+    return len(keys)
+
+
+def refresh_firebase_user_count():
+    """Recount and cache the total; return it, or None if a refresh is already running."""
+    if not _refreshing.acquire(blocking=False):
+        return None
+    try:
+        count = count_firebase_users()
+        cache.set(COUNT_CACHE_KEY, {'count': count, 'refreshed_at': time.time()}, COUNT_CACHE_TTL)
+        return count
+    except Exception as e:
+        logger.warning(f"Could not count Firebase users: {e}")
+        return None
+    finally:
+        _refreshing.release()
+
+
+def firebase_user_count():
+    """Return the cached Firebase user count, refreshing it in the background when stale.
+
+    Only the very first call, with nothing cached yet, counts inline.
+    While the mirror is fresh, the count is a SQL count of RTDB users.
+    """
+    if _use_mirror():
+        from myproject.models import FirebaseProfile
+        return FirebaseProfile.objects.count()
+    cached = cache.get(COUNT_CACHE_KEY)
+    if cached is None:
+        return refresh_firebase_user_count() or 0
+    stale = time.time() - cached['refreshed_at'] > getattr(settings, 'ADMIN_FIREBASE_COUNT_REFRESH', 300)
+    if stale and not _refreshing.locked():
+        threading.Thread(target=refresh_firebase_user_count, name='firebase-user-count', daemon=True).start()
+    return cached['count']
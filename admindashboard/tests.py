@@ -1,3 +1,66 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from myproject.firebase_app import get_database_reference, get_firestore_client
+from myproject.firebase_fake import get_fake_firebase
+from myproject.firebase_mirror import UserMirror
+
+from .firebase_users import COUNT_CACHE_KEY, firebase_user_count, firebase_user_page
+
+
+@override_settings(FIREBASE_FAKE=True)
+class FirebaseUserListingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fake = get_fake_firebase()
+        self.fake.reset()
+        self.fake.configure()
+        users = get_database_reference('users')
+        for key in ('1', '3', '5', '6'):
+            users.child(key).set({'phone_number': f'+{key}', 'password': 'hash'})
+        client = get_firestore_client()
+        for key in ('2', '3', '4'):
+            client.document(f'users/{key}').set({'phone_number': f'+{key}'})
+        # Same phone as RTDB user 6 under another key
+        client.document('users/7').set({'phone_number': '+6'})
+
+    def test_pages_merge_both_sources_by_key(self):
+        pages = []
+        cursor = None
+        while True:
+            users, cursor = firebase_user_page(cursor, page_size=3)
+            pages.append([(user['id'], user['source']) for user in users])
+            if cursor is None:
+                break
+        self.assertEqual(pages, [
+            [('1', 'realtime'), ('2', 'firestore'), ('3', 'firestore')],
+            [('4', 'firestore'), ('5', 'realtime'), ('6', 'realtime')],
+            [('7', 'firestore')],
+        ])
+
+    def test_duplicate_phones_are_dropped_within_a_page(self):
+        users, cursor = firebase_user_page(page_size=10)
+        self.assertIsNone(cursor)
+        self.assertEqual([user['id'] for user in users], ['1', '2', '3', '4', '5', '6'])
+        self.assertNotIn('password', users[0])
+
+    def test_count_is_cached(self):
+        self.assertEqual(firebase_user_count(), 7)
+        calls = sum(self.fake.calls.values())
+        self.assertEqual(firebase_user_count(), 7)
+        self.assertEqual(sum(self.fake.calls.values()), calls)
+        self.assertEqual(cache.get(COUNT_CACHE_KEY)['count'], 7)
+
+    def test_a_fresh_mirror_serves_realtime_users_from_sql(self):
+        mirror = UserMirror()
+        mirror.handle_event('put', '/', get_database_reference('users').get())
+        mirror.flush()
+        get_database_reference('users/8').set({'phone_number': '+8'})
+        calls = self.fake.calls['rtdb.query']
+        users, cursor = firebase_user_page(page_size=10)
+        self.assertEqual([user['id'] for user in users], ['1', '2', '3', '4', '5', '6'])
+        self.assertEqual(self.fake.calls['rtdb.query'], calls)
+        self.assertEqual(firebase_user_count(), 4)
+
+        users, cursor = firebase_user_page(search='+5')
+        self.assertEqual([(user['id'], user['source']) for user in users], [('5', 'realtime')])
@@ -11,4 +11,7 @@ urlpatterns = [
     path('deposits/', views.admin_deposits, name='deposits'),
     path('withdrawals/', views.admin_withdrawals, name='withdrawals'),
     path('transactions/', views.admin_transactions, name='transactions'),
+    path('export/', views.admin_export, name='export'),
+    path('middleware-timing/', views.admin_middleware_timing, name='middleware_timing'),
+    path('firebase-clients/', views.admin_firebase_clients, name='firebase_clients'),
 ]
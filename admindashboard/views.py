@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.models import User
 from django.db.models import Sum, Count, Q
 from myproject.models import Investment, Transaction, UserProfile, DailyPayout
@@ -7,9 +8,14 @@ from datetime import timedelta
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
+from django.conf import settings
 import os
 import json
 
+from myproject.middleware_timing import timing_stats
+from .exports import EXPORT_DATASETS, EXPORT_FORMATS, parse_date_range, stream_export
+from .firebase_users import firebase_user_count, firebase_user_page
+
 # Firebase imports
 try:
     import firebase_admin
@@ -47,49 +53,11 @@ def check_admin_login(request):
     """Helper function to check if admin is logged in"""
     return request.session.get('admin_logged_in', False)
 
-def get_firebase_users():
-    """Fetch users from Firebase Firestore and Realtime Database"""
-    firebase_users = []
-    
+def _firebase_ready():
+    """True when Firebase (or the in-memory fake) can be queried."""
     if not FIREBASE_AVAILABLE:
-        return []
-    
-    try:
-        # Check if Firebase is initialized
-        if not firebase_admin._apps:
-            return []
-        
-        # Get users from Firestore
-        firestore_db = firestore.client()
-        users_ref = firestore_db.collection('users')
-        docs = users_ref.stream()
-        
-        for doc in docs:
-            user_data = doc.to_dict()
-            user_data['id'] = doc.id
-            user_data['source'] = 'firestore'
-            firebase_users.append(user_data)
-        
-        # Also try to get from Realtime Database
-        try:
-            realtime_db = db.reference('users')
-            realtime_users = realtime_db.get()
-            
-            if realtime_users:
-                for user_id, user_data in realtime_users.items():
-                    # Check if user already exists from Firestore
-                    existing_user = next((u for u in firebase_users if u.get('phone_number') == user_data.get('phone_number')), None)
-                    if not existing_user:
-                        user_data['id'] = user_id
-                        user_data['source'] = 'realtime'
-                        firebase_users.append(user_data)
-        except Exception as e:
-            print(f"Could not fetch from Realtime Database: {e}")
-        
-    except Exception as e:
-        print(f"Error fetching Firebase users: {e}")
-    
-    return firebase_users
+        return False
+    return bool(firebase_admin._apps) or getattr(settings, 'FIREBASE_FAKE', False)
 
 # Add login requirement
 def admin_dashboard(request):
@@ -114,10 +82,10 @@ def admin_dashboard(request):
     # All transactions count    
     total_transactions = Transaction.objects.count()
     
-    # Total users (local + Firebase)
+    # Total users (local + Firebase); the Firebase count is cached and refreshed in the background
     local_users = User.objects.count()
-    firebase_users = get_firebase_users()
-    total_users = local_users + len(firebase_users)
+    firebase_users_count = firebase_user_count() if _firebase_ready() else 0
+    total_users = local_users + firebase_users_count
     
     # Recent transactions (last 10)
     recent_transactions = Transaction.objects.select_related('user').order_by('-created_at')[:10]
@@ -159,7 +127,7 @@ def admin_dashboard(request):
         'total_transactions': total_transactions,
         'total_users': total_users,
         'local_users': local_users,
-        'firebase_users_count': len(firebase_users),
+        'firebase_users_count': firebase_users_count,
         'recent_transactions': recent_transactions,
         'recent_deposits': recent_deposits,
         'recent_withdrawals': recent_withdrawals,
@@ -180,17 +148,23 @@ def admin_users(request):
     # Get local users
     local_users = User.objects.all().order_by('-date_joined')
     
-    # Get Firebase users
-    firebase_users = get_firebase_users()
-    
-    # Sort Firebase users by registration date if available
-    firebase_users.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+    # Get one page of Firebase users, ordered by key
+    cursor = request.GET.get('cursor') or None
+    search = request.GET.get('q', '').strip() or None
+    if _firebase_ready():
+        firebase_users, next_cursor = firebase_user_page(cursor, search=search)
+        total_firebase = firebase_user_count()
+    else:
+        firebase_users, next_cursor, total_firebase = [], None, 0
     
     context = {
         'local_users': local_users,
         'firebase_users': firebase_users,
         'total_local': local_users.count(),
-        'total_firebase': len(firebase_users),
+        'total_firebase': total_firebase,
+        'cursor': cursor,
+        'next_cursor': next_cursor,
+        'search': search or '',
     }
     return render(request, 'admindashboard/users.html', context)
 
@@ -230,3 +204,59 @@ def admin_transactions(request):
         'transactions': transactions,
     }
     return render(request, 'admindashboard/transactions.html', context)
+
+def admin_export(request):
+    """Stream referral/commission data as CSV or NDJSON.
+
+    Query parameters: ``dataset`` (commissions, referrals, referral_codes),
+    ``format`` (csv, ndjson) and optional ``start`` / ``end`` dates
+    (YYYY-MM-DD, inclusive).
+    """
+    # Check if admin is logged in
+    if not check_admin_login(request):
+        return redirect('admindashboard:admindlogin')
+
+    dataset = request.GET.get('dataset', 'commissions')
+    export_format = request.GET.get('format', 'csv')
+    if dataset not in EXPORT_DATASETS or export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest('Unknown dataset or format')
+    try:
+        start_at, end_at = parse_date_range(request.GET.get('start'), request.GET.get('end'))
+    except ValueError:
+        return HttpResponseBadRequest('Dates must be YYYY-MM-DD')
+
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(
+        stream_export(dataset, export_format, start_at, end_at),
+        content_type=f'{content_type}; charset=utf-8',
+    )
+    filename = f"{dataset}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def admin_middleware_timing(request):
+    """Per-middleware p50/p95/p99 (request and response phases) for this worker.
+
+    Requires ``MIDDLEWARE_TIMING``; ``?reset=1`` clears the samples.
+    """
+    # Check if admin is logged in
+    if not check_admin_login(request):
+        return redirect('admindashboard:admindlogin')
+
+    from django.conf import settings
+    if not getattr(settings, 'MIDDLEWARE_TIMING', False):
+        return JsonResponse({'enabled': False, 'detail': 'Set MIDDLEWARE_TIMING=true to collect timings'})
+    if request.GET.get('reset'):
+        timing_stats.reset()
+    return JsonResponse({'enabled': True, 'pid': os.getpid(), **timing_stats.summary()})
+
+
+def admin_firebase_clients(request):
+    """Reuse of this worker's Firestore and Realtime Database handles."""
+    if not check_admin_login(request):
+        return redirect('admindashboard:admindlogin')
+
+    from myproject.firebase_clients import firebase_clients
+    return JsonResponse(firebase_clients.stats())
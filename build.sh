@@ -9,7 +9,10 @@ pip install --upgrade pip
 pip install -r requirements.txt
 
 # Collect static files
-python manage.py collectstatic --no-input
+python manage.py collectstatic --no-input --clear
 
 # Run migrations
 python manage.py migrate --no-input
+
+# Report how long importing the app takes; informational, never fails the build
+python manage.py benchmark_startup --runs 3
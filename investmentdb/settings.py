@@ -69,7 +69,7 @@ SESSION_COOKIE_SECURE = IS_PRODUCTION
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_AGE = 365 * 24 * 60 * 60  # 1 YEAR (practically permanent)
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False  # NEVER expire when browser closes
-SESSION_SAVE_EVERY_REQUEST = True  # Always renew session on every request
+SESSION_SAVE_EVERY_REQUEST = False  # Renewal is throttled by SessionPersistenceMiddleware
 SESSION_COOKIE_SAMESITE = 'Lax'  # Better compatibility with mobile apps
 
 CSRF_COOKIE_SECURE = IS_PRODUCTION
@@ -205,11 +205,21 @@ if IS_PRODUCTION and 'postgresql' in DATABASES['default']['ENGINE']:
     })
 
 # Cache configuration
-if IS_PRODUCTION:
-    # Use dummy cache for production (no Redis required)
+REDIS_URL = os.environ.get('REDIS_URL')
+if IS_PRODUCTION and REDIS_URL:
+    # Shared by all workers: rate limit buckets, cached Firebase records
     CACHES = {
         'default': {
-            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif IS_PRODUCTION:
+    # No Redis: per-worker memory, so rate limits apply per process
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'growfi-default',
         }
     }
 else:
@@ -223,10 +233,19 @@ else:
 
 # Session storage - Fixed for Render.com persistence
 # Using database sessions for PERMANENT user login - NO EXPIRATION
-# Database sessions are persistent and survive server restarts
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
-SESSION_SAVE_EVERY_REQUEST = True  # Save and renew session on every request
+# Database sessions are persistent and survive server restarts; each worker
+# keeps recently used sessions decoded in memory in front of the table
+SESSION_ENGINE = 'myproject.session_backend'
+SESSION_LRU_MAX_ENTRIES = 5000  # Decoded sessions kept per worker
+# Seconds a worker serves a cached session without checking the row; a
+# logout or rewrite on another worker is seen at most this late
+SESSION_LRU_MAX_STALENESS = 5
+SESSION_SWEEP_INTERVAL = 6 * 60 * 60  # Delete expired session rows every 6 hours
+SESSION_SWEEP_CHUNK_SIZE = 1000
+SESSION_SAVE_EVERY_REQUEST = False  # Renewal is throttled by SessionPersistenceMiddleware
 SESSION_COOKIE_AGE = 365 * 24 * 60 * 60  # 1 YEAR (practically permanent)
+# Renew (rewrite) a logged-in session, Django or Firebase, at most once per interval
+SESSION_RENEWAL_INTERVAL = 15 * 60  # 15 minutes
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -320,12 +339,13 @@ else:
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # Firebase Configuration
-# Firebase initialization is handled in myproject/firebase_app.py
+# Firebase initialization is handled in myproject/firebase_app.py on first use, never at import time
 FIREBASE_INITIALIZED = False
-print(f"🔍 Firebase Debug - IS_PRODUCTION: {IS_PRODUCTION}")
-print(f"🔍 Firebase Debug - ENVIRONMENT: {ENVIRONMENT}")
-print(f"🔍 Firebase Debug - RENDER_EXTERNAL_HOSTNAME: {os.environ.get('RENDER_EXTERNAL_HOSTNAME', 'None')}")
-print("🔥 Firebase initialization will be handled by firebase_app.py when needed")
+# Seconds before a failed Firebase availability probe is retried
+FIREBASE_HEALTH_RETRY = 60
+# Pooled HTTPS connections kept per worker for Realtime Database calls
+# (myproject.firebase_clients); should cover the threads calling Firebase at once
+FIREBASE_HTTP_POOL_SIZE = 32
 
 # Firebase Credentials File Setting (for firebase_app.py)
 FIREBASE_CREDENTIALS_FILE = str(BASE_DIR / 'firebase-service-account.json')
@@ -333,6 +353,16 @@ FIREBASE_CREDENTIALS_FILE = str(BASE_DIR / 'firebase-service-account.json')
 # Firebase Database URL
 FIREBASE_DATABASE_URL = os.environ.get('FIREBASE_DATABASE_URL', 'https://investment-6d6f7-default-rtdb.firebaseio.com')
 
+# In-memory Firebase (myproject.firebase_fake) for tests, benchmarks and load runs
+# without network. Latency is per call; failure rate is 0..1.
+FIREBASE_FAKE = os.environ.get('FIREBASE_FAKE', 'False').lower() == 'true'
+FIREBASE_FAKE_LATENCY_MS = float(os.environ.get('FIREBASE_FAKE_LATENCY_MS', 0))
+FIREBASE_FAKE_JITTER_MS = float(os.environ.get('FIREBASE_FAKE_JITTER_MS', 0))
+FIREBASE_FAKE_FAILURE_RATE = float(os.environ.get('FIREBASE_FAKE_FAILURE_RATE', 0))
+if FIREBASE_FAKE and IS_PRODUCTION:
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured('FIREBASE_FAKE must not be enabled in production')
+
 # Disable Firebase middleware in production to prevent delays
 DISABLE_FIREBASE_MIDDLEWARE = IS_PRODUCTION  # Disable in production
 
@@ -460,6 +490,16 @@ PAYMENT_API_CONFIG = {
 # Rate limiting
 RATELIMIT_ENABLE = True
 RATELIMIT_USE_CACHE = 'default'
+# Proxies in front of the app that append to X-Forwarded-For (Render's load
+# balancer in production); the client IP is that many entries from the right
+RATELIMIT_TRUSTED_PROXIES = int(os.environ.get('RATELIMIT_TRUSTED_PROXIES', '1' if IS_PRODUCTION else '0'))
+# Token buckets per view scope (myproject.ratelimit): key kind -> 'N/period'
+RATE_LIMITS = {
+    'login': {'ip': '30/minute', 'phone': '5/minute'},
+    'register': {'ip': '10/minute', 'phone': '3/minute'},
+    'live_feed': {'ip': '60/minute'},
+    'payment': {'ip': '20/minute', 'phone': '10/minute'},
+}
 
 # Security settings for production
 if IS_PRODUCTION:
@@ -485,6 +525,12 @@ LOGGING_HANDLERS = {
         'class': 'logging.StreamHandler',
         'formatter': 'simple',
     },
+    # Request hot paths: sampled, formatted off-thread as JSON lines
+    'queue': {
+        'class': 'myproject.structured_logging.NonBlockingQueueHandler',
+        'formatter': 'structured',
+        'filters': ['sampling'],
+    },
 }
 
 # Add file handler only if directory exists and file logging is enabled
@@ -509,6 +555,14 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'structured': {
+            '()': 'myproject.structured_logging.StructuredFormatter',
+        },
+    },
+    'filters': {
+        'sampling': {
+            '()': 'myproject.structured_logging.SamplingFilter',
+        },
     },
     'handlers': LOGGING_HANDLERS,
     'root': {
@@ -522,12 +576,12 @@ LOGGING = {
             'propagate': False,
         },
         'myproject': {
-            'handlers': ['console', 'file'] if USE_FILE_LOGGING else ['console'],
+            'handlers': ['queue', 'file'] if USE_FILE_LOGGING else ['queue'],
             'level': 'DEBUG' if DEBUG else 'INFO',
             'propagate': False,
         },
         'payments': {
-            'handlers': ['console', 'file'] if USE_FILE_LOGGING else ['console'],
+            'handlers': ['queue', 'file'] if USE_FILE_LOGGING else ['queue'],
             'level': 'DEBUG' if DEBUG else 'INFO',
             'propagate': False,
         },
@@ -549,6 +603,19 @@ LOGGING = {
     },
 }
 
+# Fraction of INFO/DEBUG records kept for high-frequency events, by event
+# name or logger-name prefix. Warnings and errors are always logged.
+LOG_SAMPLE_RATES = {
+    'auth.check': 0.01,
+    'dashboard.view': 0.1,
+    'team.view': 0.1,
+    'team.referrals_loaded': 0.1,
+    'transactions.view': 0.1,
+    'firebase.user_queued': 0.1,
+    'payments.status_check': 0.05,
+    'ratelimit.rejected': 0.1,
+}
+
 # Development vs Production specific settings
 if DEBUG:
     # Development tools
@@ -591,6 +658,62 @@ APP_SETTINGS = {
     'MAINTENANCE_MODE': False,            # Maintenance mode flag
 }
 
+# Firebase write-behind queue (myproject.firebase_queue)
+FIREBASE_QUEUE_AUTOSTART = True  # Start a drain thread in each web process on first enqueue
+FIREBASE_QUEUE_INTERVAL = 2.0  # Seconds between drains when no new writes arrive
+FIREBASE_QUEUE_BATCH_SIZE = 200
+# Seconds a claimed (in-flight) write stays with its worker before another
+# worker may take it over; must be longer than a batch of Firebase calls takes
+FIREBASE_QUEUE_CLAIM_TIMEOUT = 300
+
+# Coalesced presence writes (myproject.presence): last_login, is_online and
+# activity fields are buffered per user and queued once per interval
+PRESENCE_AUTOSTART = True  # Start a flush thread in each web process on first activity
+PRESENCE_FLUSH_INTERVAL = 60  # Seconds between flushes
+PRESENCE_BATCH_SIZE = 200  # Users per RTDB multi-location update / Firestore batch
+PRESENCE_OFFLINE_AFTER = 15 * 60  # Seconds without activity before is_online is cleared
+
+# Referral index summaries (myproject.team_listing) are refreshed from the
+# Django ledger by a thread, so the Firebase lookups stay out of requests
+MEMBER_SUMMARY_AUTOSTART = True  # Start a refresh thread in each web process on first ledger change
+MEMBER_SUMMARY_INTERVAL = 30.0  # Seconds between polls when nothing wakes the thread
+
+# Independent Firebase reads within one request run concurrently
+# (myproject.firebase_fanout): pool threads per worker, and seconds a page
+# waits for them before treating the missing ones as failed
+FIREBASE_FANOUT_WORKERS = 16
+FIREBASE_FANOUT_TIMEOUT = 5.0
+
+# Incremental Firebase to Django user sync (myproject.firebase_sync): RTDB
+# records stamped within this many seconds are left for the next cycle, so
+# a queued write still on its way to Firebase is not skipped
+FIREBASE_SYNC_SETTLE_SECONDS = 60
+
+# Seconds without a flush after which the FirebaseProfile mirror of RTDB
+# users (mirror_firebase_users) is treated as stale and the admin pages read
+# Firebase again; keep it well above the command's --flush-interval
+FIREBASE_MIRROR_STALE_AFTER = 120
+
+# Seconds Firebase user records (RTDB users/{key}, Firestore users, profiles
+# and teams documents) stay in the read-through cache (myproject.firebase_cache).
+# Our own writes invalidate them; this bounds staleness from other writers.
+FIREBASE_USER_CACHE_TTL = 30
+
+# Seconds before the admin dashboard's cached Firebase user count is
+# recounted in the background (admindashboard.firebase_users)
+ADMIN_FIREBASE_COUNT_REFRESH = 300
+
+# Seconds a user's unread notification count is cached (myproject.notifications)
+NOTIFICATION_COUNT_CACHE_TTL = 30
+
+# Referral commission percentage per level, level 1 first. Paid asynchronously
+# by a worker thread in each web process (myproject.commissions) or by
+# `python manage.py process_commission_jobs --loop`.
+REFERRAL_COMMISSION_RATES = ['5.00']
+COMMISSION_JOBS_AUTOSTART = True  # Start a worker thread in each web process on first investment
+COMMISSION_JOBS_INTERVAL = 30.0  # Seconds between polls when no new investments arrive
+COMMISSION_JOBS_BATCH_SIZE = 200
+
 # API throttling settings
 REST_FRAMEWORK = {
     'DEFAULT_THROTTLE_CLASSES': [
@@ -604,18 +727,28 @@ REST_FRAMEWORK = {
     }
 }
 
-# Debug output
-print(f"🚀 Django settings loaded - Environment: {ENVIRONMENT}")
-print(f"🔐 Debug mode: {DEBUG}")
-print(f"🔥 Firebase initialized: {FIREBASE_INITIALIZED}")
-print(f"💰 Galaxy API configured:")
-print(f"   Merchant ID: {GALAXY_MERCHANT_ID}")
-print(f"   Base URL: {GALAXY_BASE_URL}")
-print(f"   Callback IP: {GALAXY_CALLBACK_IP}")
-print(f"   Secret Key: {GALAXY_SECRET_KEY[:10]}...")
-print(f"   Enabled: {GALAXY_CONFIG['ENABLED']}")
-print(f"   Payment Methods: GCash, PayMaya")
-print(f"📧 Email backend: {EMAIL_BACKEND}")
-print(f"🗄️  Database: {DATABASES['default']['ENGINE'].split('.')[-1]}")
-print(f"💾 Cache backend: {CACHES['default']['BACKEND'].split('.')[-1]}")
-print(f"📝 File logging: {'Enabled' if USE_FILE_LOGGING else 'Disabled'}")
+# Per-middleware timing (myproject.middleware_timing). Off by default; each
+# worker aggregates its own samples, served at /admindashboard/middleware-timing/
+MIDDLEWARE_TIMING = os.environ.get('MIDDLEWARE_TIMING', 'False').lower() == 'true'
+MIDDLEWARE_TIMING_LOG_EVERY = 1000  # Log the slowest stages every N requests; 0 disables
+if MIDDLEWARE_TIMING:
+    from myproject.middleware_timing import instrument_middleware
+    MIDDLEWARE = instrument_middleware(MIDDLEWARE)
+
+# Startup summary, printed by every process that loads settings (each worker,
+# each management command). Off in production unless STARTUP_DIAGNOSTICS=True.
+STARTUP_DIAGNOSTICS = os.environ.get('STARTUP_DIAGNOSTICS', str(not IS_PRODUCTION)).lower() == 'true'
+if STARTUP_DIAGNOSTICS:
+    print(f"🚀 Django settings loaded - Environment: {ENVIRONMENT}")
+    print(f"🔐 Debug mode: {DEBUG}")
+    print(f"💰 Galaxy API configured:")
+    print(f"   Merchant ID: {GALAXY_MERCHANT_ID}")
+    print(f"   Base URL: {GALAXY_BASE_URL}")
+    print(f"   Callback IP: {GALAXY_CALLBACK_IP}")
+    print(f"   Secret Key: {GALAXY_SECRET_KEY[:10]}...")
+    print(f"   Enabled: {GALAXY_CONFIG['ENABLED']}")
+    print(f"   Payment Methods: GCash, PayMaya")
+    print(f"📧 Email backend: {EMAIL_BACKEND}")
+    print(f"🗄️  Database: {DATABASES['default']['ENGINE'].split('.')[-1]}")
+    print(f"💾 Cache backend: {CACHES['default']['BACKEND'].split('.')[-1]}")
+    print(f"📝 File logging: {'Enabled' if USE_FILE_LOGGING else 'Disabled'}")
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'investmentdb.settings')
 
 application = get_wsgi_application()
+
+# Import the URLconf, and with it every view module, at boot instead of on the
+# first request. Under gunicorn --preload this happens once, in the master.
+from django.urls import get_resolver  # noqa: E402
+
+get_resolver().url_patterns
@@ -82,6 +82,31 @@ class ReferralCommissionAdmin(admin.ModelAdmin):
     list_filter = ['level', 'date_earned']
     search_fields = ['referrer__username', 'referred_user__username']
 
+@admin.register(CommissionJob)
+class CommissionJobAdmin(admin.ModelAdmin):
+    list_display = ['investment', 'status', 'attempts', 'created_at', 'processed_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['investment__user__username']
+    readonly_fields = ['created_at', 'processed_at', 'last_error']
+
+@admin.register(FirebaseWrite)
+class FirebaseWriteAdmin(admin.ModelAdmin):
+    list_display = ['target', 'operation', 'path', 'status', 'attempts', 'next_attempt_at', 'created_at']
+    list_filter = ['target', 'operation', 'status']
+    search_fields = ['path']
+    readonly_fields = ['created_at', 'processed_at', 'last_error']
+
+@admin.register(FirebaseProfile)
+class FirebaseProfileAdmin(admin.ModelAdmin):
+    list_display = ['firebase_uid', 'display_name', 'phone_number', 'referral_code', 'balance', 'is_active', 'synced_at']
+    list_filter = ['is_active']
+    search_fields = ['firebase_uid', 'phone_number', 'email', 'display_name', 'referral_code']
+    readonly_fields = ['source_updated_at', 'synced_at']
+
+@admin.register(FirebaseSyncCheckpoint)
+class FirebaseSyncCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['source', 'position', 'last_key', 'records_synced', 'updated_at']
+
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ['user', 'title', 'notification_type', 'is_read', 'created_at']
@@ -0,0 +1,223 @@
+"""
+Multi-level referral commissions.
+
+``make_investment`` only records a ``CommissionJob`` inside its own database
+transaction. A worker, either a daemon thread started on first use in each
+web process or the process_commission_jobs command, later takes pending jobs
+in batches, walks each investor's referral chain up to the configured number
+of levels and pays every referrer once per batch, however many investments
+in the batch credited them. If a batch fails, its jobs are retried one at a
+time so only the job that fails is charged an attempt.
+"""
+import logging
+import threading
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CommissionJob, ReferralCommission, Transaction, UserProfile
+from .team_listing import refresh_member_summaries_on_commit
+
+logger = logging.getLogger(__name__)
+
+MAX_JOB_ATTEMPTS = 5
+
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_commission_rates():
+    """Return the commission percentage per level, level 1 first."""
+    rates = getattr(settings, 'REFERRAL_COMMISSION_RATES', ['5.00'])
+    return [Decimal(str(rate)) for rate in rates]
+
+
+def enqueue_investment_commission(investment):
+    """Record a commission job for ``investment``.
+
+    Call inside the transaction that creates the investment so the job is
+    committed (or rolled back) together with it.
+    """
+    job = CommissionJob.objects.get_or_create(investment=investment)[0]
+    if getattr(settings, 'COMMISSION_JOBS_AUTOSTART', True):
+        start_commission_worker()
+    transaction.on_commit(_wakeup.set)
+    return job
+
+
+def _referral_chains(user_ids, max_levels):
+    """Return ``{user_id: [level1_referrer_id, level2_referrer_id, ...]}``.
+
+    Issues one query per level for the whole batch rather than one per user.
+    """
+    chains = {user_id: [] for user_id in user_ids}
+    parent_of = {}
+    frontier = set(user_ids)
+    for _ in range(max_levels):
+        lookup = frontier - parent_of.keys()
+        if lookup:
+            parent_of.update(
+                UserProfile.objects.filter(user_id__in=lookup).values_list('user_id', 'referred_by_id')
+            )
+        next_frontier = set()
+        for user_id, chain in chains.items():
+            current = chain[-1] if chain else user_id
+            if current is None:
+                continue
+            referrer_id = parent_of.get(current)
+            # Stop at the top of the tree and never pay someone twice for the same investment
+            if referrer_id is None or referrer_id == user_id or referrer_id in chain:
+                chain.append(None)
+                continue
+            chain.append(referrer_id)
+            next_frontier.add(referrer_id)
+        frontier = next_frontier
+        if not frontier:
+            break
+    return {user_id: [r for r in chain if r is not None] for user_id, chain in chains.items()}
+
+
+def process_commission_batch(batch_size=200, max_levels=None):
+    """Pay commissions for up to ``batch_size`` pending jobs.
+
+    Returns the number of jobs paid. The batch commits atomically; if it
+    fails, each job is paid in its own savepoint instead and only the jobs
+    that fail again have their attempt counters bumped.
+    """
+    rates = get_commission_rates()
+    if max_levels is not None:
+        rates = rates[:max_levels]
+
+    with transaction.atomic():
+        jobs = list(
+            CommissionJob.objects.select_for_update(skip_locked=True)
+            .filter(status='pending')
+            .select_related('investment', 'investment__user')
+            .order_by('id')[:batch_size]
+        )
+        if not jobs:
+            return 0
+
+        try:
+            with transaction.atomic():
+                _pay_jobs(jobs, rates)
+            return len(jobs)
+        except Exception as e:
+            if len(jobs) == 1:
+                _record_failure(jobs[0], e)
+                return 0
+            logger.warning(f"Commission batch failed ({len(jobs)} jobs), paying them one at a time: {e}")
+
+        paid = 0
+        for job in jobs:
+            try:
+                with transaction.atomic():
+                    _pay_jobs([job], rates)
+                paid += 1
+            except Exception as e:
+                _record_failure(job, e)
+        return paid
+
+
+def _record_failure(job, error):
+    logger.error(f"Commission job for investment #{job.investment_id} failed: {error}")
+    job.attempts += 1
+    job.last_error = str(error)
+    if job.attempts >= MAX_JOB_ATTEMPTS:
+        job.status = 'failed'
+    job.save(update_fields=['attempts', 'last_error', 'status'])
+
+
+def _pay_jobs(jobs, rates):
+    chains = _referral_chains({job.investment.user_id for job in jobs}, len(rates))
+
+    commissions = []
+    transactions = []
+    credit_by_referrer = defaultdict(Decimal)
+    for job in jobs:
+        investment = job.investment
+        investor = investment.user
+        for level, (referrer_id, rate) in enumerate(zip(chains[investor.id], rates), start=1):
+            amount = (investment.amount * rate / 100).quantize(Decimal('0.01'))
+            if amount <= 0:
+                continue
+            credit_by_referrer[referrer_id] += amount
+            commissions.append(ReferralCommission(
+                referrer_id=referrer_id,
+                referred_user=investor,
+                investment=investment,
+                commission_rate=rate,
+                commission_amount=amount,
+                level=level,
+                commission_type='investment',
+            ))
+            transactions.append(Transaction(
+                user_id=referrer_id,
+                transaction_type='referral_bonus',
+                amount=amount,
+                status='completed',
+                reference_number=Transaction.generate_reference_number(referrer_id),
+                description=f'Level {level} referral commission from {investor.username} investment',
+            ))
+
+    # bulk_create() skips save() and post_save. Transaction.save() only fills
+    # reference_number, set above; neither model has signal receivers.
+    ReferralCommission.objects.bulk_create(commissions)
+    Transaction.objects.bulk_create(transactions)
+
+    # One balance update per referrer for the whole batch
+    for referrer_id, total in credit_by_referrer.items():
+        UserProfile.objects.filter(user_id=referrer_id).update(balance=F('balance') + total)
+    # update() sends no post_save, so refresh the referrers' team summaries here
+    refresh_member_summaries_on_commit(credit_by_referrer)
+
+    now = timezone.now()
+    for job in jobs:
+        job.status = 'done'
+        job.processed_at = now
+        job.attempts += 1
+    CommissionJob.objects.bulk_update(jobs, ['status', 'processed_at', 'attempts'])
+
+    logger.info(
+        f"Processed {len(jobs)} commission jobs: {len(commissions)} commissions "
+        f"to {len(credit_by_referrer)} referrers"
+    )
+
+
+def _worker_loop(interval, batch_size):
+    while True:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        try:
+            # A short batch means the queue is drained or a job failed; either
+            # way wait for the next wakeup rather than spinning on it.
+            while process_commission_batch(batch_size) >= batch_size:
+                pass
+        except Exception as e:
+            logger.error(f"Commission worker error: {e}")
+        finally:
+            close_old_connections()
+
+
+def start_commission_worker(interval=None, batch_size=None):
+    """Start this process's commission worker thread if it is not running yet."""
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return _worker
+        interval = interval or getattr(settings, 'COMMISSION_JOBS_INTERVAL', 30.0)
+        batch_size = batch_size or getattr(settings, 'COMMISSION_JOBS_BATCH_SIZE', 200)
+        _worker = threading.Thread(
+            target=_worker_loop, args=(interval, batch_size), name='commission-jobs', daemon=True
+        )
+        _worker.start()
+        # Pick up anything left over from before a restart
+        _wakeup.set()
+    return _worker
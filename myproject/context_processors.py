@@ -1,16 +1,10 @@
 from django.conf import settings
-from .models import Notification
+from .notifications import unread_notification_count
 
 
 def notification_count(request):
     """Context processor to add unread notification count."""
-    if request.user.is_authenticated:
-        unread_count = Notification.objects.filter(
-            user=request.user,
-            is_read=False,
-        ).count()
-        return {"unread_notifications_count": unread_count}
-    return {"unread_notifications_count": 0}
+    return {"unread_notifications_count": unread_notification_count(request.user)}
 
 
 def firebase_client_config(request):
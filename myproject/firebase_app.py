@@ -1,15 +1,39 @@
+"""
+Lazily initialized Firebase Admin app and client helpers.
+
+Nothing here touches credentials or the network at import time. The app is
+built on the first ``get_firebase_app()`` call, and ``firebase_available()``
+is the cached health probe views check before using Firebase.
+"""
 import os
 import json
+import logging
+import threading
+import time
 from typing import Optional
 
 import firebase_admin
 from firebase_admin import credentials
 from firebase_admin import firestore
+from firebase_admin import db as firebase_db
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
 
 _firebase_app: Optional[firebase_admin.App] = None
 
+# Outcome of the last availability probe and when it was taken
+_health = {'available': None, 'checked_at': 0.0}
+_health_lock = threading.Lock()
+
+# Realtime Database placeholder for the server's current time in milliseconds
+RTDB_SERVER_TIMESTAMP = {'.sv': 'timestamp'}
+
+
+def rtdb_increment(delta):
+    """Realtime Database placeholder that adds ``delta`` to the stored number on the server."""
+    return {'.sv': {'increment': delta}}
+
 
 def get_firebase_app() -> firebase_admin.App:
     """Initialize and return a singleton Firebase Admin app.
@@ -18,8 +42,12 @@ def get_firebase_app() -> firebase_admin.App:
     (e.g., in settings.py), this will reuse that instance.
     
     Supports both file-based credentials and environment variable credentials.
+    With ``settings.FIREBASE_FAKE`` on, returns the in-memory fake instead.
     """
     global _firebase_app
+    if getattr(settings, 'FIREBASE_FAKE', False):
+        from .firebase_fake import get_fake_firebase
+        return get_fake_firebase()
     if _firebase_app is not None:
         return _firebase_app
 
@@ -53,17 +81,16 @@ def get_firebase_app() -> firebase_admin.App:
                 raise ValueError(f"Invalid service account type: {cred_dict['type']}")
             
             cred = credentials.Certificate(cred_dict)
-            print("🔥 Firebase initialized with JSON environment credentials")
-            print(f"✅ Project ID: {cred_dict['project_id']}")
-            print(f"✅ Client Email: {cred_dict['client_email']}")
+            logger.info(
+                f"Firebase credentials from JSON environment variable "
+                f"(project {cred_dict['project_id']}, {cred_dict['client_email']})"
+            )
         except json.JSONDecodeError as e:
-            print(f"❌ Error parsing JSON credentials: Invalid JSON format - {e}")
+            logger.error(f"Error parsing JSON credentials: Invalid JSON format - {e}")
         except Exception as e:
-            print(f"❌ Error parsing JSON credentials: {e}")
-            print(f"   JSON length: {len(json_creds)} characters")
-            print(f"   JSON preview: {json_creds[:100]}...")
+            logger.error(f"Error parsing JSON credentials ({len(json_creds)} characters): {e}")
     else:
-        print("⚠️ No JSON credentials found in environment variables")
+        logger.debug("No JSON credentials found in environment variables")
     
     # Method 2: Try individual environment variables (for production)
     if not cred:
@@ -101,13 +128,13 @@ def get_firebase_app() -> firebase_admin.App:
                     raise ValueError("Invalid private key format")
                 
                 cred = credentials.Certificate(cred_dict)
-                print("🔥 Firebase initialized with individual environment variables")
+                logger.info("Firebase credentials from individual environment variables")
             except Exception as e:
-                print(f"❌ Error creating credentials from environment variables: {e}")
-                print(f"   Firebase Type: {firebase_type}")
-                print(f"   Project ID: {firebase_project_id}")
-                print(f"   Client Email: {firebase_client_email}")
-                print(f"   Private Key Present: {bool(firebase_private_key)}")
+                logger.error(
+                    f"Error creating credentials from environment variables: {e} "
+                    f"(type={firebase_type}, project_id={firebase_project_id}, "
+                    f"client_email={firebase_client_email}, private_key={bool(firebase_private_key)})"
+                )
     
     # Method 3: Try credentials file (for local development)
     if not cred:
@@ -115,17 +142,16 @@ def get_firebase_app() -> firebase_admin.App:
         if creds_path and os.path.exists(creds_path):
             try:
                 cred = credentials.Certificate(creds_path)
-                print(f"🔥 Firebase initialized with credentials file: {creds_path}")
+                logger.info(f"Firebase credentials from file: {creds_path}")
             except Exception as e:
-                print(f"❌ Error loading credentials file: {e}")
+                logger.error(f"Error loading credentials file: {e}")
     
     # If no credentials found, log warning but don't crash the app
     if not cred:
-        print("⚠️ Firebase credentials not found. Please set one of:")
-        print("   1. FIREBASE_CREDENTIALS_JSON environment variable")
-        print("   2. Individual Firebase environment variables (FIREBASE_TYPE, FIREBASE_PROJECT_ID, etc.)")
-        print("   3. settings.FIREBASE_CREDENTIALS_FILE or GOOGLE_APPLICATION_CREDENTIALS file path")
-        print("🔄 App will continue without Firebase - registration will work but data won't sync to Firebase")
+        logger.warning(
+            "Firebase credentials not found; set FIREBASE_CREDENTIALS_JSON, the individual "
+            "FIREBASE_* variables or a credentials file. Continuing without Firebase."
+        )
         
         # Return a dummy app that will be handled gracefully
         class DummyFirebaseApp:
@@ -142,27 +168,59 @@ def get_firebase_app() -> firebase_admin.App:
         database_url = os.getenv('FIREBASE_DATABASE_URL', 'https://investment-6d6f7-default-rtdb.firebaseio.com')
         if database_url:
             config['databaseURL'] = database_url
-            print(f"🔗 Using Firebase Database URL: {database_url}")
             
         _firebase_app = firebase_admin.initialize_app(cred, config)
-        print(f"✅ Firebase app initialized successfully with project: {cred.project_id}")
-        print(f"✅ Firebase Database URL configured: {database_url}")
+        logger.info(f"Firebase app initialized for project {cred.project_id} ({database_url})")
     except ValueError as e:
         if "already exists" in str(e).lower():
             # If default app already exists, reuse it
             _firebase_app = firebase_admin.get_app()
-            print("✅ Firebase app already initialized, reusing existing instance")
+            logger.info("Firebase app already initialized, reusing existing instance")
         else:
             raise e
     except Exception as e:
-        print(f"❌ Error initializing Firebase app: {e}")
-        print(f"❌ Config used: {config}")
+        logger.error(f"Error initializing Firebase app with {config}: {e}")
         raise e
     
     return _firebase_app
 
 
 def get_firestore_client() -> firestore.Client:
-    """Return a Firestore client bound to the initialized Firebase app."""
-    app = get_firebase_app()
-    return firestore.client(app=app)
+    """Return this process's Firestore client (see ``firebase_clients``)."""
+    from .firebase_clients import firebase_clients
+    return firebase_clients.firestore()
+
+
+def get_database_reference(path: str = '/') -> firebase_db.Reference:
+    """Return a Realtime Database reference on this process's shared HTTP session."""
+    from .firebase_clients import firebase_clients
+    return firebase_clients.database(path)
+
+
+def firebase_available() -> bool:
+    """Return whether Firebase can be used, initializing the app on the first call.
+
+    A successful probe is kept for the life of the process. A failed one is
+    retried after ``FIREBASE_HEALTH_RETRY`` seconds, so a worker that booted
+    during an outage picks Firebase up again without a restart.
+    """
+    if getattr(settings, 'FIREBASE_FAKE', False):
+        return True
+    available = _health['available']
+    if available or (
+        available is not None
+        and time.monotonic() - _health['checked_at'] < getattr(settings, 'FIREBASE_HEALTH_RETRY', 60)
+    ):
+        return available
+    with _health_lock:
+        if _health['available']:
+            return True
+        try:
+            app = get_firebase_app()
+            available = getattr(app, 'project_id', None) != 'firebase-unavailable'
+        except Exception as e:
+            logger.error(f"Firebase health probe failed: {e}")
+            available = False
+        _health.update(available=available, checked_at=time.monotonic())
+    logger.info(f"Firebase status: {'available' if available else 'unavailable'}")
+    return available
@@ -0,0 +1,166 @@
+"""
+Read-through cache for the Firebase records read on most page loads.
+
+- ``user_records``: RTDB ``users/{firebase_key}``, without private fields.
+- ``firestore_documents``: Firestore documents by path (``users/{uid}``,
+  ``profiles/{uid}``, ``teams/{uid}``), as dicts, or None when missing.
+- ``team_referrals``: the RTDB ``referrals/{code}`` index entries.
+
+Entries live in the default cache for ``FIREBASE_USER_CACHE_TTL`` seconds.
+Concurrent misses for the same key in one process share a single Firebase
+read. Our own writes invalidate what they touch: the write queue calls
+``invalidate_paths()`` when a write is queued and again once Firebase has
+it, and views that write directly invalidate or patch the entry.
+
+A worker that started reading just before another worker's write landed
+can still cache the old record; the TTL bounds how long that lasts.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Never copied into the session or the record cache
+PRIVATE_USER_FIELDS = ('password', 'transactions')
+
+_MISSING = object()
+_caches = []
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ReadThroughCache:
+    """Cache in front of ``loader(key)`` with per-key single-flight loads.
+
+    ``target`` and ``key_for_path`` tell ``invalidate_paths()`` which keys a
+    write to an RTDB or Firestore path makes stale.
+    """
+
+    def __init__(self, name, loader, target, key_for_path):
+        self.name = name
+        self.loader = loader
+        self.target = target
+        self.key_for_path = key_for_path
+        self._flights = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        _caches.append(self)
+
+    def _cache_key(self, key):
+        return f'{self.name}:{key}'
+
+    def _ttl(self):
+        return getattr(settings, 'FIREBASE_USER_CACHE_TTL', 30)
+
+    def get(self, key):
+        """Return the cached value for ``key``, loading it on a miss."""
+        value = cache.get(self._cache_key(key), _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self._generations.get(key, 0)
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self.loader(key)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                # Don't cache a read that raced with one of our own writes
+                current = self._generations.get(key, 0) == generation
+            flight.done.set()
+        if current:
+            cache.set(self._cache_key(key), flight.result, self._ttl())
+        return flight.result
+
+    def set(self, key, value):
+        """Store a freshly read ``value`` for ``key``."""
+        cache.set(self._cache_key(key), value, self._ttl())
+
+    def patch(self, key, fields):
+        """Apply ``fields`` to the cached dict for ``key``, if there is one."""
+        value = cache.get(self._cache_key(key))
+        if isinstance(value, dict):
+            value.update(fields)
+            cache.set(self._cache_key(key), value, self._ttl())
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+        cache.delete(self._cache_key(key))
+
+
+def invalidate_paths(target, paths):
+    """Drop cached records under any of ``paths`` written on ``target`` ('rtdb' or 'firestore')."""
+    for read_cache in _caches:
+        if read_cache.target != target:
+            continue
+        for path in paths:
+            key = read_cache.key_for_path(path.strip('/'))
+            if key:
+                read_cache.invalidate(key)
+
+
+def public_user_record(record):
+    """Return ``record`` without ``PRIVATE_USER_FIELDS``."""
+    return {key: value for key, value in (record or {}).items() if key not in PRIVATE_USER_FIELDS}
+
+
+def _load_user_record(firebase_key):
+    from .firebase_app import get_database_reference
+    return public_user_record(get_database_reference(f'users/{firebase_key}').get())
+
+
+def _user_key_for_path(path):
+    # users/{key} and anything below it
+    parts = path.split('/')
+    return parts[1] if len(parts) >= 2 and parts[0] == 'users' else None
+
+
+def _load_firestore_document(path):
+    from .firebase_app import get_firestore_client
+    snapshot = get_firestore_client().document(path).get()
+    return snapshot.to_dict() if snapshot.exists else None
+
+
+def _document_key_for_path(path):
+    # Documents have an even number of segments; collection paths (add) are skipped
+    return path if path and path.count('/') % 2 == 1 else None
+
+
+user_records = ReadThroughCache('firebase_user_record', _load_user_record, 'rtdb', _user_key_for_path)
+firestore_documents = ReadThroughCache('firestore_document', _load_firestore_document, 'firestore', _document_key_for_path)
+
+
+def _load_team_referrals(referral_code):
+    from .firebase_app import get_database_reference
+    return get_database_reference(f'referrals/{referral_code}').get() or {}
+
+
+def _referral_code_for_path(path):
+    # referrals/{code} and anything below it
+    parts = path.split('/')
+    return parts[1] if len(parts) >= 2 and parts[0] == 'referrals' else None
+
+
+team_referrals = ReadThroughCache('firebase_team_referrals', _load_team_referrals, 'rtdb', _referral_code_for_path)
@@ -0,0 +1,134 @@
+"""
+Process-wide Firestore and Realtime Database handles.
+
+``get_firestore_client()`` and ``get_database_reference()`` in
+``firebase_app`` hand out handles from ``firebase_clients``, which creates
+them once per worker process and reuses them from every thread:
+
+- Firestore: one client, so one gRPC channel (kept alive by the library
+  with 30 s keepalive pings).
+- Realtime Database: one root reference; other paths are children of it
+  and share its HTTP session. The session's connection pool is sized by
+  ``FIREBASE_HTTP_POOL_SIZE`` so request threads, the write queue and
+  fan-out reads keep their TLS connections instead of discarding them
+  when the pool is full.
+
+Handles are rebuilt when the Firebase app changes (e.g. the fake in tests)
+and after fork, since channels and sockets must not be shared between
+processes. ``stats()`` reports how often handles were reused and how many
+HTTP connections the RTDB pool has had to open.
+"""
+import logging
+import os
+import threading
+from collections import Counter
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class FirebaseClientRegistry:
+    """Long-lived Firebase handles for the current process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handles = {}
+        self._counts = Counter()
+
+    def reset(self):
+        """Forget every handle; the next request for one creates it again."""
+        with self._lock:
+            self._handles = {}
+            self._counts = Counter()
+
+    def _handle(self, kind, factory):
+        from .firebase_app import get_firebase_app
+
+        app = get_firebase_app()
+        handle = self._handles.get(kind)
+        if handle is None or handle[0] is not app:
+            with self._lock:
+                handle = self._handles.get(kind)
+                if handle is None or handle[0] is not app:
+                    handle = self._handles[kind] = (app, factory(app))
+                    self._counts[f'{kind}.created'] += 1
+                    logger.info(f"Created Firebase {kind} handle for process {os.getpid()}")
+        self._counts[f'{kind}.handed_out'] += 1
+        return handle[1]
+
+    def firestore(self):
+        """Return this process's Firestore client."""
+        return self._handle('firestore', _create_firestore_client)
+
+    def database(self, path='/'):
+        """Return a Realtime Database reference to ``path`` on this process's HTTP session."""
+        root = self._handle('rtdb', _create_database_root)
+        path = path.strip('/')
+        return root.child(path) if path else root
+
+    def stats(self):
+        """Handle creations and reuse, plus RTDB HTTP connections opened and requests sent."""
+        counts = dict(self._counts)
+        result = {'pid': os.getpid()}
+        for kind in ('firestore', 'rtdb'):
+            created = counts.get(f'{kind}.created', 0)
+            handed_out = counts.get(f'{kind}.handed_out', 0)
+            result[kind] = {'created': created, 'handed_out': handed_out, 'reused': handed_out - created}
+        handle = self._handles.get('rtdb')
+        session = _database_session(handle[1]) if handle else None
+        if session is not None:
+            result['rtdb'].update(_pool_stats(session))
+        return result
+
+
+def _create_firestore_client(app):
+    if getattr(settings, 'FIREBASE_FAKE', False):
+        return app.client()
+    # Built here rather than with firebase_admin.firestore.client(), which
+    # caches the client on the app and would hand a forked worker the
+    # parent's gRPC channel
+    from google.cloud import firestore as cloud_firestore
+    return cloud_firestore.Client(credentials=app.credential.get_credential(), project=app.project_id)
+
+
+def _create_database_root(app):
+    if getattr(settings, 'FIREBASE_FAKE', False):
+        return app.reference('/')
+    from firebase_admin import db as firebase_db
+
+    root = firebase_db.reference('/', app=app)
+    session = _database_session(root)
+    if session is not None:
+        # A new adapter also means new pools, so a forked worker never
+        # reuses sockets opened by its parent
+        pool_size = getattr(settings, 'FIREBASE_HTTP_POOL_SIZE', 32)
+        retries = session.get_adapter('https://').max_retries
+        session.mount('https://', requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retries,
+        ))
+    return root
+
+
+def _database_session(reference):
+    client = getattr(reference, '_client', None)
+    return getattr(client, 'session', None)
+
+
+def _pool_stats(session):
+    connections = requests_sent = 0
+    adapter = session.get_adapter('https://')
+    pools = adapter.poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is not None:
+            connections += pool.num_connections
+            requests_sent += pool.num_requests
+    return {'http_connections_opened': connections, 'http_requests': requests_sent}
+
+
+firebase_clients = FirebaseClientRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=firebase_clients.reset)
@@ -0,0 +1,726 @@
+"""
+In-process stand-in for Firebase, for tests, benchmarks and load runs.
+
+With ``settings.FIREBASE_FAKE`` on, ``get_firebase_app()``,
+``get_firestore_client()`` and ``get_database_reference()`` return objects
+from this module instead of talking to Google. They keep their data in
+memory and implement the parts of the Admin SDK this project uses:
+
+- Realtime Database references: ``child``, ``get`` (including
+  ``shallow``), ``set``, ``update`` (multi-location), ``push``, ``delete``,
+  ``transaction`` and ``order_by_child``/``order_by_key``/``order_by_value``
+  queries with ``start_at``, ``end_at``, ``equal_to`` and the limits.
+  Server timestamps and increments (``{'.sv': ...}``) are resolved.
+- Firestore: collections, documents, ``where``/``order_by``/``limit``
+  queries with ``start_at``/``start_after`` cursors, ``stream``/``get``,
+  ``add`` and write batches.
+  ``SERVER_TIMESTAMP`` and ``DELETE_FIELD`` behave as on the server.
+
+Every call sleeps for the configured latency (``FIREBASE_FAKE_LATENCY_MS``,
+either a number or a per-operation dict with a ``'default'``, plus up to
+``FIREBASE_FAKE_JITTER_MS``) outside the data lock, so concurrent callers
+overlap as they would over the network. ``FIREBASE_FAKE_FAILURE_RATE``
+and ``fail_next()`` make calls raise ``FakeFirebaseError``, an
+``UnavailableError`` like the one the SDK raises for network failures.
+"""
+import copy
+import random
+import string
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from firebase_admin import exceptions as firebase_exceptions
+from google.api_core import exceptions as api_exceptions
+
+FAKE_PROJECT_ID = 'firebase-fake'
+RTDB_SERVER_TIMESTAMP = {'.sv': 'timestamp'}
+PUSH_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+AUTO_ID_CHARS = string.ascii_letters + string.digits
+
+
+class FakeFirebaseError(firebase_exceptions.UnavailableError):
+    """Injected failure of a fake Firebase call."""
+
+
+def _split(path):
+    return [part for part in (path or '').split('/') if part]
+
+
+class FakeFirebase:
+    """Fake Firebase app: the data of both databases plus latency and failure settings."""
+
+    project_id = FAKE_PROJECT_ID
+    name = '[FAKE]'
+
+    def __init__(self, latency_ms=0, jitter_ms=0, failure_rate=0.0, seed=None):
+        self.calls = Counter()
+        self._lock = threading.RLock()
+        self._random = random.Random(seed)
+        self._fail_next = []
+        self._last_push_time = 0
+        self._push_suffix = []
+        self.configure(latency_ms, jitter_ms, failure_rate)
+        self.reset()
+
+    def configure(self, latency_ms=0, jitter_ms=0, failure_rate=0.0):
+        """Set per-call latency and failure rate; dicts are keyed by operation name."""
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+
+    def reset(self):
+        """Drop all data, call counts and pending injected failures."""
+        with self._lock:
+            self.rtdb = {}
+            self.documents = {}
+            self.calls.clear()
+            self._fail_next = []
+
+    def fail_next(self, count=1, operation=None):
+        """Make the next ``count`` calls (of ``operation`` only, if given) fail."""
+        with self._lock:
+            self._fail_next.extend([operation] * count)
+
+    def reference(self, path='/'):
+        return FakeReference(self, _split(path))
+
+    def client(self):
+        return FakeFirestoreClient(self)
+
+    def _setting(self, value, operation):
+        if isinstance(value, dict):
+            return value.get(operation, value.get('default', 0))
+        return value
+
+    def _call(self, operation):
+        """Account for one round trip: count it, wait out the latency, maybe fail."""
+        with self._lock:
+            self.calls[operation] += 1
+            delay = self._setting(self.latency_ms, operation) + self._random.uniform(0, self.jitter_ms or 0)
+            fail = self._random.random() < self._setting(self.failure_rate, operation)
+            for index, pending in enumerate(self._fail_next):
+                if pending is None or pending == operation:
+                    del self._fail_next[index]
+                    fail = True
+                    break
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if fail:
+            raise FakeFirebaseError(f'Injected failure in {operation}')
+
+    # Realtime Database tree
+
+    def _node(self, parts):
+        node = self.rtdb
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def _write(self, parts, value):
+        value = _prune(_resolve_rtdb(copy.deepcopy(value), _now_ms(), self._node(parts)))
+        if not parts:
+            self.rtdb = value if isinstance(value, dict) else {}
+            return
+        parents = [self.rtdb]
+        node = self.rtdb
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = node[part] = {}
+            parents.append(child)
+            node = child
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+        # Like the server, never keep empty parents around
+        for part, parent in zip(reversed(parts[:-1]), reversed(parents[:-1])):
+            if parent.get(part) == {}:
+                del parent[part]
+
+    def _push_key(self):
+        now = _now_ms()
+        with self._lock:
+            if now == self._last_push_time:
+                index = len(self._push_suffix) - 1
+                while index >= 0 and self._push_suffix[index] == 63:
+                    self._push_suffix[index] = 0
+                    index -= 1
+                if index >= 0:
+                    self._push_suffix[index] += 1
+            else:
+                self._push_suffix = [self._random.randrange(64) for _ in range(12)]
+            self._last_push_time = now
+            suffix = list(self._push_suffix)
+        prefix = []
+        for _ in range(8):
+            prefix.append(PUSH_CHARS[now % 64])
+            now //= 64
+        return ''.join(reversed(prefix)) + ''.join(PUSH_CHARS[i] for i in suffix)
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _resolve_rtdb(value, now_ms, existing=None):
+    """Replace server values: the timestamp, and increments of ``existing``."""
+    if isinstance(value, dict) and set(value) == {'.sv'}:
+        server_value = value['.sv']
+        if server_value == RTDB_SERVER_TIMESTAMP['.sv']:
+            return now_ms
+        if isinstance(server_value, dict) and 'increment' in server_value:
+            numeric = isinstance(existing, (int, float)) and not isinstance(existing, bool)
+            return (existing if numeric else 0) + server_value['increment']
+    if isinstance(value, dict):
+        return {
+            str(key): _resolve_rtdb(item, now_ms, existing.get(str(key)) if isinstance(existing, dict) else None)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [_resolve_rtdb(item, now_ms) for item in value]
+    return value
+
+
+def _prune(value):
+    if not isinstance(value, dict):
+        return value
+    pruned = {}
+    for key, item in value.items():
+        item = _prune(item)
+        if item is not None and item != {}:
+            pruned[key] = item
+    return pruned or None
+
+
+def _rtdb_sort_key(value):
+    # Server ordering: null, false, true, numbers, strings, objects
+    if value is None:
+        return (0, 0)
+    if value is False:
+        return (1, 0)
+    if value is True:
+        return (2, 0)
+    if isinstance(value, (int, float)):
+        return (3, value)
+    if isinstance(value, str):
+        return (4, value)
+    return (5, 0)
+
+
+def _rtdb_key_order(key):
+    return (0, int(key), '') if key.isdigit() else (1, 0, key)
+
+
+class FakeReference:
+    """Fake ``firebase_admin.db.Reference``."""
+
+    def __init__(self, fake, parts):
+        self._fake = fake
+        self._parts = parts
+
+    @property
+    def key(self):
+        return self._parts[-1] if self._parts else None
+
+    @property
+    def path(self):
+        return '/' + '/'.join(self._parts)
+
+    @property
+    def parent(self):
+        return FakeReference(self._fake, self._parts[:-1]) if self._parts else None
+
+    def child(self, path):
+        if not path or not isinstance(path, str):
+            raise ValueError(f'Invalid path argument: "{path}". Path must be a non-empty string.')
+        return FakeReference(self._fake, self._parts + _split(path))
+
+    def get(self, etag=False, shallow=False):
+        self._fake._call('rtdb.get')
+        with self._fake._lock:
+            value = self._fake._node(self._parts)
+            if shallow and isinstance(value, dict):
+                value = {key: True if isinstance(item, dict) else item for key, item in value.items()}
+            else:
+                value = copy.deepcopy(value)
+        return (value, str(hash(repr(value)))) if etag else value
+
+    def set(self, value):
+        if value is None:
+            raise ValueError('Value must not be None.')
+        self._fake._call('rtdb.set')
+        with self._fake._lock:
+            self._fake._write(self._parts, value)
+
+    def update(self, value):
+        if not value or not isinstance(value, dict):
+            raise ValueError('Value argument must be a non-empty dictionary.')
+        if None in value.keys():
+            raise ValueError('Dictionary must not contain None keys.')
+        self._fake._call('rtdb.update')
+        with self._fake._lock:
+            # A multi-location update is all-or-nothing, which the lock gives us
+            for path, item in value.items():
+                self._fake._write(self._parts + _split(path), item)
+
+    def push(self, value=''):
+        if value is None:
+            raise ValueError('Value must not be None.')
+        child = self.child(self._fake._push_key())
+        child.set(value)
+        return child
+
+    def delete(self):
+        self._fake._call('rtdb.delete')
+        with self._fake._lock:
+            self._fake._write(self._parts, None)
+
+    def transaction(self, transaction_update):
+        self._fake._call('rtdb.transaction')
+        with self._fake._lock:
+            result = transaction_update(copy.deepcopy(self._fake._node(self._parts)))
+            self._fake._write(self._parts, result)
+            return copy.deepcopy(self._fake._node(self._parts))
+
+    def order_by_child(self, path):
+        if not path or path.startswith('$'):
+            raise ValueError(f'Illegal child path: {path}')
+        return FakeDbQuery(self, ('child', _split(path)))
+
+    def order_by_key(self):
+        return FakeDbQuery(self, ('key', None))
+
+    def order_by_value(self):
+        return FakeDbQuery(self, ('value', None))
+
+
+class FakeDbQuery:
+    """Fake ``firebase_admin.db.Query``; filters are applied on ``get()``."""
+
+    def __init__(self, ref, order):
+        self._ref = ref
+        self._order = order
+        self._start = self._end = None
+        self._limit = None
+
+    def _ordered_value(self, key, value):
+        kind, parts = self._order
+        if kind == 'key':
+            return _rtdb_key_order(str(key))
+        if kind == 'child':
+            for part in parts:
+                value = value.get(part) if isinstance(value, dict) else None
+        return _rtdb_sort_key(value)
+
+    def _bound(self, value):
+        if self._order[0] == 'key':
+            return _rtdb_key_order(str(value))
+        return _rtdb_sort_key(value)
+
+    def start_at(self, start):
+        if start is None:
+            raise ValueError('Start value must not be None.')
+        self._start = start
+        return self
+
+    def end_at(self, end):
+        if end is None:
+            raise ValueError('End value must not be None.')
+        self._end = end
+        return self
+
+    def equal_to(self, value):
+        if value is None:
+            raise ValueError('Equal to value must not be None.')
+        self._start = self._end = value
+        return self
+
+    def limit_to_first(self, limit):
+        if self._limit is not None:
+            raise ValueError('Cannot set both first and last limits.')
+        self._limit = ('first', limit)
+        return self
+
+    def limit_to_last(self, limit):
+        if self._limit is not None:
+            raise ValueError('Cannot set both first and last limits.')
+        self._limit = ('last', limit)
+        return self
+
+    def get(self):
+        fake = self._ref._fake
+        fake._call('rtdb.query')
+        with fake._lock:
+            node = fake._node(self._ref._parts)
+            items = copy.deepcopy(list(node.items())) if isinstance(node, dict) else []
+        rows = sorted(
+            ((self._ordered_value(key, value), key, value) for key, value in items),
+            key=lambda row: (row[0], _rtdb_key_order(row[1])),
+        )
+        if self._start is not None:
+            start = self._bound(self._start)
+            rows = [row for row in rows if row[0] >= start]
+        if self._end is not None:
+            end = self._bound(self._end)
+            rows = [row for row in rows if row[0] <= end]
+        if self._limit is not None:
+            side, limit = self._limit
+            rows = rows[:limit] if side == 'first' else rows[-limit:] if limit else []
+        return OrderedDict((key, value) for _, key, value in rows)
+
+
+# Firestore
+
+def _auto_id(rng):
+    return ''.join(rng.choice(AUTO_ID_CHARS) for _ in range(20))
+
+
+def _resolve_firestore(value, now):
+    from firebase_admin import firestore
+    if value is firestore.SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, dict):
+        return {
+            key: _resolve_firestore(item, now) for key, item in value.items()
+            if item is not firestore.DELETE_FIELD
+        }
+    if isinstance(value, (list, tuple)):
+        return [_resolve_firestore(item, now) for item in value]
+    return value
+
+
+def _merge(target, updates):
+    from firebase_admin import firestore
+    for key, value in updates.items():
+        if value is firestore.DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = _resolve_firestore(value, datetime.now(dt_timezone.utc))
+
+
+def _field(data, field_path):
+    value = data
+    for part in field_path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            raise KeyError(field_path)
+        value = value[part]
+    return value
+
+
+_MISSING = object()
+
+
+def _field_or_missing(data, field_path):
+    try:
+        return _field(data, field_path)
+    except KeyError:
+        return _MISSING
+
+
+_COMPARATORS = {
+    '==': lambda value, operand: value == operand,
+    '!=': lambda value, operand: value != operand,
+    '<': lambda value, operand: value < operand,
+    '<=': lambda value, operand: value <= operand,
+    '>': lambda value, operand: value > operand,
+    '>=': lambda value, operand: value >= operand,
+    'in': lambda value, operand: value in operand,
+    'not-in': lambda value, operand: value not in operand,
+    'array_contains': lambda value, operand: isinstance(value, list) and operand in value,
+    'array_contains_any': lambda value, operand: isinstance(value, list) and any(item in value for item in operand),
+}
+
+
+class FakeDocumentSnapshot:
+    """Fake ``DocumentSnapshot``."""
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self._data = data
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+    def get(self, field_path):
+        if self._data is None:
+            return None
+        return copy.deepcopy(_field(self._data, field_path))
+
+
+class FakeDocumentReference:
+    """Fake ``DocumentReference``."""
+
+    def __init__(self, fake, parts):
+        self._fake = fake
+        self._parts = parts
+
+    @property
+    def id(self):
+        return self._parts[-1]
+
+    @property
+    def path(self):
+        return '/'.join(self._parts)
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._fake, self._parts[:-1])
+
+    def collection(self, collection_id):
+        return FakeCollectionReference(self._fake, self._parts + _split(collection_id))
+
+    def get(self, field_paths=None):
+        self._fake._call('firestore.get')
+        with self._fake._lock:
+            data = copy.deepcopy(self._fake.documents.get(self.path))
+        return FakeDocumentSnapshot(self, data)
+
+    def set(self, document_data, merge=False):
+        self._fake._call('firestore.set')
+        self._set(document_data, merge)
+
+    def update(self, field_updates):
+        self._fake._call('firestore.update')
+        self._update(field_updates)
+
+    def delete(self):
+        self._fake._call('firestore.delete')
+        self._delete()
+
+    def _set(self, document_data, merge=False):
+        with self._fake._lock:
+            existing = self._fake.documents.get(self.path)
+            if merge and existing is not None:
+                data = copy.deepcopy(existing)
+                _merge(data, copy.deepcopy(document_data))
+            else:
+                data = _resolve_firestore(copy.deepcopy(document_data), datetime.now(dt_timezone.utc))
+            self._fake.documents[self.path] = data
+
+    def _update(self, field_updates):
+        from firebase_admin import firestore
+        now = datetime.now(dt_timezone.utc)
+        with self._fake._lock:
+            existing = self._fake.documents.get(self.path)
+            if existing is None:
+                raise api_exceptions.NotFound(f'No document to update: {self.path}')
+            data = copy.deepcopy(existing)
+            for field_path, value in field_updates.items():
+                # Dotted paths address nested fields, as in the SDK
+                *parents, last = field_path.split('.')
+                node = data
+                for part in parents:
+                    if not isinstance(node.get(part), dict):
+                        node[part] = {}
+                    node = node[part]
+                if value is firestore.DELETE_FIELD:
+                    node.pop(last, None)
+                else:
+                    node[last] = _resolve_firestore(copy.deepcopy(value), now)
+            self._fake.documents[self.path] = data
+
+    def _delete(self):
+        with self._fake._lock:
+            self._fake.documents.pop(self.path, None)
+
+
+class FakeFirestoreQuery:
+    """Fake Firestore ``Query``; each builder call returns a new query."""
+
+    def __init__(self, collection, filters=(), orders=(), limit=None, start=None):
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._start = start
+
+    def _copy(self, **changes):
+        state = {'filters': self._filters, 'orders': self._orders, 'limit': self._limit, 'start': self._start}
+        state.update(changes)
+        return FakeFirestoreQuery(self._collection, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in _COMPARATORS:
+            raise ValueError(f'Operator string {op_string!r} is invalid.')
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_at(self, document_fields):
+        return self._copy(start=(document_fields, True))
+
+    def start_after(self, document_fields):
+        return self._copy(start=(document_fields, False))
+
+    def _order_values(self, path, data):
+        return tuple(
+            path.rsplit('/', 1)[-1] if field_path == '__name__' else _field(data, field_path)
+            for field_path, _ in self._orders
+        )
+
+    def _cursor_values(self):
+        # Ascending orders only; a dict cursor names the order fields
+        document_fields, inclusive = self._start
+        if isinstance(document_fields, dict):
+            document_fields = [document_fields[field_path] for field_path, _ in self._orders]
+        return tuple(document_fields), inclusive
+
+    def stream(self, transaction=None):
+        return iter(self.get())
+
+    def get(self, transaction=None):
+        fake = self._collection._fake
+        fake._call('firestore.query')
+        prefix = self._collection.path + '/'
+        with fake._lock:
+            rows = [
+                (path, copy.deepcopy(data)) for path, data in fake.documents.items()
+                if path.startswith(prefix) and '/' not in path[len(prefix):]
+            ]
+        rows.sort(key=lambda row: row[0])
+        for field_path, op_string, operand in self._filters:
+            matches = []
+            for path, data in rows:
+                value = _field_or_missing(data, field_path)
+                try:
+                    if value is not _MISSING and _COMPARATORS[op_string](value, operand):
+                        matches.append((path, data))
+                except TypeError:
+                    continue
+            rows = matches
+        for field_path, direction in reversed(self._orders):
+            if field_path == '__name__':
+                rows.sort(key=lambda row: row[0], reverse=direction == 'DESCENDING')
+                continue
+            # Documents without the field are left out, as on the server
+            rows = [row for row in rows if _field_or_missing(row[1], field_path) is not _MISSING]
+            rows.sort(key=lambda row: _field(row[1], field_path), reverse=direction == 'DESCENDING')
+        if self._start is not None:
+            cursor, inclusive = self._cursor_values()
+            rows = [
+                row for row in rows
+                if self._order_values(*row) > cursor or (inclusive and self._order_values(*row) == cursor)
+            ]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return [FakeDocumentSnapshot(FakeDocumentReference(fake, _split(path)), data) for path, data in rows]
+
+
+class FakeCollectionReference(FakeFirestoreQuery):
+    """Fake ``CollectionReference``."""
+
+    def __init__(self, fake, parts):
+        self._fake = fake
+        self._parts = parts
+        super().__init__(self)
+
+    @property
+    def id(self):
+        return self._parts[-1]
+
+    @property
+    def path(self):
+        return '/'.join(self._parts)
+
+    def document(self, document_id=None):
+        document_id = document_id or _auto_id(self._fake._random)
+        return FakeDocumentReference(self._fake, self._parts + _split(document_id))
+
+    def add(self, document_data, document_id=None):
+        self._fake._call('firestore.add')
+        ref = self.document(document_id)
+        ref._set(document_data)
+        return datetime.now(dt_timezone.utc), ref
+
+    def list_documents(self, page_size=None):
+        prefix = self.path + '/'
+        with self._fake._lock:
+            paths = sorted(path for path in self._fake.documents if path.startswith(prefix))
+        return [FakeDocumentReference(self._fake, _split(path)) for path in paths if '/' not in path[len(prefix):]]
+
+
+class FakeWriteBatch:
+    """Fake ``WriteBatch``: the writes apply together on ``commit()``."""
+
+    def __init__(self, fake):
+        self._fake = fake
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append((reference._set, (document_data, merge)))
+
+    def update(self, reference, field_updates):
+        self._writes.append((reference._update, (field_updates,)))
+
+    def delete(self, reference):
+        self._writes.append((reference._delete, ()))
+
+    def commit(self):
+        self._fake._call('firestore.commit')
+        with self._fake._lock:
+            snapshot = copy.deepcopy(self._fake.documents)
+            try:
+                for write, args in self._writes:
+                    write(*args)
+            except Exception:
+                self._fake.documents = snapshot
+                raise
+        self._writes = []
+
+
+class FakeFirestoreClient:
+    """Fake ``google.cloud.firestore.Client``."""
+
+    def __init__(self, fake):
+        self._fake = fake
+        self.project = fake.project_id
+
+    def collection(self, *path):
+        return FakeCollectionReference(self._fake, _split('/'.join(path)))
+
+    def document(self, *path):
+        return FakeDocumentReference(self._fake, _split('/'.join(path)))
+
+    def batch(self):
+        return FakeWriteBatch(self._fake)
+
+
+_fake_firebase = None
+_fake_lock = threading.Lock()
+
+
+def get_fake_firebase():
+    """Return the process-wide fake, configured from ``settings.FIREBASE_FAKE_*``."""
+    global _fake_firebase
+    if _fake_firebase is None:
+        from django.conf import settings
+        with _fake_lock:
+            if _fake_firebase is None:
+                _fake_firebase = FakeFirebase(
+                    latency_ms=getattr(settings, 'FIREBASE_FAKE_LATENCY_MS', 0),
+                    jitter_ms=getattr(settings, 'FIREBASE_FAKE_JITTER_MS', 0),
+                    failure_rate=getattr(settings, 'FIREBASE_FAKE_FAILURE_RATE', 0.0),
+                    seed=getattr(settings, 'FIREBASE_FAKE_SEED', None),
+                )
+    return _fake_firebase
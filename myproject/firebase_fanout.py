@@ -0,0 +1,110 @@
+"""
+Concurrent fan-out of independent Firebase reads within one request.
+
+``fan_out({'profile': read_profile, 'members': read_members})`` starts the
+calls together on a shared per-process thread pool and waits for them up to
+``FIREBASE_FANOUT_TIMEOUT`` seconds, so a page that needs several reads
+waits about as long as the slowest one instead of their sum.
+
+``results.get(name)`` returns a call's value or raises what it raised, or
+``FanOutTimeout`` when it missed the deadline. Callers keep their usual
+per-source ``try``/``except``. A call that misses the deadline keeps
+running on the pool but its result is dropped.
+
+Calls should be Firebase reads. Anything touching the ORM runs on a pool
+thread with its own connection, which is closed once the call returns.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+THREAD_NAME_PREFIX = 'firebase-fanout'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class FanOutTimeout(TimeoutError):
+    """A fanned-out call did not finish before the request's deadline."""
+
+
+class FanOutResults:
+    """Outcome of each call passed to ``fan_out()``, by name."""
+
+    def __init__(self):
+        self._values = {}
+        self._errors = {}
+
+    def get(self, name):
+        """Return the value of call ``name``, or raise its exception."""
+        if name in self._errors:
+            raise self._errors[name]
+        return self._values[name]
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'FIREBASE_FANOUT_WORKERS', 16),
+                    thread_name_prefix=THREAD_NAME_PREFIX,
+                )
+    return _executor
+
+
+def _reset_after_fork():
+    # Pool threads don't survive fork; the child builds its own pool
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _run(call):
+    try:
+        return call()
+    finally:
+        connections.close_all()
+
+
+def fan_out(calls, timeout=None):
+    """Run the zero-argument ``calls`` (name to callable) concurrently; return ``FanOutResults``."""
+    results = FanOutResults()
+    timeout = getattr(settings, 'FIREBASE_FANOUT_TIMEOUT', 5.0) if timeout is None else timeout
+    # A single call, or a call made from a pool thread (which could wait
+    # on its own pool), gains nothing from the pool
+    if len(calls) <= 1 or threading.current_thread().name.startswith(THREAD_NAME_PREFIX):
+        for name, call in calls.items():
+            try:
+                results._values[name] = call()
+            except Exception as e:
+                results._errors[name] = e
+        return results
+
+    start = time.perf_counter()
+    executor = _get_executor()
+    futures = {name: executor.submit(_run, call) for name, call in calls.items()}
+    wait(futures.values(), timeout=timeout)
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            results._errors[name] = FanOutTimeout(f"{name} did not finish within {timeout}s")
+            logger.warning(f"Firebase fan-out call {name} missed the {timeout}s deadline")
+        elif future.exception() is not None:
+            results._errors[name] = future.exception()
+        else:
+            results._values[name] = future.result()
+    logger.debug(f"Fanned out {len(calls)} Firebase calls in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return results
@@ -0,0 +1,149 @@
+"""
+Lookup indexes kept next to the ``users`` node in the Realtime Database.
+
+``phone_index/{phone_key}`` maps a normalized phone number to the key of the
+user's record under ``users``, ``referral_codes/{code}`` maps a referral
+code back to its owner and ``referrals/{code}/{user_key}`` holds a small
+summary of every user who registered with that code. They are written in
+the same multi-location update as the user record, so resolving a phone
+number, a referral code or a team is a keyed read instead of a download of
+every user.
+"""
+import logging
+from typing import Optional
+
+from django.utils import timezone
+
+from .phone_utils import firebase_key_for_phone, normalize_phone_number
+
+logger = logging.getLogger(__name__)
+
+USERS_NODE = 'users'
+PHONE_INDEX_NODE = 'phone_index'
+REFERRAL_CODES_NODE = 'referral_codes'
+REFERRALS_NODE = 'referrals'
+
+
+def phone_index_key(phone: str) -> str:
+    """Return the ``phone_index`` key for any accepted phone format."""
+    return firebase_key_for_phone(normalize_phone_number(phone))
+
+
+def referral_code_entry(firebase_key: str, phone_number: str) -> dict:
+    """Return the ``referral_codes/{code}`` record for a user."""
+    return {
+        'firebase_key': firebase_key,
+        'username': phone_number,
+        'phone_number': phone_number,
+        'created_at': timezone.now().isoformat(),
+    }
+
+
+def _as_float(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def referral_member_entry(user_data: dict) -> dict:
+    """Return the ``referrals/{code}/{user_key}`` summary for a referred user.
+
+    Invested and earned totals use the larger of the stored field and the
+    sum of completed transactions, the same rule the team page has always
+    applied to full user records.
+    """
+    transactions = user_data.get('transactions') or {}
+    if not isinstance(transactions, dict):
+        transactions = {}
+
+    transaction_invested = 0.0
+    transaction_earnings = 0.0
+    for tx_data in transactions.values():
+        if not isinstance(tx_data, dict) or tx_data.get('status') != 'completed':
+            continue
+        tx_type = tx_data.get('type', '')
+        if tx_type in ('investment', 'deposit', 'add_funds'):
+            transaction_invested += _as_float(tx_data.get('amount'))
+        elif tx_type in ('daily_earning', 'profit', 'earning'):
+            transaction_earnings += _as_float(tx_data.get('amount'))
+
+    phone_number = user_data.get('phone_number', '')
+    balance = _as_float(user_data.get('balance'))
+    total_invested = max(_as_float(user_data.get('total_invested')), transaction_invested)
+    total_earnings = max(_as_float(user_data.get('total_earnings')), transaction_earnings)
+
+    return {
+        'phone_number': phone_number,
+        'display_name': (
+            user_data.get('display_name') or user_data.get('username')
+            or user_data.get('first_name') or phone_number
+        ),
+        'date_joined': user_data.get('date_joined') or user_data.get('created_at') or '',
+        'balance': balance,
+        'total_invested': total_invested,
+        'total_earnings': total_earnings,
+        'transaction_count': len(transactions),
+        'is_active': balance > 0 or total_invested > 0 or len(transactions) > 1,
+    }
+
+
+def user_index_updates(firebase_key: str, user_data: dict) -> dict:
+    """Return the multi-location update that writes a user and its indexes.
+
+    Pass the result to ``reference('/').update(...)`` so the user record,
+    its phone index entry and its referral code entry are committed
+    together or not at all.
+    """
+    updates = {f'{USERS_NODE}/{firebase_key}': user_data}
+
+    phone_number = user_data.get('phone_number')
+    if phone_number:
+        updates[f'{PHONE_INDEX_NODE}/{phone_index_key(phone_number)}'] = firebase_key
+
+    referral_code = user_data.get('referral_code')
+    if referral_code:
+        updates[f'{REFERRAL_CODES_NODE}/{referral_code}'] = referral_code_entry(
+            firebase_key, phone_number or ''
+        )
+
+    referred_by_code = user_data.get('referred_by_code')
+    if referred_by_code:
+        updates[f'{REFERRALS_NODE}/{referred_by_code}/{firebase_key}'] = referral_member_entry(user_data)
+
+    return updates
+
+
+def find_user_key_by_phone(root_ref, phone: str) -> Optional[str]:
+    """Resolve a phone number to its ``users`` key.
+
+    Uses the phone index first. Accounts created before the index existed
+    are keyed by their phone digits, so those are checked with one more
+    keyed read before giving up.
+    """
+    if not phone:
+        return None
+
+    index_key = phone_index_key(phone)
+    firebase_key = root_ref.child(PHONE_INDEX_NODE).child(index_key).get()
+    if firebase_key:
+        return firebase_key
+
+    for legacy_key in dict.fromkeys([index_key, firebase_key_for_phone(phone)]):
+        if legacy_key and root_ref.child(USERS_NODE).child(legacy_key).get(shallow=True):
+            logger.info(f"Phone index miss for {index_key}, resolved legacy key {legacy_key}")
+            return legacy_key
+
+    return None
+
+
+def find_referral_code(root_ref, referral_code: str) -> Optional[dict]:
+    """Return the ``referral_codes`` entry for ``referral_code``, if any."""
+    if not referral_code:
+        return None
+    return root_ref.child(REFERRAL_CODES_NODE).child(referral_code).get() or None
+
+
+def referral_code_exists(root_ref, referral_code: str) -> bool:
+    """Return True when ``referral_code`` is already assigned to a user."""
+    return find_referral_code(root_ref, referral_code) is not None
@@ -0,0 +1,238 @@
+"""
+``FirebaseProfile`` as a read replica of the Realtime Database ``users`` node.
+
+The mirror_firebase_users command listens to ``users`` and feeds every
+event to a ``UserMirror``. The stream's first event carries the whole node,
+so a (re)started listener always begins with a full reload. Later events
+carry only the records or fields that changed. Events are buffered and
+written every few seconds as one transaction: a bulk upsert of changed
+records, a bulk update of changed fields and a bulk delete of removed users.
+
+Each flush also bumps the ``mirror`` ``FirebaseSyncCheckpoint``. Readers
+call ``mirror_is_fresh()`` and use ``FirebaseProfile`` only while the
+mirror has finished a full load and flushed within
+``FIREBASE_MIRROR_STALE_AFTER`` seconds. Otherwise they fall back to
+Firebase.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import FirebaseProfile, FirebaseSyncCheckpoint
+
+logger = logging.getLogger(__name__)
+
+USERS_NODE = 'users'
+MIRROR_CHECKPOINT = 'mirror'
+# Checkpoint position once a full load has been written
+MIRROR_READY = 'ready'
+UPSERT_BATCH_SIZE = 500
+
+# FirebaseProfile column -> RTDB user fields it is read from, first non-empty wins
+COLUMN_SOURCES = {
+    'email': ('email',),
+    'display_name': ('display_name', 'username', 'first_name'),
+    'phone_number': ('phone_number',),
+    'is_active': ('is_active',),
+    'balance': ('balance',),
+    'withdrawable_balance': ('withdrawable_balance',),
+    'non_withdrawable_bonus': ('non_withdrawable_bonus',),
+    'total_earnings': ('total_earnings',),
+    'total_invested': ('total_invested',),
+    'referral_code': ('referral_code',),
+    'referred_by_code': ('referred_by_code',),
+    'date_joined': ('date_joined', 'created_at'),
+    'last_login': ('last_login',),
+    'source_updated_at': ('updated_at',),
+}
+MIRRORED_COLUMNS = list(COLUMN_SOURCES)
+_DECIMAL_LIMIT = Decimal('9999999999.99')
+
+
+def _to_decimal(value):
+    try:
+        amount = Decimal(str(value or 0)).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        return Decimal('0')
+    return amount if -_DECIMAL_LIMIT <= amount <= _DECIMAL_LIMIT else Decimal('0')
+
+
+def _to_datetime(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # RTDB server timestamps are milliseconds since the epoch
+        return datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+    if isinstance(value, str):
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            return None
+        if parsed is not None and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        return parsed
+    return None
+
+
+def _column_value(column, value):
+    field = FirebaseProfile._meta.get_field(column)
+    internal_type = field.get_internal_type()
+    if internal_type == 'DecimalField':
+        return _to_decimal(value)
+    if internal_type == 'BooleanField':
+        return bool(value) if value is not None else True
+    if internal_type == 'DateTimeField':
+        parsed = _to_datetime(value)
+        return parsed if parsed is not None or field.null else timezone.now()
+    if value is None or value == '':
+        return '' if column == 'source_updated_at' else None
+    return str(value)[:field.max_length]
+
+
+def profile_values(record, partial=False):
+    """Return FirebaseProfile column values for an RTDB user ``record``.
+
+    With ``partial``, ``record`` holds only changed fields, and only the
+    columns read from those fields are returned.
+    """
+    values = {}
+    for column, sources in COLUMN_SOURCES.items():
+        if partial and not any(source in record for source in sources):
+            continue
+        value = next((record[source] for source in sources if record.get(source) not in (None, '')), None)
+        values[column] = _column_value(column, value)
+    return values
+
+
+def upsert_profiles(records):
+    """Insert or update one ``FirebaseProfile`` per ``records`` item (key to full record)."""
+    profiles = [
+        FirebaseProfile(firebase_uid=key, **profile_values(record))
+        for key, record in records.items()
+    ]
+    FirebaseProfile.objects.bulk_create(
+        profiles, batch_size=UPSERT_BATCH_SIZE,
+        update_conflicts=True, unique_fields=['firebase_uid'], update_fields=MIRRORED_COLUMNS + ['synced_at'],
+    )
+    return len(profiles)
+
+
+class _Fields(dict):
+    """Changed fields of a record whose full value was not in the stream."""
+
+
+class UserMirror:
+    """Buffers ``users`` stream events and writes them to ``FirebaseProfile``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._full_keys = None
+
+    def handle_event(self, event_type, path, data):
+        """Record a stream event; ``path`` is relative to the ``users`` node."""
+        parts = [part for part in (path or '').split('/') if part]
+        with self._lock:
+            if event_type == 'patch':
+                # A patch sets each child it names
+                for child, value in (data or {}).items():
+                    self._put(parts + [part for part in child.split('/') if part], value)
+            else:
+                self._put(parts, data)
+
+    def _put(self, parts, data):
+        if not parts:
+            records = data if isinstance(data, dict) else {}
+            self._pending = {key: record for key, record in records.items() if isinstance(record, dict)}
+            self._full_keys = set(self._pending)
+            return
+        key = parts[0]
+        if len(parts) == 1:
+            self._pending[key] = data if isinstance(data, dict) else None
+            return
+        if len(parts) > 2:
+            # Nested data (transactions, ...) is not mirrored
+            return
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = _Fields()
+        pending[parts[1]] = data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Write everything buffered in one transaction; return the number of users touched."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            full_keys, self._full_keys = self._full_keys, None
+
+        full = {key: value for key, value in pending.items() if isinstance(value, dict) and not isinstance(value, _Fields)}
+        fields = {key: value for key, value in pending.items() if isinstance(value, _Fields)}
+        deleted = [key for key, value in pending.items() if value is None]
+
+        existing = FirebaseProfile.objects.in_bulk(list(fields)) if fields else {}
+        missing = [key for key in fields if key not in existing]
+        if missing:
+            # Only some fields of a user we have no row for: read the record once
+            from .firebase_app import get_database_reference
+            users = get_database_reference(USERS_NODE)
+            for key in missing:
+                record = users.child(key).get()
+                if isinstance(record, dict):
+                    full[key] = record
+
+        changed = []
+        columns = {'synced_at'}
+        now = timezone.now()
+        for key, profile in existing.items():
+            values = profile_values(fields[key], partial=True)
+            if values:
+                for column, value in values.items():
+                    setattr(profile, column, value)
+                # bulk_update() does not apply auto_now
+                profile.synced_at = now
+                columns.update(values)
+                changed.append(profile)
+
+        with transaction.atomic():
+            if full_keys is not None:
+                FirebaseProfile.objects.exclude(firebase_uid__in=full_keys).delete()
+            if deleted:
+                FirebaseProfile.objects.filter(firebase_uid__in=deleted).delete()
+            if full:
+                upsert_profiles(full)
+            if changed:
+                FirebaseProfile.objects.bulk_update(changed, sorted(columns), batch_size=UPSERT_BATCH_SIZE)
+            checkpoint, _ = FirebaseSyncCheckpoint.objects.select_for_update().get_or_create(source=MIRROR_CHECKPOINT)
+            if full_keys is not None:
+                checkpoint.position = MIRROR_READY
+            checkpoint.records_synced += len(full) + len(changed) + len(deleted)
+            checkpoint.save()
+
+        touched = len(full) + len(changed) + len(deleted)
+        if touched:
+            logger.info(
+                f"Mirrored {touched} Firebase users "
+                f"({len(full)} upserted, {len(changed)} updated, {len(deleted)} deleted)"
+            )
+        return touched
+
+
+def mirror_is_fresh():
+    """True when ``FirebaseProfile`` holds a full load and the mirror flushed recently."""
+    stale_after = getattr(settings, 'FIREBASE_MIRROR_STALE_AFTER', 120)
+    return FirebaseSyncCheckpoint.objects.filter(
+        source=MIRROR_CHECKPOINT, position=MIRROR_READY,
+        updated_at__gte=timezone.now() - timedelta(seconds=stale_after),
+    ).exists()
+
+
+def mark_mirror_stale():
+    """Stop readers using the mirror until the next full load (e.g. when its listener dies)."""
+    FirebaseSyncCheckpoint.objects.filter(source=MIRROR_CHECKPOINT).update(position='')
@@ -0,0 +1,388 @@
+"""
+Write-behind queue for Realtime Database and Firestore writes.
+
+Views enqueue writes as ``FirebaseWrite`` rows (one local INSERT) instead of
+calling Firebase inside the request. A worker, either a daemon thread
+started on first use in each web process or the process_firebase_queue
+command, drains the rows in id order:
+
+- Consecutive writes to the same node or document are coalesced into one
+  call, so ten ``last_activity`` updates for a user become one update.
+- Failed writes are retried with exponential backoff. Later writes to the
+  same path, or to a parent or child of it, wait behind them, so order is
+  preserved per path. A Firestore update of a missing document is failed
+  at once, since retrying cannot create it, and blocks nothing.
+- A multi-location RTDB update (``enqueue_rtdb_multi_update``) or a
+  Firestore batch (``enqueue_firestore_batch``) is one row and one call,
+  applied all-or-nothing. It is ordered against every path it touches.
+- Cached records (``firebase_cache``) under a written path are dropped
+  when the write is queued and again when it is applied.
+- Rows are claimed (marked ``in_flight``) in a short transaction and the
+  Firebase calls run with no transaction or row lock held. A claim left
+  behind by a worker that died expires after
+  ``FIREBASE_QUEUE_CLAIM_TIMEOUT`` seconds.
+
+Use ``SERVER_TIMESTAMP`` in a payload where the server time is wanted; it is
+replaced with the RTDB / Firestore sentinel when the write is applied.
+``APPLIED_AT`` is replaced with the ISO-8601 UTC time the worker sends the
+write, for RTDB ``updated_at`` stamps, which ``firebase_sync`` orders as
+strings and which must not be older than the moment the record changes.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .firebase_cache import invalidate_paths
+from .models import FirebaseWrite
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMESTAMP = '__server_timestamp__'
+APPLIED_AT = '__applied_at__'
+
+MAX_WRITE_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 15 * 60
+FIRESTORE_BATCH_LIMIT = 500
+
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def enqueue_write(target, operation, path, payload):
+    """Queue one write; returns the ``FirebaseWrite`` row."""
+    write = FirebaseWrite.objects.create(
+        target=target, operation=operation, path=path.strip('/'), payload=payload
+    )
+    invalidate_paths(target, [key for _, key in write_keys(target, operation, write.path, payload)])
+    if getattr(settings, 'FIREBASE_QUEUE_AUTOSTART', True):
+        start_firebase_queue()
+    transaction.on_commit(_wakeup.set)
+    return write
+
+
+def enqueue_rtdb_set(path, data):
+    return enqueue_write('rtdb', 'set', path, data)
+
+
+def enqueue_rtdb_update(path, data):
+    return enqueue_write('rtdb', 'update', path, data)
+
+
+def enqueue_firestore_set(document_path, data, merge=False):
+    return enqueue_write('firestore', 'merge' if merge else 'set', document_path, data)
+
+
+def enqueue_firestore_update(document_path, data):
+    return enqueue_write('firestore', 'update', document_path, data)
+
+
+def enqueue_firestore_add(collection_path, data):
+    return enqueue_write('firestore', 'add', collection_path, data)
+
+
+def enqueue_rtdb_multi_update(updates):
+    """Queue one root ``update()`` writing every ``{path: value}`` in ``updates`` atomically."""
+    return enqueue_write('rtdb', 'update', '', {path.strip('/'): value for path, value in updates.items()})
+
+
+def enqueue_firestore_batch(operations):
+    """Queue one Firestore ``WriteBatch``.
+
+    ``operations`` is a list of ``(operation, path, data)`` where operation
+    is 'set', 'merge' or 'update' on a document path, or 'add' on a
+    collection path (a new auto-id document).
+    """
+    if len(operations) > FIRESTORE_BATCH_LIMIT:
+        raise ValueError(f'A Firestore batch holds at most {FIRESTORE_BATCH_LIMIT} writes')
+    ops = [{'op': operation, 'path': path.strip('/'), 'data': data} for operation, path, data in operations]
+    return enqueue_write('firestore', 'batch', '', {'ops': ops})
+
+
+def write_keys(target, operation, path, payload):
+    """Return the ``(target, path)`` pairs a queued write touches."""
+    if operation == 'batch':
+        return [(target, op['path']) for op in (payload or {}).get('ops', [])]
+    if target == 'rtdb' and operation == 'update' and not path:
+        return [(target, key) for key in payload or {}]
+    return [(target, path)]
+
+
+class CoalescedWrite:
+    """One Firebase call standing in for one or more queued rows."""
+
+    def __init__(self, write):
+        self.target = write.target
+        self.operation = write.operation
+        self.path = write.path
+        self.payload = dict(write.payload or {})
+        self.writes = [write]
+        self.keys = write_keys(self.target, self.operation, self.path, self.payload)
+
+    @property
+    def key(self):
+        return (self.target, self.path)
+
+    def absorb(self, write):
+        """Fold ``write`` into this call if the result is the same; return success."""
+        if 'add' in (write.operation, self.operation) or 'batch' in (write.operation, self.operation):
+            return False
+        if not write.path or not self.path:
+            return False  # Multi-location updates stay one call each
+        payload = write.payload or {}
+        if write.operation == 'set':
+            # A later set replaces everything queued before it
+            self.operation = 'set'
+            self.payload = dict(payload)
+        elif _is_flat(payload) and _is_flat(self.payload) and (
+            write.operation == self.operation or self.operation == 'set'
+        ):
+            if write.operation == 'merge' and any(isinstance(v, dict) for v in payload.values()):
+                return False  # set(merge=True) merges nested maps; keep it separate
+            self.payload.update(payload)
+        else:
+            return False
+        self.writes.append(write)
+        return True
+
+
+def _is_flat(payload):
+    """True when no key addresses a nested child ('a/b' in RTDB, 'a.b' in Firestore)."""
+    return not any('/' in key or '.' in key for key in payload)
+
+
+def coalesce_writes(writes):
+    """Group ``writes`` (in id order) into the fewest calls with the same outcome."""
+    calls = []
+    last_call = {}
+    for write in writes:
+        call = last_call.get((write.target, write.path))
+        if call is not None and call.absorb(write):
+            continue
+        call = CoalescedWrite(write)
+        calls.append(call)
+        # Writes queued after this one must not be folded into an earlier call
+        # on an ancestor or descendant path, or they would jump ahead of it
+        for key in [key for key in last_call if _blocking(key, call.keys) is not None]:
+            del last_call[key]
+        if call.path:
+            last_call[call.key] = call
+    return calls
+
+
+def _overlaps(path, other):
+    return path == other or path.startswith(f'{other}/') or other.startswith(f'{path}/')
+
+
+def _blocking(key, keys):
+    """Return the first of ``keys`` on the same target whose path overlaps ``key``."""
+    target, path = key
+    return next((other for other in keys if other[0] == target and _overlaps(other[1], path)), None)
+
+
+def _first_blocking(keys, blockers):
+    """Return the first of ``blockers`` that overlaps any of ``keys``."""
+    for key in keys:
+        blocker = _blocking(key, blockers)
+        if blocker is not None:
+            return blocker
+    return None
+
+
+def _resolve_timestamps(value, sentinel, applied_at):
+    if value == SERVER_TIMESTAMP:
+        return sentinel
+    if value == APPLIED_AT:
+        return applied_at
+    if isinstance(value, dict):
+        return {key: _resolve_timestamps(item, sentinel, applied_at) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_resolve_timestamps(item, sentinel, applied_at) for item in value]
+    return value
+
+
+def apply_write(call):
+    """Perform one coalesced write against Firebase."""
+    from firebase_admin import firestore
+
+    from .firebase_app import (
+        RTDB_SERVER_TIMESTAMP, get_database_reference, get_firebase_app, get_firestore_client,
+    )
+
+    app = get_firebase_app()
+    if getattr(app, 'project_id', None) == 'firebase-unavailable':
+        raise RuntimeError('Firebase is unavailable')
+
+    applied_at = timezone.now().isoformat()
+    if call.target == 'rtdb':
+        payload = _resolve_timestamps(call.payload, RTDB_SERVER_TIMESTAMP, applied_at)
+        ref = get_database_reference(f'/{call.path}')
+        if call.operation == 'set':
+            ref.set(payload)
+        else:
+            ref.update(payload)
+        return
+
+    payload = _resolve_timestamps(call.payload, firestore.SERVER_TIMESTAMP, applied_at)
+    client = get_firestore_client()
+    if call.operation == 'batch':
+        batch = client.batch()
+        for op in payload['ops']:
+            if op['op'] == 'add':
+                batch.set(client.collection(op['path']).document(), op['data'])
+            elif op['op'] == 'update':
+                batch.update(client.document(op['path']), op['data'])
+            else:
+                batch.set(client.document(op['path']), op['data'], merge=op['op'] == 'merge')
+        batch.commit()
+    elif call.operation == 'add':
+        client.collection(call.path).add(payload)
+    elif call.operation == 'update':
+        client.document(call.path).update(payload)
+    else:
+        client.document(call.path).set(payload, merge=call.operation == 'merge')
+
+
+def _is_permanent(error):
+    """True for errors a retry cannot fix: updating a Firestore document that does not exist."""
+    from google.api_core import exceptions as api_exceptions
+
+    return isinstance(error, api_exceptions.NotFound)
+
+
+def _retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def _claim_writes(batch_size, now):
+    """Mark up to ``batch_size`` due writes in flight and return them, in id order.
+
+    A short transaction: the rows are locked only while they are claimed.
+    The claim lasts ``FIREBASE_QUEUE_CLAIM_TIMEOUT`` seconds, after which a
+    worker that died mid-call is assumed gone and the rows are due again.
+    """
+    lease = timedelta(seconds=getattr(settings, 'FIREBASE_QUEUE_CLAIM_TIMEOUT', 300))
+    with transaction.atomic():
+        # Paths with a write waiting out a retry, or being written by another
+        # worker, must not be overtaken
+        waiting = set()
+        for target, operation, path, payload in (
+            FirebaseWrite.objects.filter(status__in=['pending', 'in_flight'], next_attempt_at__gt=now)
+            .values_list('target', 'operation', 'path', 'payload')
+        ):
+            waiting.update(write_keys(target, operation, path, payload))
+        due = (
+            FirebaseWrite.objects.select_for_update(skip_locked=True)
+            .filter(status__in=['pending', 'in_flight'], next_attempt_at__lte=now)
+            .order_by('id')[:batch_size]
+        )
+        writes = [
+            write for write in due
+            if _first_blocking(write_keys(write.target, write.operation, write.path, write.payload), waiting) is None
+        ]
+        if writes:
+            FirebaseWrite.objects.filter(id__in=[write.id for write in writes]).update(
+                status='in_flight', next_attempt_at=now + lease,
+            )
+    return writes
+
+
+def _record_applied(call):
+    with transaction.atomic():
+        FirebaseWrite.objects.filter(id__in=[write.id for write in call.writes]).delete()
+
+
+def _record_retry(writes):
+    with transaction.atomic():
+        FirebaseWrite.objects.bulk_update(
+            writes, ['attempts', 'last_error', 'next_attempt_at', 'status', 'processed_at']
+        )
+
+
+def drain_firebase_queue(batch_size=200):
+    """Apply up to ``batch_size`` due writes; return how many rows were handled.
+
+    Rows are claimed in one short transaction, written to Firebase with no
+    transaction open, and each call's outcome is recorded in its own.
+    """
+    now = timezone.now()
+    writes = _claim_writes(batch_size, now)
+    if not writes:
+        return 0
+
+    applied = 0
+    blocked = {}
+    for call in coalesce_writes(writes):
+        blocker = _first_blocking(call.keys, blocked)
+        if blocker is not None:
+            # An earlier write to this path (or a parent/child) failed; wait behind it
+            for write in call.writes:
+                write.status = 'pending'
+                write.next_attempt_at = blocked[blocker]
+            _record_retry(call.writes)
+            continue
+        try:
+            apply_write(call)
+        except Exception as e:
+            permanent = _is_permanent(e)
+            logger.warning(f"Firebase {call.target} {call.operation} {call.path} failed: {e}")
+            failed_at = timezone.now()
+            for write in call.writes:
+                write.attempts += 1
+                write.last_error = str(e)
+                write.status = 'pending'
+                write.next_attempt_at = failed_at + _retry_delay(write.attempts)
+                if permanent or write.attempts >= MAX_WRITE_ATTEMPTS:
+                    write.status = 'failed'
+                    write.processed_at = failed_at
+            if not permanent:
+                retry_at = max(write.next_attempt_at for write in call.writes)
+                for key in call.keys:
+                    blocked[key] = retry_at
+            _record_retry(call.writes)
+        else:
+            # Reads made while the write was queued may have cached the old value
+            invalidate_paths(call.target, [key for _, key in call.keys])
+            _record_applied(call)
+            applied += len(call.writes)
+
+    if applied:
+        logger.debug(f"Applied {applied} queued Firebase writes")
+    return len(writes)
+
+
+def _worker_loop(interval, batch_size):
+    while True:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        try:
+            while drain_firebase_queue(batch_size) >= batch_size:
+                pass
+        except Exception as e:
+            logger.error(f"Firebase queue worker error: {e}")
+        finally:
+            close_old_connections()
+
+
+def start_firebase_queue(interval=None, batch_size=None):
+    """Start this process's queue worker thread if it is not running yet."""
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return _worker
+        interval = interval or getattr(settings, 'FIREBASE_QUEUE_INTERVAL', 2.0)
+        batch_size = batch_size or getattr(settings, 'FIREBASE_QUEUE_BATCH_SIZE', 200)
+        _worker = threading.Thread(
+            target=_worker_loop, args=(interval, batch_size), name='firebase-queue', daemon=True
+        )
+        _worker.start()
+        # Pick up anything left over from before a restart
+        _wakeup.set()
+    return _worker
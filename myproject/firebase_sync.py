@@ -0,0 +1,223 @@
+"""
+Incremental Firebase to Django sync of user records.
+
+Each source keeps a ``FirebaseSyncCheckpoint``: the ``updated_at`` and key
+of the last user record it applied. A sync cycle reads only the records
+changed after that point, in ``updated_at`` order and a page at a time:
+
+- Realtime Database: ``users`` ordered by the child ``updated_at``, an
+  ISO-8601 UTC string, so string order is time order. The write queue
+  stamps it when it sends the write (``APPLIED_AT``), and records stamped
+  within the last ``FIREBASE_SYNC_SETTLE_SECONDS`` are left for a later
+  cycle, so a write still in flight cannot land behind the checkpoint.
+- Firestore: the ``users`` collection ordered by ``updated_at`` (a server
+  timestamp) and then by document id.
+
+Each page is upserted into ``User`` and ``UserProfile`` in one transaction
+that also advances the checkpoint, so a crash re-reads at most one page and
+a page is never half applied. A cycle costs as much as the changes since
+the previous one, not as much as the user base.
+
+Missing users are created with an unusable password and the balance and
+referral code from Firebase. Existing users only get their identity fields
+(email, names, active flag) updated; balances belong to Django's ledger
+once the user exists here.
+
+Records that were never stamped with ``updated_at`` are not seen by this
+sync; ``data_integrity_check.py`` still covers them with a full scan.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import FirebaseSyncCheckpoint, UserProfile
+
+logger = logging.getLogger(__name__)
+
+USERS_NODE = 'users'
+SYNC_BATCH_SIZE = 200
+SYNC_SOURCES = ('rtdb', 'firestore')
+# Copied onto existing Django users when Firebase has a different value
+USER_FIELDS = ('email', 'first_name', 'last_name', 'is_active')
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _rtdb_changes(position, last_key, limit):
+    from .firebase_app import get_database_reference
+
+    users = get_database_reference(USERS_NODE)
+    settle = timedelta(seconds=getattr(settings, 'FIREBASE_SYNC_SETTLE_SECONDS', 60))
+    settled = (timezone.now() - settle).isoformat()
+    # start_at() is inclusive and takes no key, so the records at exactly
+    # ``position`` come back again and are skipped up to ``last_key``
+    fetch = limit + 1 if position else limit
+    while True:
+        page = (
+            users.order_by_child('updated_at').start_at(position).end_at(settled)
+            .limit_to_first(fetch).get() or {}
+        )
+        changes = sorted(
+            (record['updated_at'], key, record) for key, record in page.items()
+            if isinstance(record, dict) and isinstance(record.get('updated_at'), str)
+            and (record['updated_at'], key) > (position, last_key)
+        )
+        if len(changes) >= limit or len(page) < fetch:
+            return changes[:limit]
+        # Several already-applied records share the checkpoint's timestamp
+        fetch *= 2
+
+
+def _firestore_changes(position, last_key, limit):
+    from .firebase_app import get_firestore_client
+
+    after = parse_datetime(position) if position else _EPOCH
+    # The range filter also leaves out documents whose updated_at is not a timestamp
+    query = (
+        get_firestore_client().collection(USERS_NODE)
+        .where('updated_at', '>', _EPOCH)
+        .order_by('updated_at')
+        .order_by('__name__')
+    )
+    if position:
+        query = query.start_after({'updated_at': after, '__name__': last_key})
+    return [
+        (doc.get('updated_at').isoformat(), doc.id, doc.to_dict() or {})
+        for doc in query.limit(limit).stream()
+    ]
+
+
+_READERS = {
+    'rtdb': _rtdb_changes,
+    'firestore': _firestore_changes,
+}
+
+
+def _decimal(value):
+    try:
+        return Decimal(str(value or 0))
+    except (InvalidOperation, ValueError):
+        return Decimal('0')
+
+
+def _user_values(record):
+    values = {}
+    for field in USER_FIELDS:
+        if field in record and record[field] is not None:
+            values[field] = bool(record[field]) if field == 'is_active' else str(record[field])
+    return values
+
+
+def apply_user_records(records):
+    """Upsert Firebase user ``records`` (key to record) into Django; return (created, updated)."""
+    by_username = {}
+    for key, record in records.items():
+        username = record.get('username') or record.get('phone_number')
+        if username:
+            by_username[str(username)] = record
+
+    existing = {
+        user.username: user
+        for user in User.objects.filter(username__in=by_username).select_related('userprofile')
+    }
+    wanted_codes = {record.get('referral_code') for record in by_username.values()} - {None, ''}
+    taken_codes = set(UserProfile.objects.filter(referral_code__in=wanted_codes).values_list('referral_code', flat=True))
+
+    changed_users = []
+    changed_profiles = []
+    created = 0
+    for username, record in by_username.items():
+        values = _user_values(record)
+        phone = record.get('phone_number') or username
+        user = existing.get(username)
+        if user is None:
+            user = User(username=username, **values)
+            user.date_joined = parse_datetime(record.get('date_joined') or '') or timezone.now()
+            user.set_unusable_password()
+            user.save()
+            code = record.get('referral_code')
+            UserProfile.objects.create(
+                user=user,
+                phone_number=phone,
+                balance=_decimal(record.get('balance')),
+                # An empty code is generated by UserProfile.save()
+                referral_code=code if code and code not in taken_codes else '',
+            )
+            if code:
+                taken_codes.add(code)
+            created += 1
+            continue
+
+        if any(getattr(user, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(user, field, value)
+            changed_users.append(user)
+        try:
+            profile = user.userprofile
+        except UserProfile.DoesNotExist:
+            UserProfile.objects.create(user=user, phone_number=phone)
+            continue
+        if not profile.phone_number and phone:
+            profile.phone_number = phone
+            changed_profiles.append(profile)
+
+    if changed_users:
+        User.objects.bulk_update(changed_users, USER_FIELDS)
+    if changed_profiles:
+        UserProfile.objects.bulk_update(changed_profiles, ['phone_number'])
+    return created, len(changed_users)
+
+
+def sync_source(source, batch_size=SYNC_BATCH_SIZE):
+    """Apply every change in ``source`` since its checkpoint; return the number of records read."""
+    read_changes = _READERS[source]
+    checkpoint, _ = FirebaseSyncCheckpoint.objects.get_or_create(source=source)
+    total = 0
+    while True:
+        changes = read_changes(checkpoint.position, checkpoint.last_key, batch_size)
+        if not changes:
+            break
+        with transaction.atomic():
+            locked = FirebaseSyncCheckpoint.objects.select_for_update().get(pk=checkpoint.pk)
+            if (locked.position, locked.last_key) != (checkpoint.position, checkpoint.last_key):
+                # Another worker applied this page first; carry on from where it got to
+                checkpoint = locked
+                continue
+            created, updated = apply_user_records({key: record for _, key, record in changes})
+            locked.position, locked.last_key = changes[-1][0], changes[-1][1]
+            locked.records_synced += len(changes)
+            locked.save(update_fields=['position', 'last_key', 'records_synced', 'updated_at'])
+        checkpoint = locked
+        total += len(changes)
+        logger.info(
+            f"Synced {len(changes)} {source} user records "
+            f"({created} created, {updated} updated) up to {checkpoint.position}"
+        )
+        if len(changes) < batch_size:
+            break
+    return total
+
+
+def sync_firebase_changes(sources=SYNC_SOURCES, batch_size=SYNC_BATCH_SIZE):
+    """Run one sync cycle over ``sources``; return records read per source.
+
+    A failing source is logged and skipped so the other one still syncs.
+    """
+    results = {}
+    for source in sources:
+        try:
+            results[source] = sync_source(source, batch_size)
+        except Exception as e:
+            logger.error(f"Firebase {source} sync failed: {e}")
+            results[source] = None
+    return results
+
+
+def reset_checkpoints(sources=SYNC_SOURCES):
+    """Forget the checkpoints of ``sources`` so the next cycle reads everything again."""
+    FirebaseSyncCheckpoint.objects.filter(source__in=sources).update(position='', last_key='')
@@ -0,0 +1,147 @@
+"""
+Request user objects for Firebase session logins.
+
+``firebase_login_required`` attaches a ``FirebaseUser`` to every request and,
+for views that still work with Django models, lazily swaps ``request.user``
+for the Django ``User`` that shares the phone number. The resolved id is
+remembered in the session, so after the first lookup the decorator itself
+issues no queries.
+
+The session carries only identity keys and a small versioned profile
+summary (``SESSION_PROFILE``), never the full RTDB user record with its
+transaction history and password hash. Any other field is read through
+``FirebaseUser.get()``, which reads the record through ``firebase_cache``.
+"""
+import logging
+from typing import Optional
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .firebase_cache import public_user_record, user_records
+from .phone_utils import phone_username_variants
+
+logger = logging.getLogger(__name__)
+
+SESSION_DJANGO_USER_ID = 'firebase_django_user_id'
+SESSION_DJANGO_USER_PHONE = 'firebase_django_user_phone'
+SESSION_PROFILE = 'firebase_profile'
+LEGACY_SESSION_USER_DATA = 'firebase_user_data'
+
+# Bump when PROFILE_SUMMARY_FIELDS changes; older summaries are rebuilt
+PROFILE_SUMMARY_VERSION = 1
+PROFILE_SUMMARY_FIELDS = (
+    'email', 'display_name', 'first_name', 'last_name', 'referral_code', 'account_status', 'balance',
+)
+
+def profile_summary(user_data):
+    """Return the bounded, versioned subset of an RTDB user record kept in the session."""
+    summary = {field: user_data.get(field) for field in PROFILE_SUMMARY_FIELDS if user_data.get(field) is not None}
+    summary['v'] = PROFILE_SUMMARY_VERSION
+    return summary
+
+
+def start_firebase_session(session, firebase_key, user_phone, user_data, login_method):
+    """Mark ``session`` as logged in to ``firebase_key`` with a compact profile summary."""
+    session['firebase_authenticated'] = True
+    session['is_authenticated'] = True
+    session['firebase_key'] = firebase_key
+    session['user_phone'] = user_phone
+    session[SESSION_PROFILE] = profile_summary(user_data)
+    session['login_time'] = timezone.now().isoformat()
+    session['login_method'] = login_method
+    session.pop(LEGACY_SESSION_USER_DATA, None)
+    # The record was just read (or written) by the login; the next pages reuse it
+    user_records.set(firebase_key, public_user_record(user_data))
+
+
+def session_profile(session):
+    """Return the session's profile summary, rebuilding it from a legacy full record if needed."""
+    summary = session.get(SESSION_PROFILE)
+    if summary and summary.get('v') == PROFILE_SUMMARY_VERSION:
+        return summary
+    legacy = session.get(LEGACY_SESSION_USER_DATA)
+    summary = profile_summary(legacy or summary or {})
+    session[SESSION_PROFILE] = summary
+    session.pop(LEGACY_SESSION_USER_DATA, None)
+    return summary
+
+
+def load_user_record(firebase_key):
+    """Return the RTDB user record for ``firebase_key`` without private fields, cached."""
+    try:
+        return user_records.get(firebase_key)
+    except Exception as e:
+        logger.warning(f"Could not load Firebase user record {firebase_key}: {e}")
+        return {}
+
+
+class FirebaseUser:
+    """The logged-in Firebase account, built from the session's profile summary."""
+
+    is_authenticated = True
+    is_firebase_user = True
+
+    def __init__(self, firebase_key, user_phone, profile):
+        self.uid = firebase_key
+        self.firebase_key = firebase_key
+        self.phone_number = user_phone
+        self.username = user_phone
+        self.profile = profile
+        self.email = profile.get('email', '')
+        self.display_name = profile.get('display_name', '')
+        self._record = None
+
+    @property
+    def firebase_data(self):
+        """The full RTDB user record (minus private fields), fetched on first use."""
+        if self._record is None:
+            self._record = load_user_record(self.firebase_key)
+        return self._record
+
+    def get(self, field, default=None):
+        """Return ``field`` from the profile summary, or from the full record if not summarized."""
+        if field in PROFILE_SUMMARY_FIELDS:
+            return self.profile.get(field, default)
+        return self.firebase_data.get(field, default)
+
+    def __str__(self):
+        return self.username or self.uid
+
+    def get_username(self):
+        return self.username or self.uid
+
+
+def resolve_django_user(session, user_phone) -> Optional[User]:
+    """Return the Django user for ``user_phone``, memoizing its id in ``session``.
+
+    A remembered id is loaded by primary key; otherwise every username
+    format the phone may be stored under is checked in one query.
+    """
+    if not user_phone:
+        return None
+
+    try:
+        user_id = session.get(SESSION_DJANGO_USER_ID)
+        if user_id and session.get(SESSION_DJANGO_USER_PHONE) == user_phone:
+            user = User.objects.filter(pk=user_id).first()
+            if user is not None:
+                return user
+
+        candidates = phone_username_variants(user_phone)
+        users = {user.username: user for user in User.objects.filter(username__in=candidates)}
+        user = next((users[username] for username in candidates if username in users), None)
+    except Exception as e:
+        logger.warning(f"Could not resolve Django user for {user_phone}: {e}")
+        return None
+
+    if user is None:
+        # Not remembered: a Django user may still be created for this phone later
+        session.pop(SESSION_DJANGO_USER_ID, None)
+        session.pop(SESSION_DJANGO_USER_PHONE, None)
+        logger.debug(f"No Django user found for {user_phone}")
+        return None
+
+    session[SESSION_DJANGO_USER_ID] = user.pk
+    session[SESSION_DJANGO_USER_PHONE] = user_phone
+    return user
@@ -0,0 +1,111 @@
+"""
+Django management command to measure the per-request cost of hot-path logging.
+
+Compares the old style (a block of print() calls plus an eager
+``json.dumps(indent=2)`` log line) against ``log_event`` going through the
+sampling filter and the non-blocking queue handler. Output goes to
+/dev/null so only the logging overhead is measured.
+"""
+import contextlib
+import json
+import logging
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from myproject.structured_logging import (
+    NonBlockingQueueHandler, SamplingFilter, StructuredFormatter, get_sample_rates, log_event,
+)
+
+SAMPLE_STATS = {
+    'firebase_uid': '639171234567',
+    'referral_code': 'AB12CD34',
+    'total_referrals': 42,
+    'active_referrals': 17,
+    'team_volume': 125000.0,
+    'team_earnings': 6250.0,
+    'total_balance': 730.0,
+}
+SAMPLE_RESPONSE = {
+    'status': '1',
+    'order_id': 'DEP-20250101-000001',
+    'redirect_url': 'https://example.invalid/pay/DEP-20250101-000001',
+    'amount': '500.00',
+    'data': {'bank_code': 'gcash', 'channel': 'primary', 'fees': ['0.00', '0.00']},
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-request logging overhead before and after structured logging'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=20000,
+            help='Number of simulated requests per scenario'
+        )
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        rate = get_sample_rates().rate_for('team.view', 'benchmark_logging.after')
+
+        with open(os.devnull, 'w') as sink:
+            before = self._run(count, self._before_request, *self._before_logger(sink), sink=sink)
+            after_handler = NonBlockingQueueHandler(stream=sink)
+            after_handler.setFormatter(StructuredFormatter())
+            after_handler.addFilter(SamplingFilter())
+            try:
+                after = self._run(count, self._after_request, self._logger('after', after_handler))
+            finally:
+                after_handler.close()
+
+        self.stdout.write(f"{count} simulated requests, team.view sample rate {rate}")
+        self.stdout.write(f"  print() + eager json.dumps: {before:8.2f} us/request")
+        self.stdout.write(f"  log_event + sampling/queue: {after:8.2f} us/request")
+        if after_handler.dropped:
+            self.stdout.write(f"  ({after_handler.dropped} records dropped on a full queue)")
+        if after:
+            self.stdout.write(self.style.SUCCESS(f"Logging overhead reduced {before / after:.1f}x"))
+
+    def _logger(self, name, handler):
+        bench_logger = logging.getLogger(f'benchmark_logging.{name}')
+        bench_logger.handlers = [handler]
+        bench_logger.setLevel(logging.INFO)
+        bench_logger.propagate = False
+        return bench_logger
+
+    def _before_logger(self, sink):
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(logging.Formatter('{levelname} {asctime} {module} {message}', style='{'))
+        return (self._logger('before', handler),)
+
+    def _run(self, count, request, bench_logger, sink=None):
+        redirect = contextlib.redirect_stdout(sink) if sink else contextlib.nullcontext()
+        with redirect:
+            started = time.perf_counter()
+            for _ in range(count):
+                request(bench_logger)
+            elapsed = time.perf_counter() - started
+        return elapsed / count * 1e6
+
+    @staticmethod
+    def _before_request(bench_logger):
+        stats = SAMPLE_STATS
+        print(f"🔍 Getting Firebase team data for UID: {stats['firebase_uid']}")
+        print(f"📊 Firebase Team Final Stats:")
+        print(f"   Referral Code: {stats['referral_code']}")
+        print(f"   Total Referrals: {stats['total_referrals']}")
+        print(f"   Active Members: {stats['active_referrals']}")
+        print(f"   Team Volume: ₱{stats['team_volume']} (real investments only)")
+        print(f"   Team Earnings: ₱{stats['team_earnings']}")
+        print(f"   Total Balance: ₱{stats['total_balance']}")
+        bench_logger.debug(f"Request params: {json.dumps(SAMPLE_RESPONSE, indent=2)}")
+        bench_logger.info(f"LA2568 API Response: {json.dumps(SAMPLE_RESPONSE, indent=2)}")
+
+    @staticmethod
+    def _after_request(bench_logger):
+        log_event(bench_logger, logging.INFO, 'team.view', **SAMPLE_STATS)
+        log_event(bench_logger, logging.DEBUG, 'la2568.request', order_id=SAMPLE_RESPONSE['order_id'])
+        log_event(bench_logger, logging.INFO, 'la2568.response', status='1', result=SAMPLE_RESPONSE)
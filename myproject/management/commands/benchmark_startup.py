@@ -0,0 +1,70 @@
+"""
+Django management command to measure how long a fresh process takes to load the app.
+
+Each run starts a new interpreter that sets Django up and imports the
+URLconf (and with it every view module), as a gunicorn worker does before
+serving its first request. It also checks that the import did not
+initialize Firebase, which must wait for first use.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - start
+from myproject import firebase_app
+print(json.dumps({'elapsed': elapsed, 'firebase_initialized': firebase_app._firebase_app is not None}))
+"""
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the time a fresh process needs to import settings, URLs and views'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=5,
+            help='Number of fresh processes to time'
+        )
+        parser.add_argument(
+            '--max-ms',
+            type=float,
+            default=None,
+            help='Fail when the median import time exceeds this many milliseconds'
+        )
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE, STARTUP_DIAGNOSTICS='False')
+        timings = []
+        for _ in range(options['runs']):
+            result = subprocess.run(
+                [sys.executable, '-c', PROBE], env=env, cwd=settings.BASE_DIR,
+                capture_output=True, text=True,
+            )
+            if result.returncode != 0:
+                raise CommandError(f"Import probe failed:\n{result.stderr}")
+            sample = json.loads(result.stdout.strip().splitlines()[-1])
+            if sample['firebase_initialized']:
+                raise CommandError('Firebase was initialized at import time; it must be initialized on first use')
+            timings.append(sample['elapsed'] * 1000)
+
+        median = statistics.median(timings)
+        self.stdout.write(
+            f"Import time over {len(timings)} runs: median {median:.0f} ms, "
+            f"min {min(timings):.0f} ms, max {max(timings):.0f} ms"
+        )
+        if options['max_ms'] is not None and median > options['max_ms']:
+            raise CommandError(f"Median import time {median:.0f} ms is over the {options['max_ms']:.0f} ms budget")
+        self.stdout.write(self.style.SUCCESS('Startup benchmark passed'))
@@ -0,0 +1,75 @@
+"""
+Django management command to backfill the Realtime Database lookup indexes
+(phone_index, referral_codes and referrals) for users created before they
+existed.
+"""
+from django.core.management.base import BaseCommand
+
+from myproject.firebase_index import (
+    PHONE_INDEX_NODE, REFERRAL_CODES_NODE, REFERRALS_NODE, USERS_NODE, phone_index_key,
+    referral_code_entry, referral_member_entry,
+)
+
+
+class Command(BaseCommand):
+    help = 'Backfill phone_index, referral_codes and referrals for existing Firebase users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=500,
+            help='Number of users read and indexed per round trip'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be written without writing it'
+        )
+
+    def handle(self, *args, **options):
+        from myproject.firebase_app import get_database_reference
+
+        page_size = options['page_size']
+        dry_run = options['dry_run']
+        root = get_database_reference('/')
+        users_ref = root.child(USERS_NODE)
+
+        indexed = 0
+        last_key = None
+        while True:
+            query = users_ref.order_by_key()
+            if last_key is not None:
+                query = query.start_at(last_key)
+            page = query.limit_to_first(page_size + (1 if last_key is not None else 0)).get() or {}
+            page.pop(last_key, None)
+            if not page:
+                break
+
+            updates = {}
+            for firebase_key, user_data in page.items():
+                if not isinstance(user_data, dict):
+                    continue
+                phone_number = user_data.get('phone_number') or ''
+                if phone_number:
+                    updates[f'{PHONE_INDEX_NODE}/{phone_index_key(phone_number)}'] = firebase_key
+                referral_code = user_data.get('referral_code')
+                if referral_code:
+                    updates[f'{REFERRAL_CODES_NODE}/{referral_code}'] = referral_code_entry(
+                        firebase_key, phone_number
+                    )
+                referred_by_code = user_data.get('referred_by_code')
+                if referred_by_code:
+                    updates[f'{REFERRALS_NODE}/{referred_by_code}/{firebase_key}'] = referral_member_entry(
+                        user_data
+                    )
+
+            if updates and not dry_run:
+                root.update(updates)
+            indexed += len(page)
+            last_key = list(page)[-1]
+            self.stdout.write(f"Indexed {indexed} users ({len(updates)} index entries in this page)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would index' if dry_run else 'Indexed'} {indexed} users"
+        ))
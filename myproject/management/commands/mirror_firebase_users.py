@@ -0,0 +1,74 @@
+"""
+Django management command to keep FirebaseProfile mirroring the RTDB users node.
+"""
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myproject.firebase_mirror import USERS_NODE, UserMirror, mark_mirror_stale
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Mirror Realtime Database users into FirebaseProfile with bulk upserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Copy the whole users node once and exit instead of listening for changes'
+        )
+        parser.add_argument(
+            '--flush-interval',
+            type=float,
+            default=5.0,
+            help='Seconds between writes of buffered changes while listening'
+        )
+
+    def handle(self, *args, **options):
+        from myproject.firebase_app import firebase_available, get_database_reference
+
+        if not firebase_available():
+            raise CommandError('Firebase is not available')
+        users = get_database_reference(USERS_NODE)
+        mirror = UserMirror()
+
+        if options['once']:
+            mirror.handle_event('put', '/', users.get() or {})
+            count = mirror.flush()
+            self.stdout.write(self.style.SUCCESS(f"Mirrored {count} Firebase users"))
+            return
+
+        def on_event(event):
+            try:
+                mirror.handle_event(event.event_type, event.path, event.data)
+            except Exception as e:
+                # An exception here would end the listener thread
+                logger.error(f"Could not buffer Firebase users event at {event.path}: {e}")
+
+        registration = None
+        self.stdout.write(f"Mirroring Firebase users every {options['flush_interval']}s")
+        try:
+            while True:
+                # The listener thread ends when its stream fails for good;
+                # a new listener starts with a full reload of the node
+                if registration is None or not registration._thread.is_alive():
+                    if registration is not None:
+                        logger.warning('Firebase users listener stopped; restarting it')
+                        mark_mirror_stale()
+                        registration.close()
+                    registration = users.listen(on_event)
+                time.sleep(options['flush_interval'])
+                try:
+                    mirror.flush()
+                except Exception as e:
+                    # The buffered changes are gone; reload the node from scratch
+                    logger.error(f"Could not write the Firebase users mirror: {e}")
+                    mark_mirror_stale()
+                    registration.close()
+                    registration = None
+        finally:
+            if registration is not None:
+                registration.close()
@@ -0,0 +1,50 @@
+"""
+Django management command to pay pending multi-level referral commissions.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from myproject.commissions import process_commission_batch
+
+
+class Command(BaseCommand):
+    help = 'Pay referral commissions for pending investment commission jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Number of commission jobs paid per database transaction'
+        )
+        parser.add_argument(
+            '--levels',
+            type=int,
+            default=None,
+            help='Only pay the first N levels of REFERRAL_COMMISSION_RATES'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new jobs instead of exiting when the queue is empty'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to sleep between polls in --loop mode'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = process_commission_batch(options['batch_size'], options['levels'])
+            total += processed
+            if processed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} commission jobs"))
@@ -0,0 +1,45 @@
+"""
+Django management command to drain the Firebase write-behind queue.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from myproject.firebase_queue import drain_firebase_queue
+
+
+class Command(BaseCommand):
+    help = 'Apply queued Realtime Database and Firestore writes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Number of queued writes coalesced and applied per round'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new writes instead of exiting when the queue is empty'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep between polls in --loop mode'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        while True:
+            handled = drain_firebase_queue(batch_size)
+            total += handled
+            if handled >= batch_size:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Handled {total} queued Firebase writes"))
@@ -0,0 +1,148 @@
+"""
+Django management command to recompute every user's all-levels team size and
+team volume from the full referral graph in one pass.
+"""
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+
+from myproject.firebase_index import REFERRALS_NODE, referral_member_entry
+from myproject.models import Investment, UserProfile
+from myproject.team_graph import compute_team_totals, index_parents
+
+
+class Command(BaseCommand):
+    help = 'Recompute team size and team volume for all users (Django and Firebase)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            choices=['all', 'django', 'firebase'],
+            default='all',
+            help='Which referral graph to recompute'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per bulk database update / users per Firebase update'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute totals without writing them'
+        )
+
+    def handle(self, *args, **options):
+        source = options['source']
+        if source in ('all', 'django'):
+            self.recompute_django(options['batch_size'], options['dry_run'])
+        if source in ('all', 'firebase'):
+            self.recompute_firebase(options['batch_size'], options['dry_run'])
+
+    def recompute_django(self, batch_size, dry_run):
+        start = time.perf_counter()
+
+        rows = list(UserProfile.objects.values_list('id', 'user_id', 'referred_by_id'))
+        if not rows:
+            self.stdout.write("No Django profiles to recompute")
+            return
+        profile_ids, user_ids, referrer_ids = zip(*rows)
+
+        invested_by_user = dict(
+            Investment.objects.exclude(status='cancelled')
+            .values('user_id')
+            .annotate(total=Sum('amount'))
+            .values_list('user_id', 'total')
+        )
+        amounts = [float(invested_by_user.get(user_id) or 0) for user_id in user_ids]
+
+        parents = index_parents(user_ids, referrer_ids)
+        team_sizes, team_volumes, _ = compute_team_totals(parents, amounts)
+        computed = time.perf_counter()
+
+        if not dry_run:
+            now = timezone.now()
+            profiles = [
+                UserProfile(
+                    id=profile_id,
+                    team_size=int(team_size),
+                    team_volume=Decimal(f"{team_volume:.2f}"),
+                    team_stats_updated_at=now,
+                )
+                for profile_id, team_size, team_volume in zip(profile_ids, team_sizes, team_volumes)
+            ]
+            UserProfile.objects.bulk_update(
+                profiles, ['team_size', 'team_volume', 'team_stats_updated_at'], batch_size=batch_size
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Django: {len(rows)} profiles, computed in {(computed - start) * 1000:.1f}ms, "
+            f"total {(time.perf_counter() - start) * 1000:.1f}ms"
+        ))
+
+    def recompute_firebase(self, batch_size, dry_run):
+        from myproject.firebase_app import get_database_reference
+
+        start = time.perf_counter()
+        root = get_database_reference('/')
+        users = root.child('users').get() or {}
+        keys = [key for key, data in users.items() if isinstance(data, dict)]
+        if not keys:
+            self.stdout.write("No Firebase users to recompute")
+            return
+
+        position_by_code = {}
+        for position, key in enumerate(keys):
+            referral_code = users[key].get('referral_code')
+            if referral_code:
+                position_by_code[referral_code] = position
+
+        parents = [position_by_code.get(users[key].get('referred_by_code'), -1) for key in keys]
+        amounts = [_as_float(users[key].get('total_invested')) for key in keys]
+        loaded = time.perf_counter()
+
+        team_sizes, team_volumes, direct_referrals = compute_team_totals(parents, amounts)
+        entries = {key: referral_member_entry(users[key]) for key in keys}
+        # Active direct referrals per referral code, for the team page header
+        active_by_code = Counter(
+            users[key].get('referred_by_code') for key in keys
+            if entries[key]['is_active'] and users[key].get('referred_by_code')
+        )
+        computed = time.perf_counter()
+
+        if not dry_run:
+            updated_at = timezone.now().isoformat()
+            updates = {}
+            for key, team_size, team_volume, direct in zip(keys, team_sizes, team_volumes, direct_referrals):
+                updates[f'users/{key}/team_size'] = int(team_size)
+                updates[f'users/{key}/team_volume'] = round(float(team_volume), 2)
+                updates[f'users/{key}/direct_referrals'] = int(direct)
+                updates[f'users/{key}/active_referrals'] = active_by_code.get(users[key].get('referral_code'), 0)
+                updates[f'users/{key}/team_stats_updated_at'] = updated_at
+                # Refresh the team listing summary while the full record is at hand
+                referred_by_code = users[key].get('referred_by_code')
+                if referred_by_code:
+                    updates[f'{REFERRALS_NODE}/{referred_by_code}/{key}'] = entries[key]
+                if len(updates) >= batch_size * 5:
+                    root.update(updates)
+                    updates = {}
+            if updates:
+                root.update(updates)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Firebase: {len(keys)} users, loaded in {(loaded - start) * 1000:.1f}ms, "
+            f"computed in {(computed - loaded) * 1000:.1f}ms, "
+            f"total {(time.perf_counter() - start) * 1000:.1f}ms"
+        ))
+
+
+def _as_float(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
@@ -0,0 +1,58 @@
+"""
+Django management command to copy Firebase user changes into Django.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from myproject.firebase_sync import SYNC_BATCH_SIZE, SYNC_SOURCES, reset_checkpoints, sync_firebase_changes
+
+
+class Command(BaseCommand):
+    help = 'Upsert Firebase user records changed since the last checkpoint into Django'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            choices=SYNC_SOURCES,
+            action='append',
+            help='Only sync this source (repeatable; default: all)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=SYNC_BATCH_SIZE,
+            help='Number of changed records read and applied per transaction'
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Clear the checkpoints first so every stamped record is read again'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep syncing instead of exiting after one cycle'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=30.0,
+            help='Seconds to sleep between cycles in --loop mode'
+        )
+
+    def handle(self, *args, **options):
+        sources = tuple(options['source'] or SYNC_SOURCES)
+        if options['reset']:
+            reset_checkpoints(sources)
+            self.stdout.write(f"Reset sync checkpoints for {', '.join(sources)}")
+
+        while True:
+            results = sync_firebase_changes(sources, options['batch_size'])
+            summary = ', '.join(
+                f"{source}: {'failed' if count is None else count}" for source, count in results.items()
+            )
+            self.stdout.write(self.style.SUCCESS(f"Synced Firebase user changes ({summary})"))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -26,8 +26,7 @@ class Command(BaseCommand):
         
         try:
             # Import Firebase modules
-            from myproject.firebase_app import get_firebase_app
-            from firebase_admin import firestore, db as firebase_db
+            from myproject.firebase_app import get_database_reference, get_firebase_app, get_firestore_client
             
             # Initialize Firebase app
             self.stdout.write("🔥 Initializing Firebase app...")
@@ -35,11 +34,11 @@ class Command(BaseCommand):
             
             # Initialize Firestore client
             self.stdout.write("🔥 Initializing Firestore client...")
-            firestore_client = firestore.client(app=app)
+            firestore_client = get_firestore_client()
             
             # Initialize Realtime Database
             self.stdout.write("🔥 Initializing Realtime Database...")
-            db_ref = firebase_db.reference('/', app=app)
+            db_ref = get_database_reference('/')
             
             # Test operations
             self.stdout.write("🔥 Testing Firebase connections...")
@@ -66,6 +65,9 @@ class Command(BaseCommand):
             start_firebase_queue()
             self.stdout.write("✅ Firebase queue started")
             
+            from myproject.firebase_clients import firebase_clients
+            self.stdout.write(f"Firebase client handles: {firebase_clients.stats()}")
+
             duration = (time.perf_counter() - start_time) * 1000
             self.stdout.write(
                 self.style.SUCCESS(f"🔥 Firebase warmup completed in {duration:.1f}ms")
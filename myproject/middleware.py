@@ -3,11 +3,16 @@ Security Middleware for GrowFi Platform
 © 2025 GrowFi Investment Platform - All Rights Reserved
 """
 import logging
+import threading
+from datetime import datetime
+
 from django.utils import timezone
 from django.contrib.auth import logout
 from django.shortcuts import redirect
 from django.contrib import messages
 
+from .structured_logging import log_event
+
 logger = logging.getLogger(__name__)
 
 class SecurityHeadersMiddleware:
@@ -73,28 +78,51 @@ class AntiSourceViewMiddleware:
 
 
 class SessionPersistenceMiddleware:
-    """Middleware for PERMANENT session persistence - NO EXPIRATION"""
+    """Middleware for PERMANENT session persistence with throttled renewal
+
+    Sessions last SESSION_COOKIE_AGE (one year). Instead of rewriting the
+    session row on every request, a logged-in session (a Django login or a
+    pure Firebase session from user_login/register) is renewed at most once
+    per SESSION_RENEWAL_INTERVAL. Requests in between only bump a
+    per-process activity counter that is folded into the session on the
+    next renewal.
+    """
+    
+    # session key -> requests seen since the session was last written
+    _pending_activity = {}
+    _pending_lock = threading.Lock()
+    MAX_PENDING_SESSIONS = 10000
     
     def __init__(self, get_response):
+        from django.conf import settings
         self.get_response = get_response
+        self.session_age = getattr(settings, 'SESSION_COOKIE_AGE', 365 * 24 * 60 * 60)
+        self.renewal_interval = getattr(settings, 'SESSION_RENEWAL_INTERVAL', 15 * 60)
 
     def __call__(self, request):
         # Process request before view
         self.process_request(request)
         
-        # Get response from view
-        response = self.get_response(request)
-        
-        # Process response after view
-        self.process_response(request, response)
-        
-        return response
+        return self.get_response(request)
+
+    def needs_renewal(self, session, now):
+        """Return True when the session should be rewritten on this request"""
+        renewed_at = session.get('session_renewed_at')
+        if not renewed_at:
+            return True
+        try:
+            elapsed = (now - datetime.fromisoformat(renewed_at)).total_seconds()
+        except (TypeError, ValueError):
+            return True
+        return elapsed >= self.renewal_interval
 
     def process_request(self, request):
-        """Process request to ensure PERMANENT session persistence"""
+        """Renew the session when due; otherwise just count the activity"""
         
-        # Skip for non-authenticated users
-        if not request.user.is_authenticated:
+        # Skip for anonymous visitors; Firebase logins don't go through login()
+        user = getattr(request, 'user', None)
+        django_user = user is not None and user.is_authenticated
+        if not django_user and not request.session.get('firebase_authenticated'):
             return
         
         # Skip for admin and static files
@@ -102,70 +130,61 @@ class SessionPersistenceMiddleware:
             return
         
         try:
-            # ALWAYS renew session to prevent ANY expiration
-            # Set to 1 year (practically permanent)
-            request.session.set_expiry(365 * 24 * 60 * 60)  # 1 YEAR
+            session = request.session
+            now = timezone.now()
+            pending = self._pending_activity
+            session_key = session.session_key
+            username = user.username if django_user else session.get('user_phone')
             
-            # Mark session as modified to ensure it's saved
-            request.session.modified = True
+            if not self.needs_renewal(session, now):
+                if session_key:
+                    with self._pending_lock:
+                        if session_key not in pending and len(pending) >= self.MAX_PENDING_SESSIONS:
+                            pending.clear()  # Counts are best effort; never grow without bound
+                        pending[session_key] = pending.get(session_key, 0) + 1
+                return
             
-            # Update session activity tracking
-            request.session['last_activity'] = timezone.now().isoformat()
-            request.session['activity_count'] = request.session.get('activity_count', 0) + 1
-            request.session['never_expire'] = True  # Mark as permanent session
+            # Renew: one session write carries the expiry and the batched counters
+            with self._pending_lock:
+                batched = pending.pop(session_key, 0)
+            session.set_expiry(self.session_age)
+            session['session_renewed_at'] = now.isoformat()
+            session['last_activity'] = now.isoformat()
+            session['activity_count'] = session.get('activity_count', 0) + batched + 1
+            session['never_expire'] = True  # Mark as permanent session
             
-            logger.info(f"PERMANENT session renewed for user: {request.user.username}")
+            log_event(logger, logging.DEBUG, 'session.renewed', username=username)
             
             # COMPLETELY DISABLE Firebase updates during development to prevent delays
             from django.conf import settings
             if not getattr(settings, 'DEBUG', True):  # Only in production
                 try:
-                    from myproject.views import update_user_in_firebase_realtime_db
+                    from myproject.phone_utils import firebase_key_for_phone
+                    from myproject.presence import record_activity
                     firebase_data = {
-                        'last_activity': timezone.now().isoformat(),
+                        'last_activity': now.isoformat(),
                         'is_online': True,
                         'session_active': True,
                         'session_permanent': True,  # Mark as permanent
                         'current_page': request.path,
-                        'activity_count': request.session.get('activity_count', 1)
+                        'activity_count': session['activity_count']
                     }
                     
-                    # Non-blocking Firebase update (PRODUCTION ONLY)
-                    update_user_in_firebase_realtime_db(request.user, request.user.username, firebase_data)
+                    # Firebase activity follows the session renewal cadence and the
+                    # presence flush interval (PRODUCTION ONLY)
+                    firebase_key = session.get('firebase_key') or firebase_key_for_phone(username)
+                    record_activity(firebase_key, rtdb=firebase_data, firestore=firebase_data)
                     
                 except Exception as firebase_error:
                     # Don't break the request if Firebase fails
                     logger.warning(f"Firebase activity update failed: {firebase_error}")
             else:
                 # DEVELOPMENT: Skip Firebase completely to prevent delays
-                logger.debug(f"🔥 Firebase middleware disabled in DEBUG mode for: {request.user.username}")
+                log_event(logger, logging.DEBUG, 'session.firebase_skipped', username=username)
             
         except Exception as e:
             logger.error(f"PERMANENT session persistence error: {e}")
 
-    def process_response(self, request, response):
-        """Process response to finalize PERMANENT session handling"""
-        
-        # Skip for non-authenticated users
-        if not request.user.is_authenticated:
-            return response
-        
-        try:
-            # ALWAYS ensure session is saved for permanent persistence
-            if hasattr(request, 'session'):
-                # Force session to be saved regardless of modified status
-                request.session.save()
-                
-                # Double-check session expiry is set to 1 year
-                if request.session.get_expiry_age() < (364 * 24 * 60 * 60):  # Less than 364 days
-                    request.session.set_expiry(365 * 24 * 60 * 60)  # Reset to 1 year
-                    request.session.save()
-            
-        except Exception as e:
-            logger.error(f"PERMANENT session save error: {e}")
-        
-        return response
-
 
 class AuthenticationRecoveryMiddleware:
     """Middleware to handle authentication recovery in case of issues"""
@@ -201,17 +220,12 @@ class AuthenticationRecoveryMiddleware:
                 logout(request)
                 return
             
-            # Check if profile exists
-            from myproject.models import UserProfile
-            try:
-                profile = UserProfile.objects.get(user=request.user)
-            except UserProfile.DoesNotExist:
-                # Create missing profile
-                profile = UserProfile.objects.create(
-                    user=request.user,
-                    phone_number=request.user.username
-                )
-                logger.info(f"Created missing profile for user: {request.user.username}")
+            # Check that the profile exists once per session; login and
+            # registration repair it (see myproject.signals)
+            from myproject.signals import PROFILE_CHECKED_SESSION_KEY, ensure_user_profile
+            if request.session.get(PROFILE_CHECKED_SESSION_KEY) != request.user.pk:
+                ensure_user_profile(request.user)
+                request.session[PROFILE_CHECKED_SESSION_KEY] = request.user.pk
             
             # Verify session integrity
             if not request.session.session_key:
@@ -0,0 +1,181 @@
+"""
+Optional per-middleware timing.
+
+When ``settings.MIDDLEWARE_TIMING`` is on, ``instrument_middleware()`` puts a
+probe in front of every entry in ``MIDDLEWARE`` and one more in front of the
+view. A probe stamps the time and the request's query count as the request
+passes down and again as the response passes back up. Middleware ``i`` sits
+between probe ``i`` and probe ``i + 1``, so:
+
+- its request phase is the time from probe ``i`` going down to probe
+  ``i + 1`` going down;
+- its response phase is the time from probe ``i + 1`` coming up to probe
+  ``i`` coming up.
+
+The middleware classes themselves are not touched.
+
+Samples are aggregated per process into bounded windows. Percentiles are
+served by the admin dashboard's middleware timing page and logged every
+``MIDDLEWARE_TIMING_LOG_EVERY`` requests.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+
+from .structured_logging import log_event
+
+logger = logging.getLogger(__name__)
+
+PROBE_PREFIX = 'Probe'
+VIEW_STAGE = 'view'
+WINDOW_SIZE = 2000
+
+
+def instrument_middleware(middleware):
+    """Return ``middleware`` with a timing probe before each entry and before the view."""
+    instrumented = []
+    for index, path in enumerate(middleware):
+        instrumented.append(f'{__name__}.{PROBE_PREFIX}{index}')
+        instrumented.append(path)
+    instrumented.append(f'{__name__}.{PROBE_PREFIX}{len(middleware)}')
+    return instrumented
+
+
+class _RequestTiming:
+    """Timestamps and query counts recorded by the probes for one request."""
+
+    def __init__(self, size):
+        self.queries = 0
+        self.down = [None] * size
+        self.up = [None] * size
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def mark(self, stamps, index):
+        stamps[index] = (time.perf_counter(), self.queries)
+
+
+class TimingStats:
+    """Bounded per-stage windows of (milliseconds, queries) samples."""
+
+    def __init__(self, window=WINDOW_SIZE):
+        self.window = window
+        self.requests = 0
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stages, timing):
+        """Fold one request's probe stamps into the windows for ``stages``."""
+        last = len(stages)
+        samples = []
+        for index, stage in enumerate(stages):
+            if timing.down[index + 1] is None:
+                # The request was answered here; everything was its request phase
+                samples.append((stage, 'request', timing.down[index], timing.up[index]))
+                break
+            samples.append((stage, 'request', timing.down[index], timing.down[index + 1]))
+            samples.append((stage, 'response', timing.up[index + 1], timing.up[index]))
+        else:
+            samples.append((VIEW_STAGE, 'request', timing.down[last], timing.up[last]))
+
+        with self._lock:
+            self.requests += 1
+            for stage, phase, start, end in samples:
+                window = self._samples.get((stage, phase))
+                if window is None:
+                    window = self._samples[(stage, phase)] = deque(maxlen=self.window)
+                window.append(((end[0] - start[0]) * 1000, end[1] - start[1]))
+
+    def summary(self):
+        """Per stage and phase: sample count, p50/p95/p99 in ms and mean queries."""
+        with self._lock:
+            snapshot = {key: list(window) for key, window in self._samples.items()}
+            requests = self.requests
+        rows = []
+        for (stage, phase), window in snapshot.items():
+            durations = sorted(ms for ms, _ in window)
+            rows.append({
+                'stage': stage,
+                'phase': phase,
+                'samples': len(window),
+                'p50_ms': round(_percentile(durations, 50), 3),
+                'p95_ms': round(_percentile(durations, 95), 3),
+                'p99_ms': round(_percentile(durations, 99), 3),
+                'queries_avg': round(sum(queries for _, queries in window) / len(window), 2),
+            })
+        rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+        return {'requests': requests, 'stages': rows}
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self._samples.clear()
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+timing_stats = TimingStats()
+
+
+def _stages():
+    # Probes are interleaved with the real entries in settings.MIDDLEWARE
+    return [path for path in settings.MIDDLEWARE if not path.startswith(f'{__name__}.{PROBE_PREFIX}')]
+
+
+def _make_probe(index):
+    class Probe:
+        def __init__(self, get_response):
+            self.get_response = get_response
+            self.stages = _stages()
+
+        def __call__(self, request):
+            if index == 0:
+                return self._outermost(request)
+            timing = getattr(request, '_middleware_timing', None)
+            if timing is None:
+                return self.get_response(request)
+            timing.mark(timing.down, index)
+            response = self.get_response(request)
+            timing.mark(timing.up, index)
+            return response
+
+        def _outermost(self, request):
+            timing = request._middleware_timing = _RequestTiming(len(self.stages) + 1)
+            with connection.execute_wrapper(timing.count_query):
+                timing.mark(timing.down, 0)
+                response = self.get_response(request)
+                timing.mark(timing.up, 0)
+            timing_stats.record(self.stages, timing)
+
+            log_every = getattr(settings, 'MIDDLEWARE_TIMING_LOG_EVERY', 1000)
+            if log_every and timing_stats.requests % log_every == 0:
+                top = timing_stats.summary()['stages'][:5]
+                log_event(logger, logging.INFO, 'middleware.timing', requests=timing_stats.requests, slowest=top)
+            return response
+
+    Probe.__name__ = Probe.__qualname__ = f'{PROBE_PREFIX}{index}'
+    return Probe
+
+
+_probes = {}
+
+
+def __getattr__(name):
+    # Lets settings.MIDDLEWARE reference 'myproject.middleware_timing.Probe<N>'
+    if name.startswith(PROBE_PREFIX) and name[len(PROBE_PREFIX):].isdigit():
+        index = int(name[len(PROBE_PREFIX):])
+        if index not in _probes:
+            _probes[index] = _make_probe(index)
+        return _probes[index]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
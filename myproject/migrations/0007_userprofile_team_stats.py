@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myproject', '0006_transaction_api_transaction_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='team_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='team_stats_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='team_volume',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=14),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myproject', '0007_userprofile_team_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommissionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('investment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='commission_job', to='myproject.investment')),
+            ],
+        ),
+    ]
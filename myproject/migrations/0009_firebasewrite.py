@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:16
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myproject', '0008_commissionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FirebaseWrite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(choices=[('rtdb', 'Realtime Database'), ('firestore', 'Firestore')], max_length=20)),
+                ('operation', models.CharField(choices=[('set', 'Set'), ('update', 'Update'), ('merge', 'Set (merge)'), ('add', 'Add to collection')], max_length=20)),
+                ('path', models.CharField(max_length=500)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='firebase_write_due_idx')],
+            },
+        ),
+    ]
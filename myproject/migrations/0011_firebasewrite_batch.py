@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myproject', '0010_notificationcounter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='firebasewrite',
+            name='operation',
+            field=models.CharField(choices=[('set', 'Set'), ('update', 'Update'), ('merge', 'Set (merge)'), ('add', 'Add to collection'), ('batch', 'Batch')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myproject', '0011_firebasewrite_batch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FirebaseSyncCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('rtdb', 'Realtime Database'), ('firestore', 'Firestore')], max_length=20, unique=True)),
+                ('position', models.CharField(blank=True, max_length=64)),
+                ('last_key', models.CharField(blank=True, max_length=128)),
+                ('records_synced', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:57
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myproject', '0012_firebasesynccheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FirebaseProfile',
+            fields=[
+                ('firebase_uid', models.CharField(max_length=128, primary_key=True, serialize=False, unique=True)),
+                ('email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('display_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('phone_number', models.CharField(blank=True, db_index=True, max_length=20, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('withdrawable_balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('non_withdrawable_bonus', models.DecimalField(decimal_places=2, default=100.0, max_digits=12)),
+                ('total_earnings', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('total_invested', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('registration_bonus_claimed', models.BooleanField(default=False)),
+                ('is_verified', models.BooleanField(default=False)),
+                ('profile_picture', models.ImageField(blank=True, null=True, upload_to='firebase_profiles/')),
+                ('valid_id', models.ImageField(blank=True, null=True, upload_to='firebase_documents/')),
+                ('proof_of_address', models.ImageField(blank=True, null=True, upload_to='firebase_documents/')),
+                ('referral_code', models.CharField(blank=True, db_index=True, max_length=20, null=True)),
+                ('referred_by_uid', models.CharField(blank=True, max_length=128, null=True)),
+                ('referred_by_code', models.CharField(blank=True, db_index=True, max_length=20, null=True)),
+                ('date_joined', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('last_login', models.DateTimeField(blank=True, null=True)),
+                ('source_updated_at', models.CharField(blank=True, max_length=64)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Firebase Profile',
+                'verbose_name_plural': 'Firebase Profiles',
+                'db_table': 'firebase_profiles',
+            },
+        ),
+        migrations.AlterField(
+            model_name='firebasesynccheckpoint',
+            name='source',
+            field=models.CharField(choices=[('rtdb', 'Realtime Database'), ('firestore', 'Firestore'), ('mirror', 'FirebaseProfile mirror')], max_length=20, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myproject', '0013_firebaseprofile_mirror'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='firebasewrite',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('in_flight', 'In flight'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
@@ -9,11 +9,16 @@ class FirebaseProfile(models.Model):
     """
     Pure Firebase user profile that doesn't depend on Django User model.
     Uses firebase_uid as the primary key for Firebase users.
+
+    Rows are a read replica of the Realtime Database ``users`` node, kept
+    up to date by ``myproject.firebase_mirror`` (firebase_uid is the RTDB
+    key), so listings, counts and lookups can be SQL queries.
     """
     firebase_uid = models.CharField(max_length=128, unique=True, primary_key=True)
     email = models.EmailField(blank=True, null=True)
     display_name = models.CharField(max_length=100, blank=True, null=True)
-    phone_number = models.CharField(max_length=15, blank=True, null=True)
+    phone_number = models.CharField(max_length=20, blank=True, null=True, db_index=True)
+    is_active = models.BooleanField(default=True)
     
     # Investment-related fields
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
@@ -29,13 +34,18 @@ class FirebaseProfile(models.Model):
     valid_id = models.ImageField(upload_to='firebase_documents/', blank=True, null=True)
     proof_of_address = models.ImageField(upload_to='firebase_documents/', blank=True, null=True)
     
-    # Referral system
-    referral_code = models.CharField(max_length=20, unique=True, blank=True)
+    # Referral system. Codes are indexed rather than unique: the mirror
+    # copies whatever Firebase holds, duplicates included.
+    referral_code = models.CharField(max_length=20, blank=True, null=True, db_index=True)
     referred_by_uid = models.CharField(max_length=128, blank=True, null=True)  # Firebase UID of referrer
+    referred_by_code = models.CharField(max_length=20, blank=True, null=True, db_index=True)
     
     # Timestamps
-    date_joined = models.DateTimeField(auto_now_add=True)
+    date_joined = models.DateTimeField(default=timezone.now, db_index=True)
     last_login = models.DateTimeField(null=True, blank=True)
+    # The record's updated_at in Firebase, and when the mirror last wrote the row
+    source_updated_at = models.CharField(max_length=64, blank=True)
+    synced_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'firebase_profiles'
@@ -87,9 +97,26 @@ class UserProfile(models.Model):
     referral_code = models.CharField(max_length=20, unique=True, blank=True)
     referred_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='referrals')
     date_joined = models.DateTimeField(auto_now_add=True)
+    # All-levels team totals, refreshed by the recompute_team_stats command
+    team_size = models.PositiveIntegerField(default=0)
+    team_volume = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    team_stats_updated_at = models.DateTimeField(null=True, blank=True)
+
+    # Fields copied onto the user's referral index summary
+    LEDGER_FIELDS = ('balance', 'total_invested', 'total_earnings')
     
     def __str__(self):
         return f"{self.user.username} - Profile"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Ledger as loaded, so a save can tell whether it changed
+        instance._saved_ledger = instance.ledger()
+        return instance
+
+    def ledger(self):
+        return tuple(self.__dict__.get(field) for field in self.LEDGER_FIELDS)
     
     def save(self, *args, **kwargs):
         if not self.referral_code:
@@ -255,12 +282,16 @@ class Transaction(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.reference_number:
-            import uuid
-            timestamp = timezone.now().strftime('%Y%m%d%H%M%S%f')
-            unique_suffix = str(uuid.uuid4()).replace('-', '')[:8]
-            self.reference_number = f"TXN{timestamp}{self.user.id}{unique_suffix}"
+            self.reference_number = self.generate_reference_number(self.user.id)
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def generate_reference_number(user_id):
+        """Unique reference; also used for rows created with bulk_create()."""
+        timestamp = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        unique_suffix = str(uuid.uuid4()).replace('-', '')[:8]
+        return f"TXN{timestamp}{user_id}{unique_suffix}"
+
 class ReferralCommission(models.Model):
     referrer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='referral_earnings')
     referred_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='referral_source')
@@ -280,6 +311,95 @@ class ReferralCommission(models.Model):
         else:
             return f"{self.referrer.username} earned ₱{self.commission_amount} from {self.referred_user.username}'s investment"
 
+class CommissionJob(models.Model):
+    """Pending referral-commission fan-out for one investment.
+
+    Created in the same database transaction as the investment and processed
+    in batches by the process_commission_jobs command.
+    """
+    JOB_STATUS = (
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    investment = models.OneToOneField(Investment, on_delete=models.CASCADE, related_name='commission_job')
+    status = models.CharField(max_length=20, choices=JOB_STATUS, default='pending', db_index=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Commission job for investment #{self.investment_id} ({self.status})"
+
+class FirebaseWrite(models.Model):
+    """A Realtime Database or Firestore write waiting for the write-behind worker.
+
+    Requests enqueue these through ``myproject.firebase_queue`` instead of
+    calling Firebase inline; the worker coalesces and applies them and
+    deletes each row once it has been written. Rows that keep failing are
+    kept as ``failed`` for inspection. While a worker is writing a row it is
+    ``in_flight`` and ``next_attempt_at`` is when that claim expires.
+    """
+    TARGETS = (
+        ('rtdb', 'Realtime Database'),
+        ('firestore', 'Firestore'),
+    )
+    OPERATIONS = (
+        ('set', 'Set'),
+        ('update', 'Update'),
+        ('merge', 'Set (merge)'),
+        ('add', 'Add to collection'),
+        ('batch', 'Batch'),
+    )
+    WRITE_STATUS = (
+        ('pending', 'Pending'),
+        ('in_flight', 'In flight'),
+        ('failed', 'Failed'),
+    )
+
+    target = models.CharField(max_length=20, choices=TARGETS)
+    operation = models.CharField(max_length=20, choices=OPERATIONS)
+    path = models.CharField(max_length=500)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=WRITE_STATUS, default='pending')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='firebase_write_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.target} {self.operation} {self.path} ({self.status})"
+
+class FirebaseSyncCheckpoint(models.Model):
+    """How far ``myproject.firebase_sync`` has copied one Firebase source into Django.
+
+    ``position`` is the ``updated_at`` of the last user record applied and
+    ``last_key`` its key, so records sharing a timestamp are neither skipped
+    nor applied twice. Advanced in the same transaction as the upserts.
+    """
+    SOURCES = (
+        ('rtdb', 'Realtime Database'),
+        ('firestore', 'Firestore'),
+        ('mirror', 'FirebaseProfile mirror'),
+    )
+
+    source = models.CharField(max_length=20, choices=SOURCES, unique=True)
+    position = models.CharField(max_length=64, blank=True)
+    last_key = models.CharField(max_length=128, blank=True)
+    records_synced = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} @ {self.position or 'start'}"
+
 class Notification(models.Model):
     NOTIFICATION_TYPES = (
         ('investment', 'Investment'),
@@ -301,6 +421,18 @@ class Notification(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.title}"
 
+class NotificationCounter(models.Model):
+    """Unread notification count per user, kept in step by myproject.notifications.
+
+    Only ever changed with F() updates, so it lives apart from UserProfile,
+    whose full-row saves would overwrite concurrent increments.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.unread} unread"
+
 class SupportTicket(models.Model):
     TICKET_STATUS = (
         ('open', 'Open'),
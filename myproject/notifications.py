@@ -0,0 +1,74 @@
+"""
+Unread notification counts without a COUNT(*) per page render.
+
+Each user's count lives in a ``NotificationCounter`` row. Signal receivers
+adjust it with F() updates when notifications are created or deleted, and
+the helpers below adjust it when notifications are marked read. Readers
+get the integer from the cache, falling back to the row and, for users
+with no row yet, to one recount that creates it.
+
+The cache entry is deleted on every change. With a per-process cache,
+other workers may show the old number for up to
+``NOTIFICATION_COUNT_CACHE_TTL`` seconds.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import Notification, NotificationCounter
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_key(user_id):
+    return f'unread_notifications:{user_id}'
+
+
+def unread_notification_count(user):
+    """Return ``user``'s unread notification count, usually without a query."""
+    if user is None or not user.is_authenticated or not getattr(user, 'pk', None):
+        return 0
+    key = _cache_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = NotificationCounter.objects.filter(user_id=user.pk).values_list('unread', flat=True).first()
+        if count is None:
+            count = recount_unread_notifications(user.pk)
+        cache.set(key, count, getattr(settings, 'NOTIFICATION_COUNT_CACHE_TTL', 30))
+    return count
+
+
+def recount_unread_notifications(user_id):
+    """Rebuild ``user_id``'s counter from the notifications table; return the count."""
+    count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+    NotificationCounter.objects.update_or_create(user_id=user_id, defaults={'unread': count})
+    cache.delete(_cache_key(user_id))
+    return count
+
+
+def adjust_unread_count(user_id, delta):
+    """Add ``delta`` to the counter, creating it by recount if the user has none."""
+    updated = NotificationCounter.objects.filter(user_id=user_id).update(
+        unread=Greatest(F('unread') + delta, 0)
+    )
+    if not updated:
+        recount_unread_notifications(user_id)
+    cache.delete(_cache_key(user_id))
+
+
+def mark_notification_read(notification):
+    """Mark one notification read, decrementing the counter only if it was unread."""
+    changed = Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True)
+    notification.is_read = True
+    if changed:
+        adjust_unread_count(notification.user_id, -1)
+
+
+def mark_all_notifications_read(user):
+    """Mark every notification of ``user`` read and zero the counter."""
+    Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+    NotificationCounter.objects.update_or_create(user=user, defaults={'unread': 0})
+    cache.delete(_cache_key(user.pk))
@@ -0,0 +1,57 @@
+"""
+Philippine phone number helpers shared by login, registration and the
+Firebase indexes.
+"""
+
+
+def normalize_phone_number(phone: str) -> str:
+    """Return ``phone`` in canonical ``+639xxxxxxxxx`` form.
+
+    Accepts the formats users actually type (``09xx``, ``639xx``, ``9xx``,
+    with spaces or dashes) and applies the same rules the login and
+    registration views have always used.
+    """
+    clean_phone = (phone or '').replace(' ', '').replace('-', '')
+    if clean_phone.startswith('+63'):
+        return clean_phone
+
+    digits_only = ''.join(filter(str.isdigit, clean_phone))
+
+    if digits_only.startswith('63') and len(digits_only) >= 12:
+        # 639xxxxxxxxx format
+        return '+' + digits_only
+    if digits_only.startswith('09') and len(digits_only) == 11:
+        # 09xxxxxxxxx format - convert to +639xxxxxxxxx
+        return '+63' + digits_only[1:]
+    if len(digits_only) >= 10:
+        # Handle various formats by extracting the last 10 digits
+        # This covers cases like 099xxxxxxxx, 99xxxxxxxx, 9xxxxxxxxx
+        last_10_digits = digits_only[-10:]
+        if last_10_digits.startswith('9'):
+            return '+63' + last_10_digits
+        return '+63' + digits_only
+    # Fallback: just add +63 to whatever digits we have
+    return '+63' + digits_only if digits_only else clean_phone
+
+
+def firebase_key_for_phone(phone: str) -> str:
+    """Return the ``users/{key}`` key used for a phone number in Firebase."""
+    return (phone or '').replace('+', '').replace(' ', '').replace('-', '')
+
+
+def phone_username_variants(phone: str) -> list:
+    """Return the Django usernames a phone number may have been stored under.
+
+    Older accounts used whichever format the user typed, so the legacy
+    spellings come first and the canonical ``+639...`` form last.
+    """
+    if not phone:
+        return []
+    variants = [
+        phone,
+        phone.replace('+', ''),
+        phone.replace('+63', '0'),
+        phone if phone.startswith('+') else f'+{phone}',
+        normalize_phone_number(phone),
+    ]
+    return list(dict.fromkeys(variant for variant in variants if variant))
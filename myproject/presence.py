@@ -0,0 +1,161 @@
+"""
+Coalesced presence updates (last login, online flag, activity) for Firebase.
+
+Views call ``record_activity()`` instead of writing presence fields to
+Firebase on every page view. Fields are merged in memory per user, later
+values winning, and counters such as ``login_count`` are summed. Every
+``PRESENCE_FLUSH_INTERVAL`` seconds a daemon thread flushes what was
+recorded. Each batch of up to ``PRESENCE_BATCH_SIZE`` users becomes one
+multi-location RTDB update and one Firestore batch, both queued through
+``firebase_queue``. Presence writes therefore grow with the number of
+active users per interval, not with page views.
+
+Counters are written as server-side increments, so logins in two workers
+in the same interval are both counted. A user this process has not seen
+for ``PRESENCE_OFFLINE_AFTER`` seconds is flushed once more with
+``is_online: False``.
+
+Pending presence lives in process memory. A worker killed without running
+its exit hook loses at most one interval of presence updates.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .firebase_app import rtdb_increment
+from .firebase_queue import FIRESTORE_BATCH_LIMIT, enqueue_firestore_batch, enqueue_rtdb_multi_update
+
+logger = logging.getLogger(__name__)
+
+
+class _Activity:
+    """Presence recorded for one user since the last flush."""
+
+    def __init__(self):
+        self.rtdb = {}
+        self.firestore = {}
+        self.increments = {}
+
+
+class PresenceBuffer:
+    """Per-process presence waiting to be flushed."""
+
+    def __init__(self):
+        self._pending = {}
+        self._last_seen = {}
+        self._lock = threading.Lock()
+
+    def record(self, firebase_key, rtdb=None, firestore=None, increments=None, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            activity = self._pending.get(firebase_key)
+            if activity is None:
+                activity = self._pending[firebase_key] = _Activity()
+            activity.rtdb.update(rtdb or {})
+            activity.firestore.update(firestore or {})
+            for field, delta in (increments or {}).items():
+                activity.increments[field] = activity.increments.get(field, 0) + delta
+            if activity.rtdb.get('is_online') is False:
+                self._last_seen.pop(firebase_key, None)
+            elif (rtdb or {}).get('is_online'):
+                self._last_seen[firebase_key] = now
+
+    def take(self, offline_after, now=None):
+        """Return and clear everything pending, plus offline marks for idle users."""
+        now = time.time() if now is None else now
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            idle = [key for key, seen in self._last_seen.items() if now - seen > offline_after]
+            for key in idle:
+                del self._last_seen[key]
+                activity = pending.get(key)
+                if activity is None:
+                    activity = pending[key] = _Activity()
+                activity.rtdb['is_online'] = False
+        return pending
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+
+presence_buffer = PresenceBuffer()
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def record_activity(firebase_key, rtdb=None, firestore=None, increments=None):
+    """Remember presence for ``users/{firebase_key}``; it is written on the next flush.
+
+    ``rtdb`` and ``firestore`` are fields for the RTDB record and the
+    Firestore ``users`` document (merged, so the document is created if it
+    is missing). ``increments`` maps RTDB counters to amounts to add.
+    """
+    if not firebase_key:
+        return
+    presence_buffer.record(firebase_key, rtdb, firestore, increments)
+    if getattr(settings, 'PRESENCE_AUTOSTART', True):
+        start_presence_flusher()
+
+
+def flush_presence(batch_size=None, now=None):
+    """Queue the pending presence as batched Firebase writes; return the number of users."""
+    batch_size = min(batch_size or getattr(settings, 'PRESENCE_BATCH_SIZE', 200), FIRESTORE_BATCH_LIMIT)
+    pending = presence_buffer.take(getattr(settings, 'PRESENCE_OFFLINE_AFTER', 900), now)
+    keys = sorted(pending)
+    for start in range(0, len(keys), batch_size):
+        rtdb_updates = {}
+        firestore_writes = []
+        for key in keys[start:start + batch_size]:
+            activity = pending[key]
+            for field, value in activity.rtdb.items():
+                rtdb_updates[f'users/{key}/{field}'] = value
+            for field, delta in activity.increments.items():
+                rtdb_updates[f'users/{key}/{field}'] = rtdb_increment(delta)
+            if activity.firestore:
+                firestore_writes.append(('merge', f'users/{key}', activity.firestore))
+        if rtdb_updates:
+            enqueue_rtdb_multi_update(rtdb_updates)
+        if firestore_writes:
+            enqueue_firestore_batch(firestore_writes)
+    if keys:
+        logger.debug(f"Flushed presence for {len(keys)} users")
+    return len(keys)
+
+
+def _flush_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush_presence()
+        except Exception as e:
+            logger.error(f"Presence flush error: {e}")
+        finally:
+            close_old_connections()
+
+
+def _flush_at_exit():
+    try:
+        flush_presence()
+    except Exception as e:
+        logger.warning(f"Presence flush at exit failed: {e}")
+
+
+def start_presence_flusher(interval=None):
+    """Start this process's presence flush thread if it is not running yet."""
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return _worker
+        interval = interval or getattr(settings, 'PRESENCE_FLUSH_INTERVAL', 60)
+        _worker = threading.Thread(target=_flush_loop, args=(interval,), name='presence-flush', daemon=True)
+        _worker.start()
+        atexit.register(_flush_at_exit)
+    return _worker
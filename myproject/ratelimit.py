@@ -0,0 +1,166 @@
+"""
+Token-bucket rate limiting for login, registration, public feeds and payments.
+
+Each protected view has a scope in ``settings.RATE_LIMITS`` mapping key
+kinds to rates, e.g. ``{'ip': '30/minute', 'phone': '5/minute'}``. Every
+key kind has its own bucket that holds up to N tokens and refills at
+N per period. A request takes one token from each bucket and is
+rejected with 429 as soon as one is empty, before the view touches the
+database or Firebase.
+
+Buckets live in the ``RATELIMIT_USE_CACHE`` cache (Redis in production)
+so all workers share them. If that cache is a DummyCache or fails, the
+buckets fall back to this process's memory. Shared buckets are updated
+with get/set rather than atomically, so concurrent bursts across workers
+may slip a few requests past the limit.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.http import HttpResponse, JsonResponse
+
+from .structured_logging import log_event
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+LOCAL_MAX_BUCKETS = 10000
+
+
+def parse_rate(rate):
+    """Turn ``'10/minute'`` into ``(capacity, tokens per second)``."""
+    count, period = rate.split('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period.strip()]
+
+
+def _refill(state, capacity, refill_rate, now):
+    tokens, stamp = state if state else (capacity, now)
+    return min(capacity, tokens + max(0.0, now - stamp) * refill_rate)
+
+
+def _take(tokens, refill_rate):
+    """Return ``(allowed, tokens left, seconds until a token is available)``."""
+    if tokens >= 1:
+        return True, tokens - 1, 0
+    return False, tokens, math.ceil((1 - tokens) / refill_rate)
+
+
+class _LocalBuckets:
+    """In-process bucket states, bounded by least-recent use."""
+
+    def __init__(self, max_buckets=LOCAL_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate, now):
+        with self._lock:
+            tokens = _refill(self._states.get(key), capacity, refill_rate, now)
+            allowed, tokens, retry_after = _take(tokens, refill_rate)
+            self._states[key] = (tokens, now)
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_buckets:
+                self._states.popitem(last=False)
+        return allowed, retry_after
+
+
+local_buckets = _LocalBuckets()
+
+
+def _shared_cache():
+    cache = caches[getattr(settings, 'RATELIMIT_USE_CACHE', 'default')]
+    return None if isinstance(cache, DummyCache) else cache
+
+
+def consume(bucket_key, rate, now=None):
+    """Take one token from ``bucket_key``; return ``(allowed, retry_after_seconds)``."""
+    capacity, refill_rate = parse_rate(rate)
+    now = time.time() if now is None else now
+    cache = _shared_cache()
+    if cache is not None:
+        cache_key = f'ratelimit:{bucket_key}'
+        try:
+            tokens = _refill(cache.get(cache_key), capacity, refill_rate, now)
+            allowed, tokens, retry_after = _take(tokens, refill_rate)
+            # A bucket left alone for a full period is full again; let it expire
+            cache.set(cache_key, (tokens, now), math.ceil(capacity / refill_rate) + 1)
+            return allowed, retry_after
+        except Exception as e:
+            logger.warning(f"Rate limit cache unavailable, using local buckets: {e}")
+    return local_buckets.consume(bucket_key, capacity, refill_rate, now)
+
+
+def client_ip(request):
+    """Client address as seen by the nearest untrusted hop.
+
+    Each of the ``RATELIMIT_TRUSTED_PROXIES`` proxies in front of the app
+    appends the address it received the request from to X-Forwarded-For,
+    so the client's address is that many entries from the right. Entries
+    further left are whatever the client sent and are ignored. With no
+    trusted proxies, REMOTE_ADDR is used.
+    """
+    trusted = getattr(settings, 'RATELIMIT_TRUSTED_PROXIES', 0)
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if trusted and forwarded:
+        entries = [entry.strip() for entry in forwarded.split(',') if entry.strip()]
+        if entries:
+            # Fewer entries than proxies: all of them came from trusted hops
+            return entries[-min(trusted, len(entries))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def client_phone(request):
+    """Phone number the request acts on: the submitted one, else the logged-in one."""
+    phone = request.POST.get('phone', '') if request.method == 'POST' else ''
+    if not phone and hasattr(request, 'session'):
+        phone = request.session.get('user_phone', '')
+    digits = ''.join(ch for ch in phone if ch.isdigit())
+    # 09xx, 639xx and +639xx are the same account
+    return digits[-10:]
+
+
+KEY_FUNCTIONS = {
+    'ip': client_ip,
+    'phone': client_phone,
+}
+
+
+def _rejected(request, retry_after):
+    message = 'Too many requests. Please wait a moment and try again.'
+    if '/api/' in request.path or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        response = JsonResponse({'success': False, 'error': message}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(max(1, retry_after))
+    return response
+
+
+def rate_limit(scope, methods=('POST',)):
+    """Reject requests over the ``settings.RATE_LIMITS[scope]`` buckets with 429.
+
+    Only requests whose method is in ``methods`` take tokens; pass ``None``
+    to limit every method.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if getattr(settings, 'RATELIMIT_ENABLE', True) and (methods is None or request.method in methods):
+                for kind, rate in getattr(settings, 'RATE_LIMITS', {}).get(scope, {}).items():
+                    key = KEY_FUNCTIONS[kind](request)
+                    if not key:
+                        continue
+                    allowed, retry_after = consume(f'{scope}:{kind}:{key}', rate)
+                    if not allowed:
+                        log_event(logger, logging.INFO, 'ratelimit.rejected', scope=scope, kind=kind, key=key)
+                        return _rejected(request, retry_after)
+            return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
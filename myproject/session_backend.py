@@ -0,0 +1,191 @@
+"""
+Database session backend with a bounded per-process LRU in front of it.
+
+Decoded sessions are kept in memory per worker, keyed by session key and
+tagged with the row's ``expire_date``. Every save rewrites ``expire_date``, so
+it doubles as the row version. A hit within ``SESSION_LRU_MAX_STALENESS``
+seconds of the entry being loaded or checked is served without touching
+the database. An older hit is checked with a one-column primary-key lookup
+of that version, so a session another worker rewrote, logged out or flushed
+is served from here for at most that long. Saves and deletes go through to
+the database and update or evict the local entry, so this worker's own
+changes are seen at once.
+
+Expired rows are deleted in chunks, by ``clearsessions`` and by a daemon
+sweeper thread each worker starts on first use.
+"""
+import copy
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class _SessionLRU:
+    """Thread-safe bounded map of session key -> (data, expire_date, checked_at).
+
+    ``checked_at`` is the ``time.monotonic()`` when the entry was last known
+    to match the database row.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, data, expire_date, checked_at=None):
+        checked_at = time.monotonic() if checked_at is None else checked_at
+        with self._lock:
+            self._entries[key] = (data, expire_date, checked_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def mark_checked(self, key, expire_date):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == expire_date:
+                self._entries[key] = (entry[0], expire_date, time.monotonic())
+
+    def evict(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+session_lru = _SessionLRU(getattr(settings, 'SESSION_LRU_MAX_ENTRIES', 5000))
+
+_sweeper_started = False
+_sweeper_lock = threading.Lock()
+
+
+class SessionStore(DBStore):
+    """``django.contrib.sessions.backends.db`` with an in-process LRU tier."""
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._saved_expire_date = None
+        start_session_sweeper()
+
+    def load(self):
+        session_key = self.session_key
+        if session_key:
+            entry = session_lru.get(session_key)
+            if entry is not None:
+                data = self._load_from_lru(session_key, entry)
+                if data is not None:
+                    return data
+
+        s = self._get_session_from_db()
+        if s is None:
+            return {}
+        data = self.decode(s.session_data)
+        session_lru.put(s.session_key, copy.deepcopy(data), s.expire_date)
+        return data
+
+    def _load_from_lru(self, session_key, entry):
+        data, expire_date, checked_at = entry
+        if expire_date <= timezone.now():
+            session_lru.evict(session_key)
+            return None
+        if time.monotonic() - checked_at < getattr(settings, 'SESSION_LRU_MAX_STALENESS', 5):
+            return copy.deepcopy(data)
+
+        # Another worker may have rewritten, flushed or deleted the row; compare versions
+        current = (
+            self.model.objects.filter(session_key=session_key, expire_date__gt=timezone.now())
+            .values_list('expire_date', flat=True)
+            .first()
+        )
+        if current != expire_date:
+            session_lru.evict(session_key)
+            return None
+        session_lru.mark_checked(session_key, expire_date)
+        return copy.deepcopy(data)
+
+    def create_model_instance(self, data):
+        obj = super().create_model_instance(data)
+        self._saved_expire_date = obj.expire_date
+        return obj
+
+    def save(self, must_create=False):
+        super().save(must_create=must_create)
+        # Write-through: the row just written is the newest version
+        data = copy.deepcopy(self._get_session(no_load=must_create))
+        session_lru.put(self.session_key, data, self._saved_expire_date)
+
+    def delete(self, session_key=None):
+        key = session_key if session_key is not None else self.session_key
+        if key:
+            session_lru.evict(key)
+        super().delete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        sweep_expired_sessions()
+
+
+def sweep_expired_sessions(chunk_size=None, pause=0.0):
+    """Delete expired session rows ``chunk_size`` at a time; return the count."""
+    chunk_size = chunk_size or getattr(settings, 'SESSION_SWEEP_CHUNK_SIZE', 1000)
+    deleted = 0
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=timezone.now())
+            .values_list('session_key', flat=True)[:chunk_size]
+        )
+        if not keys:
+            break
+        deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+        for key in keys:
+            session_lru.evict(key)
+        if pause:
+            time.sleep(pause)
+    if deleted:
+        logger.info(f"Swept {deleted} expired sessions")
+    return deleted
+
+
+def _sweeper_loop(interval):
+    # Stagger workers so they do not all sweep at once
+    time.sleep(random.uniform(0, interval))
+    while True:
+        try:
+            sweep_expired_sessions(pause=0.1)
+        except Exception as e:
+            logger.warning(f"Session sweep failed: {e}")
+        time.sleep(interval)
+
+
+def start_session_sweeper():
+    """Start this process's sweeper thread once, if SESSION_SWEEP_INTERVAL is set."""
+    global _sweeper_started
+    interval = getattr(settings, 'SESSION_SWEEP_INTERVAL', None)
+    if not interval or _sweeper_started:
+        return
+    with _sweeper_lock:
+        if _sweeper_started:
+            return
+        _sweeper_started = True
+    threading.Thread(target=_sweeper_loop, args=(interval,), name='session-sweeper', daemon=True).start()
@@ -0,0 +1,92 @@
+"""
+Signal receivers for the myproject app, connected in ``MyprojectConfig.ready``.
+"""
+import logging
+
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Notification, UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Session flag set once the logged-in user's profile is known to exist
+PROFILE_CHECKED_SESSION_KEY = 'profile_checked_user_id'
+
+
+def ensure_user_profile(user):
+    """Create the user's ``UserProfile`` if it is missing; return the profile."""
+    from .models import UserProfile
+
+    profile, created = UserProfile.objects.get_or_create(
+        user=user, defaults={'phone_number': user.username}
+    )
+    if created:
+        logger.info(f"Created missing profile for user: {user.username}")
+    return profile
+
+
+def check_profile_at_login(session, user):
+    """Repair a missing profile at login and registration instead of on every request.
+
+    Firebase logins never call ``login()``, so ``user_login`` and
+    ``register`` call this themselves for the matching Django user.
+    """
+    try:
+        ensure_user_profile(user)
+        if session is not None:
+            session[PROFILE_CHECKED_SESSION_KEY] = user.pk
+    except Exception as e:
+        logger.error(f"Profile check at login failed for {user.username}: {e}")
+
+
+@receiver(user_logged_in)
+def ensure_profile_on_login(sender, request, user, **kwargs):
+    check_profile_at_login(getattr(request, 'session', None), user)
+
+
+@receiver(post_save, sender=Notification)
+def count_saved_notification(sender, instance, created, **kwargs):
+    """Keep the unread counter in step with notifications saved through the ORM."""
+    from .notifications import adjust_unread_count, recount_unread_notifications
+
+    try:
+        if created:
+            if not instance.is_read:
+                adjust_unread_count(instance.user_id, 1)
+        else:
+            # Edits (e.g. in the admin) may flip is_read either way
+            recount_unread_notifications(instance.user_id)
+    except Exception as e:
+        logger.error(f"Unread counter update failed for user {instance.user_id}: {e}")
+
+
+@receiver(post_delete, sender=Notification)
+def count_deleted_notification(sender, instance, **kwargs):
+    from .notifications import adjust_unread_count
+
+    if not instance.is_read:
+        try:
+            adjust_unread_count(instance.user_id, -1)
+        except Exception as e:
+            logger.error(f"Unread counter update failed for user {instance.user_id}: {e}")
+
+
+@receiver(post_save, sender=UserProfile)
+def refresh_summary_on_ledger_change(sender, instance, created=False, update_fields=None, **kwargs):
+    """Copy deposits, investments and earnings onto the ``referrals/{code}`` summary.
+
+    Saves naming ``update_fields`` are judged by those fields alone; other
+    saves compare the ledger with the one loaded by ``UserProfile.from_db``.
+    """
+    from .team_listing import refresh_member_summaries_on_commit
+
+    if update_fields is not None:
+        changed = bool(set(update_fields) & set(UserProfile.LEDGER_FIELDS))
+    else:
+        # A new profile has no referral summary yet
+        changed = not created and instance.ledger() != getattr(instance, '_saved_ledger', None)
+    instance._saved_ledger = instance.ledger()
+    if changed:
+        refresh_member_summaries_on_commit([instance.user_id])
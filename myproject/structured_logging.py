@@ -0,0 +1,188 @@
+"""
+Structured, sampled, non-blocking logging for request hot paths.
+
+- ``log_event(logger, level, event, **fields)`` records an event name and
+  its fields. Nothing is built or formatted unless the logger is enabled
+  and the event survives sampling.
+- Sampling keeps only a fraction of high-frequency INFO/DEBUG events. The
+  fraction is configured per event name or logger-name prefix in
+  ``settings.LOG_SAMPLE_RATES``. Warnings and errors are never sampled.
+  ``SamplingFilter`` applies the same rates to plain ``logger.info()`` calls.
+- ``NonBlockingQueueHandler`` hands records, with their message already
+  merged, to a background thread that renders and writes them. A full
+  queue drops records instead of blocking the request.
+- ``StructuredFormatter`` renders one compact JSON object per line.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+
+def log_event(logger, level, event, **fields):
+    """Log ``event`` with structured ``fields`` if ``logger`` would emit it.
+
+    Sampling is decided here, before a ``LogRecord`` is built, so dropped
+    events cost a dict lookup and a random number.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if level < logging.WARNING and not get_sample_rates().keep(event, logger.name):
+        return
+    logger.log(level, event, extra={'event': event, 'fields': fields, 'sampled': True}, stacklevel=2)
+
+
+class SampleRates:
+    """Fraction of records to keep, by event name or logger-name prefix.
+
+    ``0.01`` keeps one record in a hundred. The event name is matched first,
+    then the longest logger prefix; anything unmatched is always kept.
+    """
+
+    def __init__(self, rates):
+        self.rates = dict(rates)
+        self._by_logger = {}
+
+    def rate_for(self, event, logger_name):
+        rate = self.rates.get(event)
+        if rate is not None:
+            return rate
+        rate = self._by_logger.get(logger_name)
+        if rate is None:
+            prefixes = [
+                prefix for prefix in self.rates
+                if logger_name == prefix or logger_name.startswith(f'{prefix}.')
+            ]
+            rate = self.rates[max(prefixes, key=len)] if prefixes else 1.0
+            self._by_logger[logger_name] = rate
+        return rate
+
+    def keep(self, event, logger_name):
+        rate = self.rate_for(event, logger_name)
+        return rate >= 1.0 or random.random() < rate
+
+
+_sample_rates = None
+
+
+def get_sample_rates():
+    """Return the process-wide ``SampleRates`` built from ``settings.LOG_SAMPLE_RATES``."""
+    global _sample_rates
+    if _sample_rates is None:
+        from django.conf import settings
+        _sample_rates = SampleRates(getattr(settings, 'LOG_SAMPLE_RATES', {}))
+    return _sample_rates
+
+
+class SamplingFilter(logging.Filter):
+    """Pass only a sample of INFO and DEBUG records from plain logger calls.
+
+    Records from ``log_event`` were already sampled and always pass, as do
+    warnings and errors. ``rates`` defaults to ``settings.LOG_SAMPLE_RATES``.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self._rates = SampleRates(rates) if rates is not None else None
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or getattr(record, 'sampled', False):
+            return True
+        rates = self._rates or get_sample_rates()
+        return rates.keep(getattr(record, 'event', None), record.name)
+
+
+class StructuredFormatter(logging.Formatter):
+    """Render a record as one line of JSON: time, level, logger, message and fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        elif record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _ListenerTarget(logging.StreamHandler):
+    """Stream handler used on the listener thread; formats with the owner's formatter."""
+
+    def __init__(self, owner, stream):
+        super().__init__(stream)
+        self.owner = owner
+
+    def format(self, record):
+        return self.owner.format(record)
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Records are dropped when the queue is full, but the stop marker must get through
+        self.queue.put(self._sentinel)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue records for a background thread that formats and writes them to stdout."""
+
+    def __init__(self, queue_size=10000, stream=None):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.dropped = 0
+        self._drop_lock = threading.Lock()
+        self.listener = _Listener(
+            self.queue, _ListenerTarget(self, stream or sys.stdout), respect_handler_level=False
+        )
+        self.listener.start()
+        atexit.register(self._stop_listener)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def prepare(self, record):
+        # The JSON line is built on the listener thread, but the message is
+        # merged now: its args may be objects the caller changes afterwards.
+        # The traceback is frozen to text so no live frames are kept either.
+        # A copy, so handlers after this one still see the original record.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+
+    def _restart_after_fork(self):
+        # Threads don't survive fork (gunicorn --preload), so each worker
+        # gets its own queue and listener
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self._drop_lock = threading.Lock()
+        self.listener = _Listener(self.queue, *self.listener.handlers, respect_handler_level=False)
+        self.listener.start()
+
+    def _stop_listener(self):
+        # Flushes queued records; safe to call more than once
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self._stop_listener()
+        super().close()
@@ -0,0 +1,276 @@
+"""
+Server-side paging of a user's direct referrals.
+
+Members come from the ``referrals/{code}`` index (see ``firebase_index``).
+Each page is one ordered, limited RTDB query ending at an opaque cursor, so
+a page costs the same however large the team is; the database rules need
+``.indexOn`` for the sort fields under ``referrals/$code``. Members with the
+same sort value come in key order, as RTDB returns them, and the cursor
+counts the ones already shown so the next query can skip them. The team
+page renders the first page and the totals ``recompute_team_stats`` stored
+on the user record; ``team_members_api`` serves the following pages.
+
+The index summaries are built from the RTDB user record. Deposits,
+investments and payouts change the Django ledger instead, so
+``refresh_member_summaries_on_commit()`` remembers the user ids whose
+totals changed and a daemon thread later runs ``refresh_member_summary()``
+for them. Finding a user's Firebase key and referrer costs Firebase reads,
+which therefore happen off the request path. Pending ids live in process
+memory, like presence; a worker killed without running its exit hook loses
+at most one interval of refreshes.
+"""
+import atexit
+import base64
+import json
+import logging
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .firebase_cache import team_referrals, user_records
+from .firebase_index import REFERRALS_NODE, find_user_key_by_phone
+
+logger = logging.getLogger(__name__)
+
+TEAM_PAGE_SIZE = 50
+MAX_TEAM_PAGE_SIZE = 200
+
+# sort name -> index field it orders by; every sort is descending
+TEAM_SORTS = {
+    'joined': 'date_joined',
+    'invested': 'total_invested',
+    'active': 'is_active',
+}
+DEFAULT_TEAM_SORT = 'joined'
+
+# user ids whose summaries are waiting for the refresh thread
+_pending_user_ids = set()
+_pending_lock = threading.Lock()
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _members(entries):
+    members = []
+    for user_key, entry in (entries or {}).items():
+        if not isinstance(entry, dict):
+            continue
+        member = dict(entry)
+        member['uid'] = user_key
+        member['phone'] = member.get('phone_number', '')
+        member['date_joined'] = str(member.get('date_joined') or '')
+        member['total_invested'] = float(member.get('total_invested') or 0)
+        member['total_earnings'] = float(member.get('total_earnings') or 0)
+        member['balance'] = float(member.get('balance') or 0)
+        member['is_active'] = bool(member.get('is_active'))
+        members.append(member)
+    return members
+
+
+def load_team_members(referral_code):
+    """Return the index summaries of everyone referred by ``referral_code``."""
+    if not referral_code:
+        return []
+    return _members(team_referrals.get(referral_code))
+
+
+def refresh_member_summary(profile):
+    """Queue ``profile``'s ledger totals onto its ``referrals/{code}/{key}`` summary.
+
+    Returns True when an update was queued; users without a Firebase record
+    or a referrer have no summary to refresh.
+    """
+    from .firebase_app import get_database_reference
+    from .firebase_queue import enqueue_rtdb_update
+
+    phone = profile.phone_number or profile.user.username
+    firebase_key = find_user_key_by_phone(get_database_reference('/'), phone)
+    record = user_records.get(firebase_key) if firebase_key else None
+    referred_by_code = (record or {}).get('referred_by_code')
+    if not referred_by_code:
+        return False
+
+    balance = float(profile.balance or 0)
+    total_invested = max(float(profile.total_invested or 0), _as_float(record.get('total_invested')))
+    total_earnings = max(float(profile.total_earnings or 0), _as_float(record.get('total_earnings')))
+    update = {'balance': balance, 'total_invested': total_invested, 'total_earnings': total_earnings}
+    if balance > 0 or total_invested > 0:
+        # Otherwise keep the flag, which also counts the record's transactions
+        update['is_active'] = True
+    enqueue_rtdb_update(f'{REFERRALS_NODE}/{referred_by_code}/{firebase_key}', update)
+    return True
+
+
+def refresh_member_summaries_on_commit(user_ids):
+    """Queue ``user_ids``' summaries for the refresh thread once the transaction commits."""
+    from django.db import transaction
+
+    user_ids = list(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: queue_member_summaries(user_ids))
+
+
+def queue_member_summaries(user_ids):
+    """Remember ``user_ids`` and wake the refresh thread; no Firebase call is made here."""
+    with _pending_lock:
+        _pending_user_ids.update(user_ids)
+    if getattr(settings, 'MEMBER_SUMMARY_AUTOSTART', True):
+        start_member_summary_refresher()
+    _wakeup.set()
+
+
+def flush_member_summaries():
+    """Run ``refresh_member_summary()`` for every queued user; return how many were queued."""
+    from .firebase_app import firebase_available
+    from .models import UserProfile
+
+    global _pending_user_ids
+    with _pending_lock:
+        user_ids, _pending_user_ids = _pending_user_ids, set()
+    if not user_ids or not firebase_available():
+        return 0
+    for profile in UserProfile.objects.filter(user_id__in=user_ids).select_related('user'):
+        try:
+            refresh_member_summary(profile)
+        except Exception as e:
+            logger.warning(f"Referral summary refresh failed for user {profile.user_id}: {e}")
+    return len(user_ids)
+
+
+def _refresh_loop(interval):
+    while True:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        try:
+            flush_member_summaries()
+        except Exception as e:
+            logger.error(f"Referral summary refresh error: {e}")
+        finally:
+            close_old_connections()
+
+
+def _flush_at_exit():
+    try:
+        flush_member_summaries()
+    except Exception as e:
+        logger.warning(f"Referral summary refresh at exit failed: {e}")
+
+
+def start_member_summary_refresher(interval=None):
+    """Start this process's summary refresh thread if it is not running yet."""
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return _worker
+        interval = interval or getattr(settings, 'MEMBER_SUMMARY_INTERVAL', 30.0)
+        _worker = threading.Thread(target=_refresh_loop, args=(interval,), name='member-summaries', daemon=True)
+        _worker.start()
+        atexit.register(_flush_at_exit)
+    return _worker
+
+
+def _as_float(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def team_totals(members):
+    """Return the team page counters summed from ``members``, the whole direct team."""
+    return {
+        'team_size': len(members),
+        'direct_referrals': len(members),
+        'active_referrals': sum(1 for member in members if member['is_active']),
+        'team_volume': sum(member['total_invested'] for member in members),
+    }
+
+
+def team_header(record, referral_code):
+    """Return the team page counters for the user whose RTDB record is ``record``.
+
+    Uses the totals ``recompute_team_stats`` stored on the record. Until it
+    has run for this user they are summed from the direct team instead.
+    """
+    record = record or {}
+    if not record.get('team_stats_updated_at'):
+        return team_totals(load_team_members(referral_code))
+    return {
+        'team_size': int(_as_float(record.get('team_size'))),
+        'direct_referrals': int(_as_float(record.get('direct_referrals'))),
+        'active_referrals': int(_as_float(record.get('active_referrals'))),
+        'team_volume': _as_float(record.get('team_volume')),
+    }
+
+
+def team_page(referral_code, sort=DEFAULT_TEAM_SORT, cursor=None, page_size=TEAM_PAGE_SIZE):
+    """Return ``(members, next_cursor)`` for one page of ``referral_code``'s team.
+
+    Unknown sorts fall back to join date. ``cursor`` is the ``next_cursor``
+    of the previous page and must come with the same sort; ``next_cursor``
+    is None on the last page. Raises ValueError for a malformed cursor.
+    """
+    from .firebase_app import get_database_reference
+
+    field = TEAM_SORTS.get(sort, TEAM_SORTS[DEFAULT_TEAM_SORT])
+    page_size = min(max(int(page_size), 1), MAX_TEAM_PAGE_SIZE)
+    if not referral_code:
+        return [], None
+
+    value, ties, shown = _decode_cursor(cursor) if cursor else (None, 0, 0)
+    query = get_database_reference(f'{REFERRALS_NODE}/{referral_code}').order_by_child(field)
+    if value is not None:
+        query = query.end_at(value)
+        skip = ties
+    else:
+        # Nothing sorts below a missing value, so skip everything shown so far
+        skip = shown
+    rows = list((query.limit_to_last(skip + page_size + 1).get() or {}).items())
+    # Ascending from the query; drop the rows already shown and turn it around
+    rows = rows[:max(len(rows) - skip, 0)][::-1]
+    page_rows = rows[:page_size]
+
+    next_cursor = None
+    if len(rows) > page_size:
+        last = _sort_value(page_rows[-1][1], field)
+        last_ties = sum(1 for _, entry in page_rows if _sort_value(entry, field) == last)
+        if value is not None and last == value:
+            last_ties += ties
+        next_cursor = _encode_cursor(last, last_ties, shown + len(page_rows))
+
+    members = _members(dict(page_rows))
+    for member in members:
+        member['joined_display'] = _format_joined(member['date_joined'])
+    return members, next_cursor
+
+
+def _sort_value(entry, field):
+    return entry.get(field) if isinstance(entry, dict) else None
+
+
+def _encode_cursor(value, ties, shown):
+    raw = json.dumps([value, ties, shown], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        value, ties, shown = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        ties, shown = int(ties), int(shown)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid team cursor: {cursor!r}') from e
+    if isinstance(value, (list, dict)) or ties < 0 or shown < 0:
+        raise ValueError(f'Invalid team cursor: {cursor!r}')
+    return value, ties, shown
+
+
+def _format_joined(value):
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).strftime('%b %d, %Y')
+    except (AttributeError, ValueError):
+        return ''
@@ -1,3 +1,1310 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_save, pre_save
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature,
+)
+from django.utils import timezone
+from firebase_admin import firestore
+
+from .commissions import MAX_JOB_ATTEMPTS, enqueue_investment_commission, process_commission_batch
+from .firebase_user import (
+    LEGACY_SESSION_USER_DATA, PROFILE_SUMMARY_VERSION, SESSION_DJANGO_USER_ID, SESSION_PROFILE, FirebaseUser,
+    start_firebase_session,
+)
+from .firebase_app import get_database_reference, get_firestore_client
+from .firebase_cache import firestore_documents, user_records
+from .firebase_clients import firebase_clients
+from .firebase_fake import FakeFirebaseError, get_fake_firebase
+from .firebase_fanout import FanOutTimeout, fan_out
+from .firebase_mirror import UserMirror, mark_mirror_stale, mirror_is_fresh
+from .firebase_sync import reset_checkpoints, sync_firebase_changes, sync_source
+from .firebase_queue import (
+    APPLIED_AT, MAX_WRITE_ATTEMPTS, SERVER_TIMESTAMP, apply_write, coalesce_writes, drain_firebase_queue,
+    enqueue_firestore_update, enqueue_rtdb_set, enqueue_rtdb_update, write_keys,
+)
+from .models import (
+    CommissionJob, FirebaseProfile, FirebaseSyncCheckpoint, FirebaseWrite, Investment, InvestmentPlan, Notification,
+    NotificationCounter, ReferralCommission, Transaction, UserProfile,
+)
+from .presence import flush_presence, presence_buffer, record_activity
+from .notifications import mark_all_notifications_read, mark_notification_read, unread_notification_count
+from .middleware import SessionPersistenceMiddleware
+from .session_backend import SessionStore as LRUSessionStore, session_lru
+from .structured_logging import NonBlockingQueueHandler, StructuredFormatter
+from .team_graph import compute_team_totals, index_parents
+from .team_listing import flush_member_summaries
+from .signals import PROFILE_CHECKED_SESSION_KEY
+from .middleware_timing import VIEW_STAGE, TimingStats, _RequestTiming
+from .ratelimit import client_ip, consume, local_buckets, rate_limit
+from .views import firebase_login_required
+
+
+@firebase_login_required
+def _touch_user_view(request):
+    return HttpResponse(request.user.username if request.user.is_authenticated else '')
+
+
+@firebase_login_required
+def _firebase_only_view(request):
+    return HttpResponse(request.firebase_user.firebase_key)
+
+
+class FirebaseLoginRequiredTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        # Stored in the legacy 09xx format; the session carries +63xx
+        self.user = User.objects.create_user(username='09171234567', password='x')
+        self.session = SessionStore()
+        self.session.update({
+            'firebase_authenticated': True,
+            'is_authenticated': True,
+            'firebase_key': '639171234567',
+            'user_phone': '+639171234567',
+            'firebase_user_data': {'email': 'member@example.com'},
+        })
+
+    def _request(self):
+        request = self.factory.get('/team/')
+        request.session = self.session
+        request.user = AnonymousUser()
+        request._messages = FallbackStorage(request)
+        return request
+
+    def test_first_request_resolves_user_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = _touch_user_view(self._request())
+        self.assertEqual(response.content.decode(), '09171234567')
+        self.assertEqual(self.session[SESSION_DJANGO_USER_ID], self.user.pk)
+
+    def test_repeat_request_needs_no_auth_queries(self):
+        _touch_user_view(self._request())
+
+        request = self._request()
+        with self.assertNumQueries(0):
+            response = _firebase_only_view(request)
+        self.assertEqual(response.content.decode(), '639171234567')
+        self.assertIsInstance(request.firebase_user, FirebaseUser)
+
+        # Using request.user afterwards only loads the remembered id
+        with self.assertNumQueries(1):
+            response = _touch_user_view(self._request())
+        self.assertEqual(response.content.decode(), '09171234567')
+
+    def test_unknown_phone_falls_back_and_is_not_remembered(self):
+        self.session['user_phone'] = '+639998887777'
+        with self.assertNumQueries(1):
+            response = _touch_user_view(self._request())
+        self.assertEqual(response.content.decode(), '')
+        self.assertNotIn(SESSION_DJANGO_USER_ID, self.session)
+
+    def test_unauthenticated_session_redirects_to_login(self):
+        self.session['firebase_authenticated'] = False
+        with self.assertNumQueries(0):
+            response = _touch_user_view(self._request())
+        self.assertEqual(response.status_code, 302)
+
+
+class CompactSessionTests(TestCase):
+    user_data = {
+        'email': 'member@example.com',
+        'display_name': 'Member',
+        'balance': 115.0,
+        'password': 'a' * 64,
+        'transactions': {f'txn{i}': {'amount': 15} for i in range(200)},
+        'login_count': 7,
+    }
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.session = SessionStore()
+        cache.clear()
+
+    def _request(self):
+        request = self.factory.get('/dashboard/')
+        request.session = self.session
+        request.user = AnonymousUser()
+        return request
+
+    def test_login_stores_only_a_profile_summary(self):
+        start_firebase_session(self.session, '639171234567', '+639171234567', self.user_data, 'firebase_direct')
+
+        summary = self.session[SESSION_PROFILE]
+        self.assertEqual(summary['v'], PROFILE_SUMMARY_VERSION)
+        self.assertEqual(summary['balance'], 115.0)
+        self.assertNotIn('password', summary)
+        self.assertNotIn('transactions', summary)
+        self.assertNotIn(LEGACY_SESSION_USER_DATA, self.session)
+
+    def test_legacy_session_is_compacted_on_next_request(self):
+        self.session.update({
+            'firebase_authenticated': True,
+            'is_authenticated': True,
+            'firebase_key': '639171234567',
+            'user_phone': '+639171234567',
+            LEGACY_SESSION_USER_DATA: self.user_data,
+        })
+        request = self._request()
+        _firebase_only_view(request)
+
+        self.assertNotIn(LEGACY_SESSION_USER_DATA, self.session)
+        self.assertEqual(request.firebase_user.email, 'member@example.com')
+        self.assertNotIn('transactions', self.session[SESSION_PROFILE])
+
+    def test_other_fields_come_from_the_cached_record(self):
+        cache.set('firebase_user_record:639171234567', {'login_count': 7})
+        user = FirebaseUser('639171234567', '+639171234567', {'v': PROFILE_SUMMARY_VERSION, 'balance': 115.0})
+
+        self.assertEqual(user.get('balance'), 115.0)
+        self.assertEqual(user.get('login_count'), 7)
+        self.assertIsNone(user.get('missing'))
+
+
+@override_settings(DEBUG=True, SESSION_RENEWAL_INTERVAL=15 * 60)
+class SessionRenewalTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = SessionPersistenceMiddleware(lambda request: HttpResponse('ok'))
+        SessionPersistenceMiddleware._pending_activity.clear()
+
+    def _request(self, session, user=None):
+        request = self.factory.get('/dashboard/')
+        request.session = session
+        request.user = user or AnonymousUser()
+        return request
+
+    def _saved_session(self, **data):
+        session = SessionStore()
+        session.update(data)
+        session.create()
+        return SessionStore(session.session_key)
+
+    def _assert_renewal_is_throttled(self, session, user=None):
+        self.middleware(self._request(session, user))
+        self.assertTrue(session.modified)
+        self.assertEqual(session.get_expiry_age(), settings.SESSION_COOKIE_AGE)
+        self.assertEqual(session['activity_count'], 1)
+        session.save()
+
+        session = SessionStore(session.session_key)
+        for _ in range(3):
+            self.middleware(self._request(session, user))
+        self.assertFalse(session.modified)
+
+        renewed_at = timezone.now() - timedelta(minutes=16)
+        session['session_renewed_at'] = renewed_at.isoformat()
+        self.middleware(self._request(session, user))
+        # The requests in between are folded into the renewal
+        self.assertEqual(session['activity_count'], 5)
+        self.assertGreater(session['session_renewed_at'], renewed_at.isoformat())
+
+    def test_django_login_sessions_are_renewed(self):
+        user = User.objects.create_user(username='09171234567', password='x')
+        self._assert_renewal_is_throttled(self._saved_session(), user)
+
+    def test_firebase_sessions_are_renewed(self):
+        session = self._saved_session(
+            firebase_authenticated=True, firebase_key='639171234567', user_phone='+639171234567',
+        )
+        self._assert_renewal_is_throttled(session)
+
+    def test_anonymous_sessions_are_left_alone(self):
+        session = self._saved_session()
+        self.middleware(self._request(session))
+        self.assertFalse(session.modified)
+
+
+class SessionLRUTests(TestCase):
+    def setUp(self):
+        session_lru.clear()
+        session = LRUSessionStore()
+        session.update({'firebase_authenticated': True, 'firebase_key': '639171234567'})
+        session.create()
+        self.key = session.session_key
+
+    def _authenticated(self):
+        return LRUSessionStore(self.key).get('firebase_authenticated', False)
+
+    def _age_entry(self, seconds):
+        data, expire_date, checked_at = session_lru.get(self.key)
+        session_lru.put(self.key, data, expire_date, checked_at - seconds)
+
+    def test_fresh_hits_do_not_query_the_database(self):
+        self.assertTrue(self._authenticated())
+        self.assertIsNotNone(session_lru.get(self.key))
+        with self.assertNumQueries(0):
+            self.assertTrue(self._authenticated())
+
+    def test_older_hits_check_the_row_version_once_per_window(self):
+        self._age_entry(60)
+        with self.assertNumQueries(1):
+            self.assertTrue(self._authenticated())
+        with self.assertNumQueries(0):
+            self.assertTrue(self._authenticated())
+
+    def test_delete_on_another_worker_is_seen_after_the_window(self):
+        self.assertTrue(self._authenticated())
+        # Another worker logs the session out: the row goes, this LRU keeps its entry
+        Session.objects.filter(session_key=self.key).delete()
+        self.assertTrue(self._authenticated())
+        self._age_entry(60)
+        self.assertFalse(self._authenticated())
+        self.assertIsNone(session_lru.get(self.key))
+
+    def test_flush_on_another_worker_is_seen_after_the_window(self):
+        self.assertTrue(self._authenticated())
+        entry = session_lru.get(self.key)
+        other_worker = LRUSessionStore(self.key)
+        other_worker.flush()
+        # The flush evicted the shared LRU here; this worker's own LRU would still hold it
+        session_lru.put(self.key, *entry)
+        self._age_entry(60)
+        self.assertFalse(self._authenticated())
+
+    def test_rewrite_on_another_worker_is_seen_after_the_window(self):
+        self.assertTrue(self._authenticated())
+        store = LRUSessionStore()
+        Session.objects.filter(session_key=self.key).update(
+            session_data=store.encode({'firebase_authenticated': False}),
+            expire_date=timezone.now() + timedelta(days=1),
+        )
+        self._age_entry(60)
+        self.assertFalse(self._authenticated())
+
+    def test_a_repeat_request_loads_its_session_without_queries(self):
+        view = lambda request: HttpResponse(request.session.get('firebase_key'))
+        handler = SessionMiddleware(SessionPersistenceMiddleware(view))
+
+        def request():
+            request = RequestFactory().get('/dashboard/')
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = self.key
+            request.user = AnonymousUser()
+            return handler(request)
+
+        # The first request renews the session
+        request()
+        with self.assertNumQueries(0):
+            self.assertEqual(request().content, b'639171234567')
+
+    def test_own_logout_is_seen_at_once(self):
+        self.assertTrue(self._authenticated())
+        LRUSessionStore(self.key).flush()
+        self.assertFalse(self._authenticated())
+
+
+@rate_limit('login')
+def _limited_login_view(request):
+    User.objects.filter(username=request.POST['phone']).exists()
+    return HttpResponse('ok')
+
+
+@override_settings(RATE_LIMITS={'login': {'ip': '3/minute', 'phone': '2/minute'}})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        cache.clear()
+
+    def _login(self, phone, ip='203.0.113.7'):
+        request = self.factory.post('/login/', {'phone': phone, 'password': 'x'}, REMOTE_ADDR=ip)
+        request.session = SessionStore()
+        return _limited_login_view(request)
+
+    def test_bucket_refills_over_time(self):
+        self.assertTrue(consume('t:ip:1', '2/minute', now=0)[0])
+        self.assertTrue(consume('t:ip:1', '2/minute', now=0)[0])
+        allowed, retry_after = consume('t:ip:1', '2/minute', now=1)
+        self.assertFalse(allowed)
+        self.assertEqual(retry_after, 29)
+        self.assertTrue(consume('t:ip:1', '2/minute', now=31)[0])
+
+    def test_phone_bucket_rejects_before_any_io(self):
+        # Same account in different formats shares one bucket
+        self.assertEqual(self._login('09171234567').status_code, 200)
+        self.assertEqual(self._login('+639171234567').status_code, 200)
+        with self.assertNumQueries(0):
+            response = self._login('639171234567', ip='203.0.113.8')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_ip_bucket_applies_across_phones(self):
+        for phone in ('09170000001', '09170000002', '09170000003'):
+            self.assertEqual(self._login(phone).status_code, 200)
+        self.assertEqual(self._login('09170000004').status_code, 429)
+
+    def test_client_ip_ignores_client_supplied_forwarded_for(self):
+        request = self.factory.get('/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='198.51.100.1, 203.0.113.7')
+        with override_settings(RATELIMIT_TRUSTED_PROXIES=0):
+            self.assertEqual(client_ip(request), '10.0.0.2')
+        with override_settings(RATELIMIT_TRUSTED_PROXIES=1):
+            self.assertEqual(client_ip(request), '203.0.113.7')
+        with override_settings(RATELIMIT_TRUSTED_PROXIES=2):
+            self.assertEqual(client_ip(request), '198.51.100.1')
+        with override_settings(RATELIMIT_TRUSTED_PROXIES=3):
+            self.assertEqual(client_ip(request), '198.51.100.1')
+
+    @override_settings(RATELIMIT_TRUSTED_PROXIES=1)
+    def test_spoofed_forwarded_for_does_not_get_a_new_bucket(self):
+        for n in range(4):
+            request = self.factory.post(
+                '/login/', {'phone': f'0917000000{n}', 'password': 'x'},
+                HTTP_X_FORWARDED_FOR=f'192.0.2.{n}, 203.0.113.7',
+            )
+            request.session = SessionStore()
+            status = _limited_login_view(request).status_code
+        self.assertEqual(status, 429)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_dummy_cache_falls_back_to_local_buckets(self):
+        self.assertTrue(consume('t:ip:local', '1/hour', now=0)[0])
+        self.assertFalse(consume('t:ip:local', '1/hour', now=1)[0])
+        self.assertIn('t:ip:local', local_buckets._states)
+
+
+class MiddlewareTimingTests(TestCase):
+    def _timing(self, down, up):
+        timing = _RequestTiming(len(down))
+        timing.down, timing.up = down, up
+        return timing
+
+    def test_phases_are_split_between_neighbouring_probes(self):
+        stats = TimingStats()
+        # (seconds, queries so far) at probes 0..2 around middlewares a and b
+        down = [(0.000, 0), (0.001, 0), (0.004, 2)]
+        up = [(0.020, 3), (0.019, 3), (0.014, 2)]
+        stats.record(['a', 'b'], self._timing(down, up))
+
+        rows = {(row['stage'], row['phase']): row for row in stats.summary()['stages']}
+        self.assertAlmostEqual(rows[('a', 'request')]['p95_ms'], 1.0)
+        self.assertAlmostEqual(rows[('b', 'request')]['p95_ms'], 3.0)
+        self.assertEqual(rows[('b', 'request')]['queries_avg'], 2)
+        self.assertAlmostEqual(rows[('b', 'response')]['p95_ms'], 5.0)
+        self.assertEqual(rows[('b', 'response')]['queries_avg'], 1)
+        self.assertAlmostEqual(rows[(VIEW_STAGE, 'request')]['p95_ms'], 10.0)
+
+    def test_short_circuiting_middleware_ends_the_chain(self):
+        stats = TimingStats()
+        down = [(0.000, 0), (0.001, 0), None]
+        up = [(0.003, 0), (0.002, 0), None]
+        stats.record(['a', 'b'], self._timing(down, up))
+
+        stages = {(row['stage'], row['phase']) for row in stats.summary()['stages']}
+        self.assertEqual(stages, {('a', 'request'), ('a', 'response'), ('b', 'request')})
+
+
+@override_settings(FIREBASE_FAKE=True, FIREBASE_QUEUE_AUTOSTART=False, PRESENCE_AUTOSTART=False)
+class LoginProfileCheckTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fake = get_fake_firebase()
+        self.fake.reset()
+        self.fake.configure()
+        self.factory = RequestFactory()
+        # A Django account whose profile went missing
+        self.user = User.objects.create_user(username='+639171234567', password='x')
+        UserProfile.objects.filter(user=self.user).delete()
+
+    def _post(self, view, path, data):
+        request = self.factory.post(path, data, REMOTE_ADDR='203.0.113.9')
+        request.session = SessionStore()
+        request.user = AnonymousUser()
+        request._messages = FallbackStorage(request)
+        return request, view(request)
+
+    def test_firebase_login_repairs_the_profile(self):
+        from .views import user_login
+        get_database_reference('users/639171234567').set({
+            'phone_number': '+639171234567', 'status': 'active',
+            'password': hashlib.sha256(b'secret').hexdigest(),
+        })
+        request, response = self._post(user_login, '/login/', {'phone': '09171234567', 'password': 'secret'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
+        self.assertEqual(request.session[PROFILE_CHECKED_SESSION_KEY], self.user.pk)
+
+    def test_registration_repairs_the_profile(self):
+        from .views import register
+        request, response = self._post(register, '/register/', {
+            'phone': '09171234567', 'password': 'secret', 'confirm_password': 'secret',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(get_database_reference('users/639171234567').get())
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
+        self.assertEqual(request.session[PROFILE_CHECKED_SESSION_KEY], self.user.pk)
+
+
+@override_settings(FIREBASE_FAKE=True, FIREBASE_QUEUE_AUTOSTART=False)
+class RegistrationReferralTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fake = get_fake_firebase()
+        self.fake.reset()
+        self.fake.configure()
+        self.referrer = User.objects.create_user(username='+639170000009', password='x')
+        UserProfile.objects.update_or_create(user=self.referrer, defaults={'referral_code': 'REF1'})
+        get_database_reference('users/639170000009').set({'phone_number': '+639170000009', 'balance': 10})
+
+    def test_extra_data_may_override_the_referral_code(self):
+        from .views import save_user_to_firebase_realtime_db
+        user = User.objects.create_user(username='+639170000001', password='x')
+        UserProfile.objects.update_or_create(user=user, defaults={'referral_code': 'PROF1'})
+        self.assertTrue(save_user_to_firebase_realtime_db(user, '+639170000001', {'referral_code': 'OWN1'}))
+        drain_firebase_queue()
+        self.assertEqual(get_database_reference('referral_codes/OWN1/user_id').get(), user.id)
+
+    def _register(self, phone):
+        from .views import register
+        request = RequestFactory().post('/register/', {
+            'phone': phone, 'password': 'secret', 'confirm_password': 'secret', 'referral_code': 'ref1',
+        }, REMOTE_ADDR='203.0.113.10')
+        request.session = SessionStore()
+        request.user = AnonymousUser()
+        request._messages = FallbackStorage(request)
+        return register(request)
+
+    def test_concurrent_sign_ups_all_credit_the_referrer(self):
+        # Neither sign-up reads the referrer, so the second cannot overwrite the first
+        self.assertEqual(self._register('09171112222').status_code, 302)
+        self.assertEqual(self._register('09171113333').status_code, 302)
+        referrer = get_database_reference('users/639170000009').get()
+        self.assertEqual((referrer['balance'], referrer['total_referrals'], referrer['referral_earnings']), (40.0, 2, 30.0))
+        self.assertEqual(get_database_reference('users/639171112222/referred_by_code').get(), 'REF1')
+
+    def test_user_and_referrer_bonus_are_written_together(self):
+        self.fake.fail_next(operation='rtdb.update')
+        self._register('09171112222')
+        self.assertIsNone(get_database_reference('users/639171112222').get())
+        self.assertEqual(get_database_reference('users/639170000009/balance').get(), 10)
+
+        self._register('09171112222')
+        self.assertEqual(self.fake.calls['rtdb.update'], 2)
+        self.assertEqual(get_database_reference('users/639170000009/balance').get(), 25.0)
+
+
+class NonBlockingQueueHandlerTests(SimpleTestCase):
+    def test_message_is_merged_before_the_record_is_queued(self):
+        stream = io.StringIO()
+        handler = NonBlockingQueueHandler(stream=stream)
+        handler.setFormatter(StructuredFormatter())
+        balances = [5]
+        record = logging.LogRecord('myproject.test', logging.INFO, __file__, 1, 'Balances %s', (balances,), None)
+        handler.handle(record)
+        # Changed by the caller before the listener thread gets to the record
+        balances.append(6)
+        handler.close()
+
+        self.assertEqual(json.loads(stream.getvalue())['msg'], 'Balances [5]')
+        # Other handlers still get the record as it was logged
+        self.assertEqual((record.msg, record.args), ('Balances %s', (balances,)))
+
+
+class UnreadNotificationCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='09171234567', password='x')
+
+    def _notify(self, **kwargs):
+        return Notification.objects.create(
+            user=self.user, title='Payout', message='Daily payout', notification_type='payout', **kwargs
+        )
+
+    def test_counter_follows_create_read_and_delete(self):
+        first = self._notify()
+        self._notify()
+        self._notify(is_read=True)
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 2)
+
+        mark_notification_read(first)
+        mark_notification_read(first)  # already read: no double decrement
+        self.assertEqual(unread_notification_count(self.user), 1)
+
+        self._notify().delete()
+        self.assertEqual(unread_notification_count(self.user), 1)
+
+        mark_all_notifications_read(self.user)
+        self.assertEqual(unread_notification_count(self.user), 0)
+
+    def test_cached_count_needs_no_query(self):
+        self._notify()
+        self.assertEqual(unread_notification_count(self.user), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_notification_count(self.user), 1)
+
+    def test_missing_counter_is_rebuilt_from_notifications(self):
+        self._notify()
+        NotificationCounter.objects.all().delete()
+        cache.clear()
+        self.assertEqual(unread_notification_count(self.user), 1)
+        self.assertTrue(NotificationCounter.objects.filter(user=self.user, unread=1).exists())
+
+
+def _invest(user, amount):
+    plan, _ = InvestmentPlan.objects.get_or_create(
+        name='Test plan', defaults={'minimum_amount': 100, 'maximum_amount': 99999999, 'daily_return_rate': 1},
+    )
+    investment = Investment.objects.create(
+        user=user, plan=plan, amount=Decimal(amount), daily_return=Decimal('1'),
+        end_date=timezone.now() + timedelta(days=20),
+    )
+    return enqueue_investment_commission(investment)
+
+
+def _referral_chain(*usernames):
+    """Create users each referred by the one before; return them in order."""
+    users = []
+    for username in usernames:
+        user = User.objects.create_user(username=username, password='x')
+        profile = UserProfile.objects.get_or_create(user=user)[0]
+        profile.referred_by = users[-1] if users else None
+        profile.save()
+        users.append(user)
+    return users
+
+
+class TeamGraphTests(SimpleTestCase):
+    def _totals(self, parents, amounts):
+        return [array.tolist() for array in compute_team_totals(parents, amounts)]
+
+    def test_totals_cover_every_level(self):
+        # 0 <- 1 <- 2, 0 <- 3; 4 is on its own; 5 names itself and 6 names no one known
+        sizes, volumes, direct = self._totals([-1, 0, 1, 0, -1, 5, 42], [1, 2, 4, 8, 16, 32, 64])
+        self.assertEqual(sizes, [3, 1, 0, 0, 0, 0, 0])
+        self.assertEqual(volumes, [14.0, 4.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+        self.assertEqual(direct, [2, 1, 0, 0, 0, 0, 0])
+        self.assertEqual(self._totals([], []), [[], [], []])
+
+    def test_a_cycle_loses_one_edge_from_the_walk_only(self):
+        # 0 -> 1 -> 2 -> 0 is a cycle; 3 hangs off 2 and 4 off 3
+        sizes, volumes, direct = self._totals([1, 2, 0, 2, 3], [1, 2, 4, 8, 16])
+        # The walk drops 0 -> 1, but 1 still counts 0 on its first level
+        self.assertEqual(sizes, [4, 1, 3, 1, 0])
+        self.assertEqual(volumes, [30.0, 1.0, 26.0, 16.0, 0.0])
+        self.assertEqual(direct, [1, 1, 2, 1, 0])
+
+    def test_index_parents(self):
+        self.assertEqual(index_parents([10, 30, 20], [None, 10, 20]).tolist(), [-1, 0, 2])
+        self.assertEqual(index_parents([10, 30, 20], [99, 5, 30]).tolist(), [-1, -1, 1])
+        self.assertEqual(index_parents([], [None, 7]).tolist(), [-1, -1])
+
+
+@override_settings(REFERRAL_COMMISSION_RATES=['5.00', '3.00', '1.00'], COMMISSION_JOBS_AUTOSTART=False)
+class CommissionTests(TestCase):
+    def setUp(self):
+        self.top, self.middle, self.referrer, self.investor = _referral_chain('top', 'middle', 'referrer', 'investor')
+
+    def _balance(self, user):
+        return UserProfile.objects.get(user=user).balance
+
+    def test_each_level_is_paid_its_rate(self):
+        _invest(self.investor, '1000.00')
+        _invest(self.investor, '500.00')
+        _invest(self.referrer, '200.00')
+        self.assertEqual(process_commission_batch(), 3)
+
+        self.assertEqual(self._balance(self.referrer), Decimal('75.00'))
+        self.assertEqual(self._balance(self.middle), Decimal('55.00'))
+        self.assertEqual(self._balance(self.top), Decimal('21.00'))
+        self.assertEqual(
+            sorted(ReferralCommission.objects.values_list('referrer__username', 'level', 'commission_amount')),
+            [
+                ('middle', 1, Decimal('10.00')), ('middle', 2, Decimal('15.00')), ('middle', 2, Decimal('30.00')),
+                ('referrer', 1, Decimal('25.00')), ('referrer', 1, Decimal('50.00')),
+                ('top', 2, Decimal('6.00')), ('top', 3, Decimal('5.00')), ('top', 3, Decimal('10.00')),
+            ],
+        )
+        references = Transaction.objects.filter(transaction_type='referral_bonus').values_list('reference_number', flat=True)
+        self.assertEqual(len(set(references)), 8)
+        self.assertEqual(set(CommissionJob.objects.values_list('status', 'attempts')), {('done', 1)})
+
+    def test_processed_jobs_are_not_paid_again(self):
+        _invest(self.investor, '1000.00')
+        self.assertEqual(process_commission_batch(), 1)
+        self.assertEqual(process_commission_batch(), 0)
+        # Queuing the same investment again reuses its finished job
+        _invest(self.investor, '1000.00').delete()
+        self.assertEqual(ReferralCommission.objects.count(), 3)
+        self.assertEqual(self._balance(self.referrer), Decimal('50.00'))
+
+    @override_settings(REFERRAL_COMMISSION_RATES=['200.00'])
+    def test_a_failed_batch_pays_nothing_and_counts_the_attempt(self):
+        # 200% of this overflows ReferralCommission.commission_amount
+        job = _invest(self.investor, '99999999.00')
+        self.assertEqual(process_commission_batch(), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('pending', 1))
+        self.assertTrue(job.last_error)
+        self.assertFalse(ReferralCommission.objects.exists())
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(self._balance(self.referrer), Decimal('0'))
+
+        CommissionJob.objects.filter(pk=job.pk).update(attempts=MAX_JOB_ATTEMPTS - 1)
+        process_commission_batch()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', MAX_JOB_ATTEMPTS))
+        self.assertEqual(process_commission_batch(), 0)
+
+    @override_settings(REFERRAL_COMMISSION_RATES=['200.00'])
+    def test_only_the_failing_job_is_charged_an_attempt(self):
+        healthy = _invest(self.referrer, '100.00')
+        poison = _invest(self.investor, '99999999.00')
+        self.assertEqual(process_commission_batch(), 1)
+        healthy.refresh_from_db()
+        poison.refresh_from_db()
+        self.assertEqual((healthy.status, healthy.attempts), ('done', 1))
+        self.assertEqual((poison.status, poison.attempts), ('pending', 1))
+        self.assertEqual(self._balance(self.middle), Decimal('200.00'))
+        self.assertEqual(self._balance(self.referrer), Decimal('0'))
+        self.assertEqual(ReferralCommission.objects.count(), 1)
+
+    def test_bulk_created_rows_have_no_save_receivers_to_skip(self):
+        # _pay_jobs bulk_creates these, which sends no post_save
+        for model in (ReferralCommission, Transaction):
+            self.assertFalse(pre_save.has_listeners(model))
+            self.assertFalse(post_save.has_listeners(model))
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+@override_settings(COMMISSION_JOBS_AUTOSTART=False, MEMBER_SUMMARY_AUTOSTART=False)
+class CommissionConcurrencyTests(TransactionTestCase):
+    def test_jobs_locked_by_another_worker_are_skipped(self):
+        _, investor = _referral_chain('referrer', 'investor')
+        locked_job = _invest(investor, '100.00')
+        _invest(investor, '200.00')
+        locked, release = threading.Event(), threading.Event()
+
+        def other_worker():
+            with transaction.atomic():
+                list(CommissionJob.objects.select_for_update().filter(pk=locked_job.pk))
+                locked.set()
+                release.wait(5)
+            connection.close()
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        locked.wait(5)
+        try:
+            self.assertEqual(process_commission_batch(), 1)
+        finally:
+            release.set()
+            thread.join()
+        locked_job.refresh_from_db()
+        self.assertEqual(locked_job.status, 'pending')
+
+
+class FirebaseMultiPathWriteTests(TestCase):
+    def _write(self, operation, path, payload, target='rtdb'):
+        return FirebaseWrite(target=target, operation=operation, path=path, payload=payload)
+
+    def test_multi_location_update_touches_each_path(self):
+        keys = write_keys('rtdb', 'update', '', {'users/1': {}, 'referral_codes/AB': {}})
+        self.assertEqual(keys, [('rtdb', 'users/1'), ('rtdb', 'referral_codes/AB')])
+        batch = {'ops': [{'op': 'update', 'path': 'users/1', 'data': {}}, {'op': 'add', 'path': 'login_events', 'data': {}}]}
+        self.assertEqual(
+            write_keys('firestore', 'batch', '', batch),
+            [('firestore', 'users/1'), ('firestore', 'login_events')],
+        )
+
+    def test_multi_location_update_is_not_overtaken(self):
+        calls = coalesce_writes([
+            self._write('update', 'users/1', {'last_activity': 'a'}),
+            self._write('update', '', {'users/1': {'balance': 1}, 'phone_index/9171234567': '1'}),
+            self._write('update', 'users/1', {'last_activity': 'b'}),
+        ])
+        # The last update must not fold into the first and jump ahead of the root update
+        self.assertEqual([call.path for call in calls], ['users/1', '', 'users/1'])
+
+    def test_unrelated_writes_still_coalesce_around_it(self):
+        calls = coalesce_writes([
+            self._write('update', 'users/2', {'last_activity': 'a'}),
+            self._write('update', '', {'users/1': {'balance': 1}}),
+            self._write('update', 'users/2', {'last_activity': 'b'}),
+        ])
+        self.assertEqual([call.path for call in calls], ['users/2', ''])
+        self.assertEqual(calls[0].payload, {'last_activity': 'b'})
+
+
+@override_settings(FIREBASE_FAKE=True, FIREBASE_QUEUE_AUTOSTART=False)
+class FirebaseQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fake = get_fake_firebase()
+        self.fake.reset()
+        self.fake.configure()
+
+    def test_enqueue_only_stores_a_row(self):
+        write = enqueue_rtdb_update('/users/1/', {'balance': 5})
+        self.assertEqual((write.path, write.status, write.attempts), ('users/1', 'pending', 0))
+        self.assertEqual(sum(self.fake.calls.values()), 0)
+        self.assertIsNone(get_database_reference('users/1').get())
+
+    def test_drain_coalesces_writes_to_a_node(self):
+        enqueue_rtdb_update('users/1', {'balance': 5, 'last_activity': SERVER_TIMESTAMP})
+        enqueue_rtdb_update('users/1', {'balance': 6})
+        enqueue_rtdb_set('users/2', {'balance': 1})
+        self.assertEqual(drain_firebase_queue(), 3)
+        self.assertEqual(self.fake.calls['rtdb.update'], 1)
+        record = get_database_reference('users/1').get()
+        self.assertEqual(record['balance'], 6)
+        self.assertIsInstance(record['last_activity'], int)
+        self.assertEqual(get_database_reference('users/2').get(), {'balance': 1})
+        self.assertFalse(FirebaseWrite.objects.exists())
+        self.assertEqual(drain_firebase_queue(), 0)
+
+    def test_failed_write_is_retried_and_holds_back_its_path(self):
+        self.fake.fail_next(operation='rtdb.update')
+        enqueue_rtdb_update('users/1', {'balance': 5})
+        enqueue_rtdb_update('users/1/stats', {'logins': 1})
+        enqueue_rtdb_update('users/2', {'balance': 1})
+        self.assertEqual(drain_firebase_queue(), 3)
+        # users/2 went through; both users/1 writes wait for the retry, in order
+        self.assertEqual(get_database_reference('users/2').get(), {'balance': 1})
+        failed, held = FirebaseWrite.objects.order_by('id')
+        self.assertEqual((failed.status, failed.attempts), ('pending', 1))
+        self.assertIn('Injected failure', failed.last_error)
+        self.assertGreater(failed.next_attempt_at, timezone.now())
+        self.assertEqual((held.status, held.attempts), ('pending', 0))
+
+        enqueue_rtdb_update('users/1', {'balance': 7})
+        self.assertEqual(drain_firebase_queue(), 0)
+        FirebaseWrite.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(drain_firebase_queue(), 3)
+        self.assertEqual(get_database_reference('users/1').get(), {'balance': 7, 'stats': {'logins': 1}})
+        self.assertFalse(FirebaseWrite.objects.exists())
+
+    def test_write_is_kept_as_failed_after_the_last_attempt(self):
+        write = enqueue_rtdb_update('users/1', {'balance': 5})
+        FirebaseWrite.objects.filter(pk=write.pk).update(attempts=MAX_WRITE_ATTEMPTS - 1)
+        self.fake.fail_next(operation='rtdb.update')
+        drain_firebase_queue()
+        write.refresh_from_db()
+        self.assertEqual((write.status, write.attempts), ('failed', MAX_WRITE_ATTEMPTS))
+        self.assertIsNotNone(write.processed_at)
+        self.assertEqual(drain_firebase_queue(), 0)
+
+    def test_update_of_a_missing_document_fails_at_once(self):
+        get_firestore_client().document('profiles/1').set({'referral_code': 'A'})
+        missing = enqueue_firestore_update('profiles/2', {'referral_code': 'B'})
+        enqueue_firestore_update('profiles/1', {'referral_code': 'C'})
+        self.assertEqual(drain_firebase_queue(), 2)
+        missing.refresh_from_db()
+        self.assertEqual((missing.status, missing.attempts), ('failed', 1))
+        self.assertIsNotNone(missing.processed_at)
+        self.assertEqual(get_firestore_client().document('profiles/1').get().to_dict(), {'referral_code': 'C'})
+        self.assertEqual(drain_firebase_queue(), 0)
+
+    def test_in_flight_writes_are_not_claimed_twice(self):
+        write = enqueue_rtdb_update('users/1', {'balance': 5})
+        # Another worker has claimed the row and is still writing it
+        FirebaseWrite.objects.filter(pk=write.pk).update(
+            status='in_flight', next_attempt_at=timezone.now() + timedelta(minutes=5),
+        )
+        enqueue_rtdb_update('users/1', {'balance': 6})
+        self.assertEqual(drain_firebase_queue(), 0)
+        # The claim expired: that worker died mid-call
+        FirebaseWrite.objects.filter(pk=write.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(drain_firebase_queue(), 2)
+        self.assertEqual(get_database_reference('users/1/balance').get(), 6)
+
+
+@override_settings(FIREBASE_FAKE=True)
+class FirebaseClientRegistryTests(TestCase):
+    def setUp(self):
+        firebase_clients.reset()
+
+    def test_handles_are_created_once_and_reused(self):
+        self.assertIs(get_firestore_client(), get_firestore_client())
+        get_database_reference('/').child('users/1').set({'balance': 1})
+        self.assertEqual(get_database_reference('/users/1/').get(), {'balance': 1})
+        self.assertEqual(get_database_reference('users/1').path, '/users/1')
+
+        stats = firebase_clients.stats()
+        self.assertEqual(stats['firestore'], {'created': 1, 'handed_out': 2, 'reused': 1})
+        self.assertEqual(stats['rtdb'], {'created': 1, 'handed_out': 3, 'reused': 2})
+
+
+@override_settings(FIREBASE_FAKE=True)
+class FanOutTests(TestCase):
+    def setUp(self):
+        self.fake = get_fake_firebase()
+        self.fake.reset()
+        self.fake.configure(latency_ms=100)
+
+    def test_reads_overlap(self):
+        start = time.perf_counter()
+        results = fan_out({
+            'profile': lambda: get_firestore_client().document('profiles/1').get().exists,
+            'team': lambda: get_firestore_client().document('teams/1').get().exists,
+            'members': lambda: get_database_reference('referrals/CODE').get(),
+        })
+        self.assertLess(time.perf_counter() - start, 0.25)
+        self.assertEqual((results.get('profile'), results.get('team'), results.get('members')), (False, False, None))
+
+    def test_failures_and_deadline_are_per_call(self):
+        self.fake.fail_next(operation='rtdb.get')
+        results = fan_out({
+            'members': lambda: get_database_reference('referrals/CODE').get(),
+            'slow': lambda: time.sleep(0.5),
+            'profile': lambda: get_firestore_client().document('profiles/1').get().exists,
+        }, timeout=0.3)
+        with self.assertRaises(FakeFirebaseError):
+            results.get('members')
+        with self.assertRaises(FanOutTimeout):
+            results.get('slow')
+        self.assertFalse(results.get('profile'))
+
+
+@override_settings(FIREBASE_FAKE=True)
+class FakeFirebaseTests(TestCase):
+    def setUp(self):
+        self.fake = get_fake_firebase()
+        self.fake.reset()
+        self.fake.configure()
+
+    def test_multi_location_update_and_queries(self):
+        root = get_database_reference('/')
+        root.update({
+            'users/1': {'phone_number': '1', 'balance': 30},
+            'users/2': {'phone_number': '2', 'balance': 10},
+            'users/3': {'phone_number': '3', 'balance': 20},
+        })
+        users = root.child('users')
+        self.assertEqual(users.child('2').get(), {'phone_number': '2', 'balance': 10})
+        self.assertEqual(list(users.order_by_child('balance').limit_to_first(2).get()), ['2', '3'])
+        self.assertEqual(list(users.order_by_child('balance').equal_to(30).get()), ['1'])
+        self.assertEqual(list(users.order_by_key().start_at('2').get()), ['2', '3'])
+        self.assertEqual(users.get(shallow=True), {'1': True, '2': True, '3': True})
+
+        users.child('1').update({'balance': None})
+        self.assertEqual(users.child('1').get(), {'phone_number': '1'})
+        users.child('1').delete()
+        self.assertIsNone(users.child('1').get())
+
+    def test_push_keys_sort_in_insertion_order(self):
+        events = get_database_reference('events')
+        keys = [events.push({'n': n}).key for n in range(5)]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual([event['n'] for event in events.get().values()], [0, 1, 2, 3, 4])
+
+    def test_firestore_documents_queries_and_batches(self):
+        client = get_firestore_client()
+        client.collection('profiles').document('a').set({'referral_code': 'X', 'rank': 2})
+        client.collection('profiles').document('b').set({'referral_code': 'X', 'rank': 1})
+        client.collection('profiles').document('c').set({'referral_code': 'Y', 'rank': 3})
+
+        matches = client.collection('profiles').where('referral_code', '==', 'X').order_by('rank').get()
+        self.assertEqual([doc.id for doc in matches], ['b', 'a'])
+        self.assertEqual(len(client.collection('profiles').limit(1).get()), 1)
+
+        batch = client.batch()
+        batch.update(client.document('profiles/a'), {'stats.logins': 1})
+        batch.set(client.collection('login_events').document(), {'user': 'a'})
+        batch.commit()
+        self.assertEqual(client.document('profiles/a').get().get('stats.logins'), 1)
+        self.assertEqual(len(list(client.collection('login_events').stream())), 1)
+        self.assertFalse(client.document('profiles/missing').get().exists)
+
+    def test_failure_injection(self):
+        root = get_database_reference('/')
+        self.fake.fail_next(operation='rtdb.set')
+        root.child('x').get()
+        with self.assertRaises(FakeFirebaseError):
+            root.child('x').set(1)
+        root.child('x').set(2)
+        self.assertEqual(root.child('x').get(), 2)
+
+        self.fake.configure(failure_rate=1.0)
+        with self.assertRaises(FakeFirebaseError):
+            root.child('x').get()
+
+    def test_queued_writes_apply_to_fake(self):
+        apply_write(FirebaseWrite(target='rtdb', operation='update', path='users/1', payload={
+            'last_activity': SERVER_TIMESTAMP,
+        }))
+        self.assertIsInstance(get_database_reference('users/1').get()['last_activity'], int)
+
+        get_firestore_client().document('users/1').set({'name': 'a'})
+        apply_write(FirebaseWrite(target='firestore', operation='batch', path='', payload={'ops': [
+            {'op': 'update', 'path': 'users/1', 'data': {'last_login': SERVER_TIMESTAMP}},
+            {'op': 'add', 'path': 'login_events', 'data': {'user': '1'}},
+        ]}))
+        self.assertIn('last_login', get_firestore_client().document('users/1').get().to_dict())
+        self.assertEqual(self.fake.calls['firestore.commit'], 1)
+
+
+@override_settings(FIREBASE_FAKE=True, FIREBASE_QUEUE_AUTOSTART=False)
+class ReadThroughCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fake = get_fake_firebase()
+        self.fake.reset()
+        self.fake.configure()
+        get_database_reference('users/1').set({'balance': 5, 'password': 'hash'})
+
+    def test_repeated_reads_hit_the_cache(self):
+        self.assertEqual(user_records.get('1'), {'balance': 5})
+        self.assertEqual(user_records.get('1'), {'balance': 5})
+        self.assertEqual(self.fake.calls['rtdb.get'], 1)
+
+    def test_concurrent_misses_share_one_read(self):
+        self.fake.configure(latency_ms=50)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(user_records.get('1'))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [{'balance': 5}] * 5)
+        self.assertEqual(self.fake.calls['rtdb.get'], 1)
+
+    def test_queued_writes_invalidate_what_they_touch(self):
+        user_records.get('1')
+        get_firestore_client().document('profiles/1').set({'referral_code': 'A'})
+        firestore_documents.get('profiles/1')
+
+        enqueue_rtdb_update('users/1', {'balance': 6})
+        enqueue_firestore_update('profiles/1', {'referral_code': 'B'})
+        self.assertIsNone(cache.get('firebase_user_record:1'))
+        self.assertIsNone(cache.get('firestore_document:profiles/1'))
+
+    def test_missing_documents_are_cached_too(self):
+        self.assertIsNone(firestore_documents.get('users/none'))
+        self.assertIsNone(firestore_documents.get('users/none'))
+        self.assertEqual(self.fake.calls['firestore.get'], 1)
+
+
+@override_settings(FIREBASE_FAKE=True, FIREBASE_QUEUE_AUTOSTART=False, MEMBER_SUMMARY_AUTOSTART=False)
+class TeamListingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fake = get_fake_firebase()
+        flush_member_summaries()
+        self.fake.reset()
+        self.fake.configure()
+        self.factory = RequestFactory()
+        get_firestore_client().document('profiles/639170000000').set({'referral_code': 'TEAM1'})
+        get_database_reference('referrals/TEAM1').set({
+            f'63917000000{i}': {
+                'phone_number': f'+63917000000{i}', 'date_joined': f'2024-01-0{i}',
+                'total_invested': i * 100, 'balance': 0, 'is_active': True,
+            }
+            for i in range(1, 4)
+        })
+
+    def _page(self, cursor=None, sort='joined'):
+        from .views import team_members_api
+        params = {'sort': sort, 'page_size': 2}
+        if cursor:
+            params['cursor'] = cursor
+        request = self.factory.get('/api/team-members/', params)
+        request.session = SessionStore()
+        request.session.update({
+            'firebase_authenticated': True, 'is_authenticated': True,
+            'firebase_key': '639170000000', 'user_phone': '+639170000000',
+        })
+        request.user = AnonymousUser()
+        return json.loads(team_members_api(request).content)
+
+    def _all_pages(self, sort):
+        uids, cursor = [], None
+        while True:
+            page = self._page(cursor, sort)
+            uids += [member['uid'] for member in page['members']]
+            if not page['has_next']:
+                return uids
+            cursor = page['next_cursor']
+
+    def test_each_page_is_one_limited_query(self):
+        first = self._page()
+        calls = dict(self.fake.calls)
+        second = self._page(first['next_cursor'])
+        # One query for the page and nothing that reads the whole team
+        self.assertEqual(self.fake.calls['rtdb.query'], calls['rtdb.query'] + 1)
+        self.assertEqual(self.fake.calls.get('rtdb.get', 0), calls.get('rtdb.get', 0))
+        self.assertEqual((first['has_next'], second['has_next'], second['next_cursor']), (True, False, None))
+        self.assertEqual(
+            [member['uid'] for member in first['members'] + second['members']],
+            ['639170000003', '639170000002', '639170000001'],
+        )
+
+    def test_members_with_the_same_sort_value_are_paged_once(self):
+        get_database_reference('referrals/TEAM1').update({
+            f'63917000001{i}': {'phone_number': f'+63917000001{i}', 'date_joined': '2024-02-01', 'is_active': i % 2 == 0}
+            for i in range(5)
+        })
+        self.assertEqual(self._all_pages('active'), [
+            '639170000014', '639170000012', '639170000010', '639170000003', '639170000002', '639170000001',
+            '639170000013', '639170000011',
+        ])
+        self.assertEqual(self._all_pages('joined'), [
+            '639170000014', '639170000013', '639170000012', '639170000011', '639170000010',
+            '639170000003', '639170000002', '639170000001',
+        ])
+
+    def test_malformed_cursors_are_rejected(self):
+        self.assertEqual(self._page('not-a-cursor'), {'success': False, 'error': 'Invalid page'})
+
+    def test_team_view_stats_reach_the_cached_user_record(self):
+        from .views import team
+        get_database_reference('users/639170000000').set({'balance': 0})
+        self.assertEqual(user_records.get('639170000000'), {'balance': 0})
+
+        request = self.factory.get('/team/')
+        request.session = SessionStore()
+        request.session.update({
+            'firebase_authenticated': True, 'is_authenticated': True,
+            'firebase_key': '639170000000', 'user_phone': '+639170000000',
+        })
+        request.user = AnonymousUser()
+        self.assertEqual(team(request).status_code, 200)
+        record = user_records.get('639170000000')
+        self.assertEqual((record['total_referrals'], record['balance']), (3, 145.0))
+
+    def test_team_header_uses_the_precomputed_stats(self):
+        from .team_listing import team_header
+        record = {
+            'team_stats_updated_at': '2024-03-01T00:00:00', 'team_size': 12, 'direct_referrals': 3,
+            'active_referrals': 2, 'team_volume': 4500.5,
+        }
+        calls = dict(self.fake.calls)
+        self.assertEqual(team_header(record, 'TEAM1'), {
+            'team_size': 12, 'direct_referrals': 3, 'active_referrals': 2, 'team_volume': 4500.5,
+        })
+        self.assertEqual(dict(self.fake.calls), calls)
+        # Until recompute_team_stats has run, the direct team is summed
+        self.assertEqual(team_header({}, 'TEAM1'), {
+            'team_size': 3, 'direct_referrals': 3, 'active_referrals': 3, 'team_volume': 600.0,
+        })
+
+    def test_queued_summary_write_refreshes_the_cached_team(self):
+        from .team_listing import load_team_members
+        self.assertEqual(len(load_team_members('TEAM1')), 3)
+        enqueue_rtdb_update('referrals/TEAM1/639170000004', {
+            'phone_number': '+639170000004', 'date_joined': '2024-01-04', 'is_active': False,
+        })
+        drain_firebase_queue()
+        self.assertEqual(len(load_team_members('TEAM1')), 4)
+
+    def test_saves_of_other_fields_do_not_queue_a_refresh(self):
+        user = User.objects.create_user(username='+639170000002', password='x')
+        UserProfile.objects.create(user=user, phone_number='+639170000002')
+        profile = UserProfile.objects.get(user=user)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            profile.is_verified = True
+            profile.save(update_fields=['is_verified'])
+            profile.address = 'Cebu'
+            profile.save()
+        self.assertEqual(callbacks, [])
+
+    def test_ledger_changes_refresh_the_member_summary(self):
+        user = User.objects.create_user(username='+639170000001', password='x')
+        profile = UserProfile.objects.create(user=user, phone_number='+639170000001')
+        get_database_reference('users/639170000001').set({'referred_by_code': 'TEAM1', 'total_invested': 100})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.address = 'Manila'
+            profile.save()
+        self.assertEqual(flush_member_summaries(), 0)
+
+        profile = UserProfile.objects.get(pk=profile.pk)
+        calls = dict(self.fake.calls)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.balance = Decimal('250.00')
+            profile.total_invested = Decimal('50.00')
+            profile.save()
+        # The commit only remembers the user; Firebase is read by the refresh thread
+        self.assertEqual(dict(self.fake.calls), calls)
+        self.assertEqual(flush_member_summaries(), 1)
+        drain_firebase_queue()
+        summary = get_database_reference('referrals/TEAM1/639170000001').get()
+        self.assertEqual(
+            (summary['balance'], summary['total_invested'], summary['is_active'], summary['phone_number']),
+            (250.0, 100.0, True, '+639170000001'),
+        )
+
+
+@override_settings(FIREBASE_FAKE=True, FIREBASE_QUEUE_AUTOSTART=False, PRESENCE_AUTOSTART=False)
+class PresenceTests(TestCase):
+    def setUp(self):
+        presence_buffer.take(offline_after=-1)
+        self.fake = get_fake_firebase()
+        self.fake.reset()
+        self.fake.configure()
+
+    def _queued(self):
+        return list(FirebaseWrite.objects.order_by('id').values_list('target', 'operation', 'path', 'payload'))
+
+    def test_page_views_coalesce_into_one_batch(self):
+        for page in range(50):
+            record_activity('1', rtdb={'is_online': True, 'current_page': f'/p{page}/'})
+            record_activity('2', firestore={'last_login': SERVER_TIMESTAMP})
+        record_activity('1', increments={'login_count': 1})
+        record_activity('1', increments={'login_count': 1})
+
+        self.assertEqual(flush_presence(), 2)
+        rtdb, firestore = self._queued()
+        self.assertEqual(rtdb[:3], ('rtdb', 'update', ''))
+        self.assertEqual(rtdb[3], {
+            'users/1/is_online': True,
+            'users/1/current_page': '/p49/',
+            'users/1/login_count': {'.sv': {'increment': 2}},
+        })
+        self.assertEqual(firestore[3]['ops'], [{'op': 'merge', 'path': 'users/2', 'data': {'last_login': SERVER_TIMESTAMP}}])
+        self.assertEqual(flush_presence(), 0)
+
+    def test_batches_are_bounded(self):
+        for key in range(5):
+            record_activity(str(key), rtdb={'is_online': True})
+        flush_presence(batch_size=2)
+        self.assertEqual(FirebaseWrite.objects.count(), 3)
+
+    def test_idle_users_go_offline(self):
+        record_activity('1', rtdb={'is_online': True})
+        flush_presence(now=time.time())
+        FirebaseWrite.objects.all().delete()
+
+        self.assertEqual(flush_presence(now=time.time() + 3600), 1)
+        self.assertEqual(self._queued()[0][3], {'users/1/is_online': False})
+
+    def test_increments_apply_on_the_server(self):
+        get_database_reference('users/1').set({'login_count': 3})
+        record_activity('1', increments={'login_count': 2})
+        flush_presence()
+        for write in FirebaseWrite.objects.all():
+            apply_write(coalesce_writes([write])[0])
+        self.assertEqual(get_database_reference('users/1/login_count').get(), 5)
+
+
+@override_settings(FIREBASE_FAKE=True)
+class FirebaseSyncTests(TestCase):
+    def setUp(self):
+        self.fake = get_fake_firebase()
+        self.fake.reset()
+        self.fake.configure()
+
+    def _rtdb_user(self, key, updated_at, **fields):
+        record = {'username': f'+{key}', 'phone_number': f'+{key}', 'updated_at': updated_at}
+        record.update(fields)
+        get_database_reference(f'users/{key}').set(record)
+
+    def test_only_changes_since_the_checkpoint_are_read(self):
+        for n in range(5):
+            self._rtdb_user(f'63900000000{n}', f'2026-01-01T00:00:0{n}+00:00', balance=10 * n, referral_code=f'CODE{n}')
+        self.assertEqual(sync_source('rtdb', batch_size=2), 5)
+        self.assertEqual(User.objects.filter(username__startswith='+63900').count(), 5)
+        profile = UserProfile.objects.get(user__username='+639000000003')
+        self.assertEqual((profile.balance, profile.referral_code), (30, 'CODE3'))
+        self.assertFalse(profile.user.has_usable_password())
+
+        checkpoint = FirebaseSyncCheckpoint.objects.get(source='rtdb')
+        self.assertEqual((checkpoint.last_key, checkpoint.records_synced), ('639000000004', 5))
+        self.assertEqual(sync_source('rtdb'), 0)
+
+        self._rtdb_user('639000000001', '2026-01-02T00:00:00+00:00', email='a@example.com', balance=999)
+        self.assertEqual(sync_source('rtdb'), 1)
+        user = User.objects.get(username='+639000000001')
+        self.assertEqual(user.email, 'a@example.com')
+        # Django's ledger owns the balance of an existing user
+        self.assertEqual(user.userprofile.balance, 10)
+
+    def test_records_sharing_a_timestamp_are_not_skipped(self):
+        for n in range(5):
+            self._rtdb_user(f'63911111111{n}', '2026-01-01T00:00:00+00:00')
+        self.assertEqual(sync_source('rtdb', batch_size=2), 5)
+        self.assertEqual(User.objects.filter(username__startswith='+63911').count(), 5)
+
+    @override_settings(FIREBASE_SYNC_SETTLE_SECONDS=0, FIREBASE_QUEUE_AUTOSTART=False)
+    def test_queued_writes_are_stamped_when_applied(self):
+        enqueue_rtdb_update('users/639444444441', {'username': '+639444444441', 'updated_at': APPLIED_AT})
+        # A record changed after the write was queued is synced before it is sent
+        self._rtdb_user('639444444440', timezone.now().isoformat())
+        self.assertEqual(sync_source('rtdb'), 1)
+
+        drain_firebase_queue()
+        stamped = get_database_reference('users/639444444441/updated_at').get()
+        self.assertGreater(stamped, FirebaseSyncCheckpoint.objects.get(source='rtdb').position)
+        self.assertEqual(sync_source('rtdb'), 1)
+        self.assertTrue(User.objects.filter(username='+639444444441').exists())
+
+    def test_records_are_read_once_they_settle(self):
+        self._rtdb_user('639555555550', timezone.now().isoformat())
+        self.assertEqual(sync_source('rtdb'), 0)
+        with override_settings(FIREBASE_SYNC_SETTLE_SECONDS=0):
+            self.assertEqual(sync_source('rtdb'), 1)
+
+    def test_firestore_changes_and_reset(self):
+        users = get_firestore_client().collection('users')
+        users.document('639222222220').set({'username': '+639222222220', 'updated_at': firestore.SERVER_TIMESTAMP})
+        users.document('639222222221').set({'username': '+639222222221', 'updated_at': firestore.SERVER_TIMESTAMP})
+        users.document('639222222222').set({'username': '+639222222222', 'updated_at': 'not a timestamp'})
+        self.assertEqual(sync_firebase_changes(['firestore']), {'firestore': 2})
+        self.assertEqual(sync_firebase_changes(['firestore']), {'firestore': 0})
+        reset_checkpoints(['firestore'])
+        self.assertEqual(sync_firebase_changes(['firestore']), {'firestore': 2})
+        self.assertEqual(User.objects.filter(username__startswith='+63922').count(), 2)
+
+    def test_a_failing_source_does_not_stop_the_other(self):
+        self._rtdb_user('639333333330', '2026-01-01T00:00:00+00:00')
+        self.fake.fail_next(operation='firestore.query')
+        self.assertEqual(sync_firebase_changes(), {'rtdb': 1, 'firestore': None})
+        self.assertFalse(FirebaseSyncCheckpoint.objects.get(source='firestore').position)
+
+
+@override_settings(FIREBASE_FAKE=True)
+class FirebaseMirrorTests(TestCase):
+    def setUp(self):
+        self.fake = get_fake_firebase()
+        self.fake.reset()
+        self.fake.configure()
+        self.mirror = UserMirror()
+        self.mirror.handle_event('put', '/', {
+            'a': {'username': 'ann', 'phone_number': '+1', 'balance': 12.5, 'referral_code': 'ANN1',
+                  'date_joined': '2026-01-01T00:00:00+00:00', 'transactions': {'t1': {'amount': 5}}},
+            'b': {'phone_number': '+2', 'balance': 'oops', 'referred_by_code': 'ANN1'},
+        })
+
+    def test_full_load_marks_the_mirror_ready(self):
+        self.assertFalse(mirror_is_fresh())
+        self.assertEqual(self.mirror.flush(), 2)
+        self.assertTrue(mirror_is_fresh())
+        ann = FirebaseProfile.objects.get(pk='a')
+        self.assertEqual((ann.display_name, ann.balance, ann.referral_code), ('ann', Decimal('12.50'), 'ANN1'))
+        self.assertEqual(ann.date_joined.year, 2026)
+        self.assertEqual(FirebaseProfile.objects.get(pk='b').balance, 0)
+        self.assertEqual(FirebaseProfile.objects.filter(referred_by_code='ANN1').count(), 1)
+
+        mark_mirror_stale()
+        self.assertFalse(mirror_is_fresh())
+
+    def test_changes_are_applied_in_bulk(self):
+        self.mirror.flush()
+        get_database_reference('users/c').set({'phone_number': '+3', 'username': 'cat'})
+        self.mirror.handle_event('put', '/a/balance', 40)
+        self.mirror.handle_event('patch', '/b', {'username': 'bob', 'last_seen': 'now'})
+        self.mirror.handle_event('put', '/a/transactions/t2', {'amount': 1})
+        self.mirror.handle_event('put', '/c/username', 'cat')
+        self.mirror.handle_event('put', '/d', {'phone_number': '+4'})
+        self.assertEqual(self.mirror.flush(), 4)
+        self.assertEqual(FirebaseProfile.objects.get(pk='a').balance, 40)
+        self.assertEqual(FirebaseProfile.objects.get(pk='b').display_name, 'bob')
+        # A field change for an unknown user reads the whole record once
+        self.assertEqual(FirebaseProfile.objects.get(pk='c').phone_number, '+3')
+
+        self.mirror.handle_event('put', '/d', None)
+        self.mirror.handle_event('put', '/', {'a': {'phone_number': '+1'}})
+        self.mirror.flush()
+        self.assertEqual(list(FirebaseProfile.objects.values_list('pk', flat=True)), ['a'])
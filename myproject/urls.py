@@ -57,6 +57,7 @@ urlpatterns = [
     path('api/payment-status/<str:reference_id>/', views.payment_status_api, name='payment_status_api'),
     path('api/la2568/callback/', views.la2568_callback, name='la2568_callback'),
     path('api/gcash/webhook/', views.gcash_webhook, name='gcash_webhook'),
+    path('api/team-members/', views.team_members_api, name='team_members_api'),
     path('api/recent-activities/', views.recent_activities_api, name='recent_activities_api'),
     path('api/recent-investments/', views.recent_investments_api, name='recent_investments_api'),
     path('api/live-transactions/', views.public_live_transactions_api, name='public_live_transactions'),
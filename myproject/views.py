@@ -1,9 +1,11 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout
+from django.contrib.auth.models import AnonymousUser
 from django.contrib import messages 
 from django.http import JsonResponse
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.db.models import Sum, Q, F, Count
 from django.views.decorators.http import require_GET  # Added for deposits_withdrawals_api
 from decimal import Decimal
@@ -20,40 +22,41 @@ from typing import Optional
 import firebase_admin
 from firebase_admin import credentials
 
-# Import Firebase helpers
-try:
-    from . import firebase  # Import our firebase.py helper module
-except ImportError as e:
-    print(f"Firebase helper module not available: {e}")
-    firebase = None
+from .commissions import enqueue_investment_commission
+from .firebase_cache import firestore_documents, invalidate_paths, user_records
+from .firebase_fanout import fan_out
+from .firebase_index import (
+    find_referral_code, find_user_key_by_phone, referral_code_exists,
+    user_index_updates,
+)
+from .firebase_queue import (
+    APPLIED_AT, SERVER_TIMESTAMP, enqueue_firestore_batch, enqueue_firestore_set, enqueue_firestore_update,
+    enqueue_rtdb_multi_update, enqueue_rtdb_update,
+)
+from .firebase_user import (
+    LEGACY_SESSION_USER_DATA, SESSION_PROFILE, FirebaseUser, resolve_django_user, session_profile,
+    start_firebase_session,
+)
+from .notifications import mark_all_notifications_read, mark_notification_read, unread_notification_count
+from .phone_utils import firebase_key_for_phone
+from .presence import record_activity
+from .ratelimit import rate_limit
+from .signals import check_profile_at_login
+from .structured_logging import log_event
+from .team_listing import (
+    DEFAULT_TEAM_SORT, TEAM_PAGE_SIZE, TEAM_SORTS, team_header, team_page,
+)
 
 # Set up logging    
 logger = logging.getLogger(__name__)
 
-# Safe Firebase imports
-try:
-    import firebase_admin
-    from firebase_admin import credentials, auth as firebase_auth, db as firebase_db, firestore
-    from .firebase_app import get_firebase_app  
-    # Test if Firebase is actually working by trying to get the app
-    try:
-        test_app = get_firebase_app()
-        # Check if we got a dummy app (indicates Firebase is unavailable)
-        if hasattr(test_app, 'project_id') and test_app.project_id == "firebase-unavailable":
-            FIREBASE_AVAILABLE = False
-            print("❌ Firebase unavailable - dummy app detected")
-        else:
-            FIREBASE_AVAILABLE = True
-            print("✅ Firebase connection test successful")
-    except Exception as firebase_test_error:
-        print(f"❌ Firebase connection test failed: {firebase_test_error}")
-        print("⚠️ Firebase disabled - registration will continue without Firebase")
-        FIREBASE_AVAILABLE = False
-except ImportError as e:
-    print(f"Firebase not available: {e}")
-    FIREBASE_AVAILABLE = False
-
-print(f"🔥 Firebase Status: {'✅ Available' if FIREBASE_AVAILABLE else '❌ Unavailable'}")
+# Firebase is initialized on first use; firebase_available() is the cached probe
+from firebase_admin import auth as firebase_auth, db as firebase_db, firestore
+from .firebase_app import (
+    RTDB_SERVER_TIMESTAMP, firebase_available, get_database_reference, get_firebase_app, get_firestore_client,
+    rtdb_increment,
+)
+
 
 def firebase_login_required(view_func):
     """🔥 PURE FIREBASE DECORATOR - Session-based authentication (no token verification)"""
@@ -66,74 +69,24 @@ def firebase_login_required(view_func):
         is_authenticated = request.session.get('is_authenticated', False)
         firebase_key = request.session.get('firebase_key')
         
-        print(f"🔍 Auth check - firebase_authenticated: {firebase_authenticated}")
-        print(f"🔍 Auth check - is_authenticated: {is_authenticated}")
-        print(f"🔍 Auth check - firebase_key: {firebase_key}")
-        
         if firebase_authenticated and is_authenticated and firebase_key:
-            # Create a pure Firebase user object
-            class FirebaseUser:
-                def __init__(self, firebase_key, user_phone, user_data):
-                    self.uid = firebase_key
-                    self.firebase_key = firebase_key
-                    self.phone_number = user_phone
-                    self.username = user_phone
-                    self.email = user_data.get('email', '')
-                    self.display_name = user_data.get('display_name', '')
-                    self.is_authenticated = True
-                    self.firebase_data = user_data
-                    self.is_firebase_user = True
-                    
-                def __str__(self):
-                    return self.username or self.uid
-                    
-                def get_username(self):
-                    return self.username or self.uid
-            
             # Get session data
             user_phone = request.session.get('user_phone', '')
-            firebase_user_data = request.session.get('firebase_user_data', {})
             
             # Add Firebase user to request
-            request.firebase_user = FirebaseUser(firebase_key, user_phone, firebase_user_data)
+            request.firebase_user = FirebaseUser(firebase_key, user_phone, session_profile(request.session))
             
-            # Try to find corresponding Django user for compatibility
-            try:
-                from django.contrib.auth.models import User
-                
-                if user_phone:
-                    # Try different phone number formats
-                    phone_variants = [
-                        user_phone,
-                        user_phone.replace('+', ''),
-                        user_phone.replace('+63', '0'),
-                        f"+{user_phone}" if not user_phone.startswith('+') else user_phone,
-                    ]
-                    
-                    django_user = None
-                    for phone_variant in phone_variants:
-                        try:
-                            django_user = User.objects.get(username=phone_variant)
-                            print(f"🔥 Found Django user: {phone_variant}")
-                            break
-                        except User.DoesNotExist:
-                            continue
-                    
-                    if django_user:
-                        request.user = django_user
-                        print(f"🔥 Django user set: {django_user.username}")
-                    else:
-                        print(f"⚠️ No Django user found for: {user_phone}")
-                        
-            except Exception as e:
-                print(f"⚠️ Error finding Django user: {e}")
+            # Corresponding Django user for compatibility, resolved only if the view uses it
+            if user_phone:
+                fallback_user = getattr(request, 'user', None)
+                request.user = SimpleLazyObject(
+                    lambda: resolve_django_user(request.session, user_phone) or fallback_user or AnonymousUser()
+                )
             
-            print(f"✅ Firebase user authenticated: {firebase_key}")
             return view_func(request, *args, **kwargs)
         
         # No authentication found
-        print(f"❌ Authentication failed - redirecting to login")
-        print(f"❌ Session keys: {list(request.session.keys())}")
+        logger.debug(f"Authentication failed - session keys: {list(request.session.keys())}")
         messages.error(request, 'Please log in to access this page.')
         return redirect('login')
     
@@ -200,6 +153,7 @@ def _build_deposit_withdrawal_feed(limit: int, minutes: int, user=None, public_f
         })
     return results
 
+@rate_limit('live_feed', methods=None)
 @require_GET
 def public_live_transactions_api(request):
     """PUBLIC API: Masked live transaction feed for dashboard display"""
@@ -257,32 +211,28 @@ def _ensure_firebase_user(phone_number: Optional[str] = None, email: Optional[st
         return  # If Firebase Admin is not configured, skip silently
 
 def save_user_to_firebase_realtime_db(user, phone_number, additional_data=None):
-    """Save user data to both Firebase Realtime Database and Firestore with enhanced error handling"""
-    if not FIREBASE_AVAILABLE:
-        print("⚠️ Firebase not available, skipping user save")
+    """Queue the user's Realtime Database record, indexes and Firestore document.
+
+    Returns True once the writes are queued (``myproject.firebase_queue``),
+    not once they reach Firebase; the queue applies and retries them later.
+    False means nothing was queued.
+    """
+    if not firebase_available():
+        logger.warning("Firebase not available, skipping user save")
         return False
         
-    print(f"🔥 Starting Firebase save for user: {phone_number}")
+    log_event(logger, logging.INFO, 'firebase.user_queued', phone=phone_number)
     
     try:
-        # Get Firebase app
-        app = get_firebase_app()
-        print(f"✅ Firebase app obtained: {type(app)}")
-        
-        # Check if we got a dummy app (Firebase unavailable)
-        if hasattr(app, 'project_id') and app.project_id == "firebase-unavailable":
-            print("❌ Firebase is unavailable - dummy app detected")
-            return False
-            
         # Get user profile for referral code
         try:
             profile = UserProfile.objects.get(user=user)
             referral_code = profile.referral_code
             referred_by_username = profile.referred_by.username if profile.referred_by else None
             balance = float(profile.balance) if profile.balance else 0.0
-            print(f"✅ User profile data loaded: balance={balance}, referral_code={referral_code}")
+            log_event(logger, logging.DEBUG, 'firebase.user_profile', balance=balance, referral_code=referral_code)
         except UserProfile.DoesNotExist:
-            print("⚠️ UserProfile not found, using default values")
+            logger.warning(f"No UserProfile for {user.username}, saving default values to Firebase")
             referral_code = None
             referred_by_username = None
             balance = 0.0
@@ -299,7 +249,7 @@ def save_user_to_firebase_realtime_db(user, phone_number, additional_data=None):
             'last_login': user.last_login.isoformat() if user.last_login else "",
             'is_active': user.is_active,
             'created_at': timezone.now().isoformat(),
-            'updated_at': timezone.now().isoformat(),
+            'updated_at': APPLIED_AT,
             'referral_code': referral_code,
             'referred_by': referred_by_username,
             'balance': balance,
@@ -310,82 +260,46 @@ def save_user_to_firebase_realtime_db(user, phone_number, additional_data=None):
         # Add additional data if provided
         if additional_data:
             user_data.update(additional_data)
-            print(f"✅ Additional data added: {list(additional_data.keys())}")
+            log_event(logger, logging.DEBUG, 'firebase.user_extra', keys=list(additional_data))
         
         # Clean phone number for Firebase key (remove +, spaces, etc.)
         firebase_key = phone_number.replace('+', '').replace(' ', '').replace('-', '')
-        print(f"✅ Firebase key generated: {firebase_key}")
         
-        # 1. Save to Firebase Realtime Database under 'users' node
-        try:
-            ref = firebase_db.reference('/', app=app)
-            users_ref = ref.child('users')
-            users_ref.child(firebase_key).set(user_data)
-            print(f"✅ User data saved to Firebase Realtime Database: {firebase_key}")
-        except Exception as rtdb_error:
-            print(f"❌ Failed to save to Realtime Database: {rtdb_error}")
-            # Continue with Firestore even if RTDB fails
+        # 1. Realtime Database 'users' node with its phone and referral code
+        #    indexes, as one all-or-nothing multi-location update
+        rtdb_updates = user_index_updates(firebase_key, user_data)
+        if user_data.get('referral_code'):
+            rtdb_updates[f"referral_codes/{user_data['referral_code']}"]['user_id'] = user.id
+        enqueue_rtdb_multi_update(rtdb_updates)
         
-        # 2. Save to Firestore collection 'users'
-        try:
-            db = firestore.client(app=app)
-            firestore_user_data = user_data.copy()
-            firestore_user_data['firebase_key'] = firebase_key
-            firestore_user_data['created_at'] = firestore.SERVER_TIMESTAMP
-            firestore_user_data['updated_at'] = firestore.SERVER_TIMESTAMP
-            
-            doc_ref = db.collection('users').document(firebase_key)
-            doc_ref.set(firestore_user_data)
-            print(f"✅ User data saved to Firestore: {firebase_key}")
-        except Exception as firestore_error:
-            print(f"❌ Failed to save to Firestore: {firestore_error}")
-        
-        # 3. Also save under 'referral_codes' node for easy lookup (Realtime DB)
-        if referral_code:
-            try:
-                referral_ref = ref.child('referral_codes')
-                referral_ref.child(referral_code).set({
-                    'user_id': user.id,
-                    'username': user.username,
-                    'phone_number': phone_number,
-                    'firebase_key': firebase_key,
-                    'created_at': timezone.now().isoformat()
-                })
-                print(f"✅ Referral code saved to Firebase: {referral_code}")
-            except Exception as ref_error:
-                print(f"❌ Failed to save referral code: {ref_error}")
+        # 2. Firestore collection 'users'
+        firestore_user_data = user_data.copy()
+        firestore_user_data['firebase_key'] = firebase_key
+        firestore_user_data['created_at'] = SERVER_TIMESTAMP
+        firestore_user_data['updated_at'] = SERVER_TIMESTAMP
+        enqueue_firestore_set(f'users/{firebase_key}', firestore_user_data)
         
-        print(f"🎉 Firebase save completed for user: {phone_number}")
         return True
         
     except Exception as e:
-        print(f"❌ Error saving user to Firebase: {e}")
-        import traceback
-        print(f"❌ Full traceback:")
-        traceback.print_exc()
+        logger.exception(f"Error saving user to Firebase: {e}")
         return False
 
 
 def update_user_in_firebase_realtime_db(user, phone_number, additional_data=None):
-    """Update user data in both Firebase Realtime Database and Firestore"""
-    if not FIREBASE_AVAILABLE:
-        print("⚠️ Firebase not available, skipping user update")
+    """Queue an update of the user's Realtime Database record and Firestore document.
+
+    Like ``save_user_to_firebase_realtime_db``, True means queued, not written.
+    """
+    if not firebase_available():
+        logger.warning("Firebase not available, skipping user update")
         return False
         
     try:
-        # Get Firebase app
-        app = get_firebase_app()
-        
-        # Get Realtime Database reference
-        ref = firebase_db.reference('/', app=app)
-        
-        # Get Firestore client
-        db = firestore.client(app=app)
-        
         # Prepare update data
         update_data = {
             'last_login': timezone.now().isoformat(),
-            'updated_at': timezone.now().isoformat()
+            'updated_at': APPLIED_AT
         }
         
         # Add additional data if provided
@@ -395,44 +309,38 @@ def update_user_in_firebase_realtime_db(user, phone_number, additional_data=None
         # Clean phone number for Firebase key
         firebase_key = phone_number.replace('+', '').replace(' ', '').replace('-', '')
         
-        # 1. Update Firebase Realtime Database
-        users_ref = ref.child('users')
-        users_ref.child(firebase_key).update(update_data)
-        print(f"✅ User data updated in Firebase Realtime Database: {firebase_key}")
+        # 1. Update Firebase Realtime Database (write-behind)
+        enqueue_rtdb_update(f'users/{firebase_key}', update_data)
         
-        # 2. Update Firestore
+        # 2. Update Firestore, together with the login event if there is one
         firestore_update_data = update_data.copy()
-        firestore_update_data['updated_at'] = firestore.SERVER_TIMESTAMP
-        
-        doc_ref = db.collection('users').document(firebase_key)
-        doc_ref.update(firestore_update_data)
-        print(f"✅ User data updated in Firestore: {firebase_key}")
+        firestore_update_data['updated_at'] = SERVER_TIMESTAMP
+        firestore_writes = [('update', f'users/{firebase_key}', firestore_update_data)]
         
         # 3. Save login event to Firestore 'login_events' collection
         if 'last_login_time' in update_data:
-            login_event = {
+            firestore_writes.append(('add', 'login_events', {
                 'user_id': user.id,
                 'phone_number': phone_number,
                 'firebase_key': firebase_key,
-                'login_time': firestore.SERVER_TIMESTAMP,
+                'login_time': SERVER_TIMESTAMP,
                 'user_agent': additional_data.get('user_agent', '') if additional_data else '',
                 'ip_address': additional_data.get('ip_address', '') if additional_data else ''
-            }
-            
-            db.collection('login_events').add(login_event)
-            print(f"✅ Login event saved to Firestore for user: {firebase_key}")
+            }))
+        if len(firestore_writes) == 1:
+            enqueue_firestore_update(f'users/{firebase_key}', firestore_update_data)
+        else:
+            enqueue_firestore_batch(firestore_writes)
         
         return True
         
     except Exception as e:
-        print(f"❌ Error updating user in Firebase: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error updating user in Firebase: {e}")
         return False
         return True
         
     except Exception as e:
-        print(f"❌ Error updating user in Firebase Realtime Database: {e}")
+        logger.error(f"Error updating user in Firebase Realtime Database: {e}")
         return False
 
     try:
@@ -686,7 +594,7 @@ def index(request):
         }
         return render(request, 'myproject/index.html', context)
     except Exception as e:
-        print(f"Error in index view: {e}")
+        logger.error(f"Error in index view: {e}")
         # Return a simple context if there's an error
         context = {
             'investment_plans': [],
@@ -694,6 +602,15 @@ def index(request):
         }
         return render(request, 'myproject/index.html', context)
 
+
+def _check_login_profile(session, phone):
+    """Run the login profile check for the Django user behind a new Firebase session, if any"""
+    django_user = resolve_django_user(session, phone)
+    if django_user is not None:
+        check_profile_at_login(session, django_user)
+
+
+@rate_limit('register')
 def register(request):
     """User registration view"""
     if request.method == 'POST':
@@ -741,24 +658,23 @@ def register(request):
         
         # Validate referral code if provided
         referrer = None
+        referrer_firebase_key = None
         if referral_code:
             try:
                 # Clean the referral code input
                 referral_code_original = referral_code
                 referral_code = referral_code.strip().upper()
 
-                # Enhanced Debug: Print everything about the referral code
-                print(f"🔍 REFERRAL CODE DEBUG:")
-                print(f"   Original input: '{referral_code_original}' (type: {type(referral_code_original)})")
-                print(f"   After cleaning: '{referral_code}' (length: {len(referral_code)})")
-                print(f"   Character codes: {[ord(c) for c in referral_code]}")
+                log_event(
+                    logger, logging.DEBUG, 'register.referral_code',
+                    original=referral_code_original, cleaned=referral_code,
+                )
 
                 # Remove non-printable characters
                 printable_chars = ''.join(c for c in referral_code if c.isprintable())
                 if printable_chars != referral_code:
-                    print(f"   ⚠️ Found non-printable characters!")
+                    logger.info(f"Removed non-printable characters from referral code {referral_code!r}")
                     referral_code = printable_chars
-                    print(f"   After removing non-printable: '{referral_code}'")
 
                 # 1) Try Django DB lookup first (case-insensitive)
                 referrer_profile = UserProfile.objects.filter(
@@ -767,15 +683,15 @@ def register(request):
 
                 if referrer_profile:
                     referrer = referrer_profile.user
-                    print(f"✅ Valid referral code found in Django DB: {referral_code} from user {referrer.username}")
+                    log_event(
+                        logger, logging.INFO, 'register.referrer_found',
+                        referral_code=referral_code, source='django', referrer=referrer.username,
+                    )
                 else:
                     # 2) If not found in Django, check Firebase (Firestore and RTDB) when available
-                    if FIREBASE_AVAILABLE:
+                    if firebase_available():
                         try:
-                            app = get_firebase_app()
-                            from firebase_admin import firestore
-
-                            db = firestore.client()
+                            db = get_firestore_client()
                             # Firestore query (exact match; codes are stored uppercase)
                             fs_matches = db.collection('profiles').where('referral_code', '==', referral_code).get()
                             if fs_matches:
@@ -786,63 +702,71 @@ def register(request):
                                     from django.contrib.auth.models import User
                                     try:
                                         referrer = User.objects.get(username=candidate)
-                                        print(f"✅ Valid referral code found in Firestore: {referral_code} mapped to Django user {referrer.username}")
+                                        log_event(
+                                            logger, logging.INFO, 'register.referrer_found',
+                                            referral_code=referral_code, source='firestore', referrer=referrer.username,
+                                        )
                                     except User.DoesNotExist:
                                         # Try flexible username/phone variants
                                         candidate_variants = [candidate, candidate.replace('+',''), candidate.replace('+63','0')]
                                         for cv in candidate_variants:
                                             try:
                                                 referrer = User.objects.get(username=cv)
-                                                print(f"✅ Mapped Firestore referral to Django user via variant: {cv}")
+                                                log_event(
+                                                    logger, logging.INFO, 'register.referrer_found',
+                                                    referral_code=referral_code, source='firestore', referrer=cv,
+                                                )
                                                 break
                                             except Exception:
                                                 continue
                             # If still not found, check Realtime Database referral_codes node
                             if not referrer:
                                 try:
-                                    ref = firebase_db.reference('/', app=app)
-                                    r = ref.child('referral_codes').child(referral_code).get()
+                                    ref = get_database_reference('/')
+                                    r = find_referral_code(ref, referral_code)
                                     if r:
+                                        referrer_firebase_key = r.get('firebase_key')
                                         candidate = r.get('username') or r.get('phone_number') or r.get('user_id')
                                         if candidate:
                                             from django.contrib.auth.models import User
                                             try:
                                                 referrer = User.objects.get(username=candidate)
-                                                print(f"✅ Valid referral code found in RTDB: {referral_code} mapped to Django user {referrer.username}")
+                                                log_event(
+                                                    logger, logging.INFO, 'register.referrer_found',
+                                                    referral_code=referral_code, source='rtdb', referrer=referrer.username,
+                                                )
                                             except User.DoesNotExist:
                                                 # try variants
                                                 candidate_variants = [candidate, candidate.replace('+',''), candidate.replace('+63','0')]
                                                 for cv in candidate_variants:
                                                     try:
                                                         referrer = User.objects.get(username=cv)
-                                                        print(f"✅ Mapped RTDB referral to Django user via variant: {cv}")
+                                                        log_event(
+                                                            logger, logging.INFO, 'register.referrer_found',
+                                                            referral_code=referral_code, source='rtdb', referrer=cv,
+                                                        )
                                                         break
                                                     except Exception:
                                                         continue
                                 except Exception as e:
-                                    print(f"⚠️ RTDB referral_codes lookup failed: {e}")
+                                    logger.warning(f"RTDB referral_codes lookup failed: {e}")
                         except Exception as e:
-                            print(f"⚠️ Firebase referral lookup error: {e}")
+                            logger.warning(f"Firebase referral lookup error: {e}")
 
                     # If after all lookups referrer still not found, show error
                     if not referrer:
-                        # Debug: Show available codes for troubleshooting (Django samples only)
-                        all_profiles = UserProfile.objects.exclude(referral_code__isnull=True).exclude(referral_code__exact='').values_list('referral_code', flat=True)[:10]
-                        print(f"❌ No matching referral code found for: '{referral_code}'")
-                        print(f"⚠️ Sample available referral codes (Django): {list(all_profiles)}")
+                        log_event(logger, logging.INFO, 'register.referral_code_invalid', referral_code=referral_code)
                         messages.error(request, f'Invalid referral code "{referral_code}". Please check and try again.')
                         return render(request, 'myproject/register.html', {'referral_code': referral_code})
 
             except Exception as e:
-                print(f"❌ Error during referral code validation: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception(f"Error during referral code validation: {e}")
                 messages.error(request, 'Error validating referral code. Please try again.')
                 return render(request, 'myproject/register.html', {'referral_code': referral_code})
         
         # 🔥 PURE FIREBASE REGISTRATION - NO Django User creation
         try:
-            if not FIREBASE_AVAILABLE:
+            if not firebase_available():
                 messages.error(request, 'Registration system unavailable. Please try again later.')
                 return render(request, 'myproject/register.html')
             
@@ -856,7 +780,7 @@ def register(request):
             firebase_key = clean_phone.replace('+', '').replace(' ', '').replace('-', '')
             
             # Get Firebase database reference
-            ref = firebase_db.reference('/', app=app)
+            ref = get_database_reference('/')
             users_ref = ref.child('users')
             
             # Check if phone number already exists in Firebase
@@ -870,16 +794,8 @@ def register(request):
             import string
             new_referral_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
             
-            # Ensure referral code is unique
-            while True:
-                all_users = users_ref.get() or {}
-                code_exists = any(
-                    user_data and user_data.get('referral_code') == new_referral_code
-                    for user_data in all_users.values()
-                    if user_data
-                )
-                if not code_exists:
-                    break
+            # Ensure referral code is unique (keyed lookup in referral_codes index)
+            while referral_code_exists(ref, new_referral_code):
                 new_referral_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
             
             # Hash password
@@ -916,67 +832,62 @@ def register(request):
                 }
             }
             
-            # Save user to Firebase
-            users_ref.child(firebase_key).set(user_data)
-            print(f"✅ User saved to Firebase: {clean_phone}")
+            # The new user, its phone/referral indexes and the referrer's bonus
+            # are written in one multi-location update: all of it or none
+            rtdb_updates = user_index_updates(firebase_key, user_data)
             
-            # Handle referral bonus for referrer (Firebase-based)
+            # Handle referral bonus for referrer (Firebase-based). The counters
+            # are server-side increments, so concurrent sign-ups under the same
+            # referrer all count and nothing has to be read first.
+            referrer_rewarded = False
             if referrer:
                 try:
-                    # Find referrer in Firebase
-                    referrer_key = None
-                    all_users = users_ref.get() or {}
-                    for user_key, user_data_check in all_users.items():
-                        if user_data_check and user_data_check.get('phone_number') == referrer.username:
-                            referrer_key = user_key
-                            break
+                    # Find referrer in Firebase via the phone index
+                    referrer_key = referrer_firebase_key or find_user_key_by_phone(ref, referrer.username)
                     
                     if referrer_key:
-                        referrer_data = users_ref.child(referrer_key).get()
                         referral_bonus = 15.00  # ₱15 referral bonus
+                        referrer_path = f'users/{referrer_key}'
                         
                         # Update referrer's Firebase data
-                        referrer_new_balance = float(referrer_data.get('balance', 0)) + referral_bonus
-                        referrer_total_referrals = int(referrer_data.get('total_referrals', 0)) + 1
-                        referrer_earnings = float(referrer_data.get('referral_earnings', 0)) + referral_bonus
-                        
-                        users_ref.child(referrer_key).update({
-                            'balance': referrer_new_balance,
-                            'total_referrals': referrer_total_referrals,
-                            'referral_earnings': referrer_earnings,
-                            'last_referral_date': timezone.now().isoformat()
-                        })
+                        rtdb_updates[f'{referrer_path}/balance'] = rtdb_increment(referral_bonus)
+                        rtdb_updates[f'{referrer_path}/total_referrals'] = rtdb_increment(1)
+                        rtdb_updates[f'{referrer_path}/referral_earnings'] = rtdb_increment(referral_bonus)
+                        rtdb_updates[f'{referrer_path}/last_referral_date'] = timezone.now().isoformat()
                         
                         # Add referral bonus transaction to referrer
                         referral_transaction_key = f"referral_bonus_{firebase_key}_{int(timezone.now().timestamp())}"
-                        users_ref.child(referrer_key).child('transactions').child(referral_transaction_key).set({
+                        rtdb_updates[f'{referrer_path}/transactions/{referral_transaction_key}'] = {
                             'amount': referral_bonus,
                             'type': 'referral_bonus',
                             'status': 'completed',
                             'date': timezone.now().isoformat(),
                             'from_user': clean_phone,
                             'description': f'Referral bonus from {clean_phone}'
-                        })
-                        
-                        print(f"💰 Referral bonus of ₱{referral_bonus} awarded to referrer")
+                        }
+                        referrer_rewarded = True
                     
                 except Exception as referral_error:
-                    print(f"❌ Error processing referral bonus: {referral_error}")
                     # Don't fail registration, just log the error
+                    logger.error(f"Error processing referral bonus: {referral_error}")
+            
+            ref.update(rtdb_updates)
+            invalidate_paths('rtdb', rtdb_updates)
+            log_event(logger, logging.INFO, 'register.user_saved', phone=clean_phone)
+            if referrer_rewarded:
+                log_event(
+                    logger, logging.INFO, 'register.referral_bonus',
+                    referrer=referrer.username, amount=referral_bonus,
+                )
             
             # Create pure Firebase session for auto-login (no tokens needed)
-            request.session['firebase_authenticated'] = True
-            request.session['firebase_key'] = firebase_key
-            request.session['user_phone'] = clean_phone
-            request.session['is_authenticated'] = True
-            request.session['firebase_user_data'] = user_data
-            request.session['login_time'] = timezone.now().isoformat()
-            request.session['login_method'] = 'firebase_registration'
+            start_firebase_session(request.session, firebase_key, clean_phone, user_data, 'firebase_registration')
+            _check_login_profile(request.session, clean_phone)
             
             # Force session save
             request.session.save()
             
-            print(f"🎉 Pure Firebase registration successful: {clean_phone}")
+            log_event(logger, logging.INFO, 'register.success', phone=clean_phone)
             success_msg = 'Registration successful! You received ₱100 bonus.'
             if referrer:
                 success_msg += f' Your referrer earned a bonus too!'
@@ -1001,7 +912,7 @@ def register(request):
                         level=1,
                         commission_type='registration'  # Specify this is a registration bonus
                     )
-                    print(f"✅ Referral commission created: ID={commission.id}")
+                    logger.info(f"Referral commission created: ID={commission.id}")
                     
                     # Create referral bonus transaction
                     Transaction.objects.create(
@@ -1019,14 +930,11 @@ def register(request):
                         notification_type='referral'
                     )
                     
-                    print(f"💰 Referral bonus of ₱{referral_bonus} awarded to {referrer.username}")
+                    logger.info(f"Referral bonus of ₱{referral_bonus} awarded to {referrer.username}")
                     
                 except Exception as referral_error:
-                    print(f"❌ Error creating referral commission: {referral_error}")
-                    import traceback
-                    traceback.print_exc()
                     # Don't fail the registration, just log the error
-                    print("⚠️ Registration will continue without referral commission")
+                    logger.exception(f"Error creating referral commission, continuing without it: {referral_error}")
             
             # Create notification
             Notification.objects.create(
@@ -1084,18 +992,16 @@ def register(request):
                     update_user_in_firebase_realtime_db(referrer, referrer_profile.phone_number or referrer.username, referrer_firebase_data)
                     
                 except UserProfile.DoesNotExist:
-                    print(f"⚠️ Referrer profile not found for {referrer.username}")
+                    logger.warning(f"Referrer profile not found for {referrer.username}")
                 except Exception as e:
-                    print(f"❌ Error updating referrer Firebase data: {e}")
+                    logger.error(f"Error updating referrer Firebase data: {e}")
             
             # Auto-login the user after registration
-            print(f"🔐 Attempting to auto-login user: {clean_phone}")
             user = authenticate(request, username=clean_phone, password=password)
-            print(f"🔐 Auto-login authentication result: {user}")
             
             if user is not None:
                 login(request, user)
-                print(f"✅ User auto-logged in successfully: {user.username}")
+                logger.info(f"User auto-logged in after registration: {user.username}")
                 
                 # Update login time in Firebase
                 update_user_in_firebase_realtime_db(user, clean_phone, {'login_count': 1})
@@ -1106,14 +1012,12 @@ def register(request):
                 messages.success(request, success_msg + ' Welcome to GrowFi!')
                 return redirect('dashboard')
             else:
-                print("❌ Auto-login failed")
+                logger.warning(f"Auto-login after registration failed for {clean_phone}")
                 messages.success(request, 'Registration successful! You received ₱100 bonus.')
                 return redirect('login')
             
         except Exception as e:
-            print(f"❌ Registration error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Registration error: {e}")
             
             # Provide more specific error messages
             if "UNIQUE constraint failed" in str(e):
@@ -1130,13 +1034,14 @@ def register(request):
     context = {'referral_code': referral_code}
     return render(request, 'myproject/register.html', context)
 
+@rate_limit('login')
 def user_login(request):
     """Pure Firebase login with improved password authentication"""
     if request.method == 'POST':
         phone = request.POST.get('phone', '')
         password = request.POST.get('password', '')
         
-        print(f"🔐 Login attempt - Phone: {phone}")
+        log_event(logger, logging.INFO, 'auth.login_attempt', phone=phone)
         
         if not phone or not password:
             messages.error(request, 'Please enter both phone number and password.')
@@ -1144,7 +1049,7 @@ def user_login(request):
         
         # Direct Firebase authentication without external modules
         try:
-            if not FIREBASE_AVAILABLE:
+            if not firebase_available():
                 messages.error(request, 'Login system unavailable. Please try again later.')
                 return render(request, 'myproject/login.html')
             
@@ -1176,15 +1081,14 @@ def user_login(request):
             # Create Firebase key
             firebase_key = clean_phone.replace('+', '').replace(' ', '').replace('-', '')
             
-            print(f"🔍 Looking for user: {clean_phone} (key: {firebase_key})")
             
             # Get user from Firebase
-            ref = firebase_db.reference('/', app=app)
+            ref = get_database_reference('/')
             users_ref = ref.child('users')
             user_data = users_ref.child(firebase_key).get()
             
             if not user_data:
-                print(f"❌ User not found in Firebase: {clean_phone}")
+                log_event(logger, logging.INFO, 'auth.login_failed', phone=clean_phone, reason='not_found')
                 messages.error(request, 'Account not found. Please check your phone number or register first.')
                 return render(request, 'myproject/login.html')
             
@@ -1196,7 +1100,7 @@ def user_login(request):
             # Verify password
             stored_password = user_data.get('password', '')
             if not stored_password:
-                print(f"❌ No password stored for user: {clean_phone}")
+                log_event(logger, logging.WARNING, 'auth.login_failed', phone=clean_phone, reason='no_password')
                 messages.error(request, 'Account setup incomplete. Please contact support.')
                 return render(request, 'myproject/login.html')
             
@@ -1204,56 +1108,39 @@ def user_login(request):
             import hashlib
             hashed_input_password = hashlib.sha256(password.encode()).hexdigest()
             
-            print(f"🔐 Password verification:")
-            print(f"   Input password hash: {hashed_input_password[:20]}...")
-            print(f"   Stored password hash: {stored_password[:20]}...")
-            
             if hashed_input_password != stored_password:
-                print(f"❌ Password verification failed")
+                log_event(logger, logging.INFO, 'auth.login_failed', phone=clean_phone, reason='bad_password')
                 messages.error(request, 'Invalid password. Please check your password and try again.')
                 return render(request, 'myproject/login.html')
             
             # SUCCESS - Create pure Firebase session (NO Django User needed)
-            print(f"✅ Password verified successfully")
             
-            # Create pure Firebase session (no tokens needed)
-            request.session['firebase_authenticated'] = True
-            request.session['firebase_key'] = firebase_key
-            request.session['user_phone'] = clean_phone
-            request.session['is_authenticated'] = True
-            request.session['firebase_user_data'] = user_data
+            # Create pure Firebase session (no tokens needed); only a profile summary is stored
+            start_firebase_session(request.session, firebase_key, clean_phone, user_data, 'firebase_direct')
+            _check_login_profile(request.session, clean_phone)
             
-            # Update Firebase login tracking
+            # Update Firebase login tracking (written with the next presence flush)
             try:
-                login_count = int(user_data.get('login_count', 0)) + 1
-                users_ref.child(firebase_key).update({
+                record_activity(firebase_key, rtdb={
                     'last_login': timezone.now().isoformat(),
-                    'login_count': login_count,
                     'is_online': True,
                     'last_login_platform': 'web_django',
                     'session_id': request.session.session_key
-                })
-                print(f"✅ Firebase login tracking updated")
+                }, increments={'login_count': 1})
             except Exception as e:
-                print(f"⚠️ Firebase tracking update failed: {e}")
+                logger.warning(f"Firebase tracking update failed: {e}")
             
-            # Set additional session data
-            request.session['login_time'] = timezone.now().isoformat()
-            request.session['login_method'] = 'firebase_direct'
             request.session['user_balance'] = user_data.get('balance', 0)
-            request.session['firebase_user_data'] = user_data
             
             # Force session save
             request.session.save()
             
-            print(f"🎉 Login successful for: {clean_phone}")
+            log_event(logger, logging.INFO, 'auth.login', phone=clean_phone)
             messages.success(request, 'Welcome back! Successfully logged in.')
             return redirect('dashboard')
             
         except Exception as e:
-            print(f"❌ Login error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Login error: {e}")
             messages.error(request, 'Login failed. Please try again.')
     
     return render(request, 'myproject/login.html')
@@ -1266,12 +1153,11 @@ def dashboard(request):
     firebase_user = request.firebase_user
     firebase_uid = firebase_user.firebase_key  # This is the Firebase UID
     
-    print(f"📊 Dashboard access: {firebase_uid}")
+    log_event(logger, logging.INFO, 'dashboard.view', firebase_uid=firebase_uid)
     
     # DEVELOPMENT MODE: Skip Firebase operations to prevent delays
     from django.conf import settings
     if settings.DEBUG:
-        print("🔥 DEVELOPMENT MODE: Using Django ORM instead of Firebase")
         
         # Use regular Django authentication and data
         try:
@@ -1307,11 +1193,11 @@ def dashboard(request):
                 free_bonus = 100  # ₱100 free bonus
                 total_balance = referral_earnings + free_bonus  # Total available balance
                 
-                print(f"💰 Dashboard balance calculation:")
-                print(f"   Confirmed referrals: {confirmed_referrals}")
-                print(f"   Referral earnings: ₱{referral_earnings} ({confirmed_referrals} × ₱15)")
-                print(f"   Free bonus: ₱{free_bonus}")
-                print(f"   Total balance: ₱{total_balance}")
+                log_event(
+                    logger, logging.DEBUG, 'dashboard.balance',
+                    confirmed_referrals=confirmed_referrals, referral_earnings=referral_earnings,
+                    free_bonus=free_bonus, total_balance=total_balance,
+                )
                 
                 context = {
                     'user': user,
@@ -1334,28 +1220,25 @@ def dashboard(request):
                 return redirect('login')
                 
         except Exception as e:
-            print(f"❌ Dashboard error: {e}")
+            logger.error(f"Dashboard error: {e}")
             messages.error(request, 'Unable to load dashboard. Please try again.')
             return redirect('login')
     
     # PRODUCTION MODE: Use Firebase (original code)
     try:
         # Initialize Firestore client
-        if not FIREBASE_AVAILABLE:
+        if not firebase_available():
             raise Exception("Firebase not available")
             
         from firebase_admin import firestore
-        db = firestore.client()
+        db = get_firestore_client()
         
         # Get user document from Firestore
-        user_ref = db.collection('users').document(firebase_uid)
-        user_doc = user_ref.get()
+        user_path = f'users/{firebase_uid}'
+        user_ref = db.document(user_path)
+        user_data = firestore_documents.get(user_path)
         
-        if user_doc.exists:
-            # User exists, get data
-            user_data = user_doc.to_dict()
-            print(f"✅ User found in Firestore: {firebase_uid}")
-        else:
+        if user_data is None:
             # Create new user document in Firestore
             user_data = {
                 'uid': firebase_uid,
@@ -1383,10 +1266,11 @@ def dashboard(request):
             
             # Save to Firestore
             user_ref.set(user_data)
-            print(f"✅ New user created in Firestore: {firebase_uid}")
+            firestore_documents.invalidate(user_path)
+            log_event(logger, logging.INFO, 'dashboard.user_created', firebase_uid=firebase_uid)
         
-        # Update last login
-        user_ref.update({'last_login': firestore.SERVER_TIMESTAMP})
+        # Update last login with the next presence flush
+        record_activity(firebase_uid, firestore={'last_login': SERVER_TIMESTAMP})
         
         # Create dashboard context using Firestore data
         context = {
@@ -1441,11 +1325,10 @@ def dashboard(request):
             'active_referral_count': 0,
         }
         
-        print(f"✅ Pure Firebase/Firestore dashboard context created for: {firebase_uid}")
         return render(request, 'myproject/dashboard.html', context)
         
     except Exception as e:
-        print(f"❌ Firebase/Firestore dashboard error: {e}")
+        logger.error(f"Firebase/Firestore dashboard error: {e}")
         messages.error(request, f'Dashboard error: {str(e)}')
         return redirect('login')
 
@@ -1463,12 +1346,11 @@ def investment_plans(request):
             'user_agent_hash': hash(request.META.get('HTTP_USER_AGENT', ''))[:10] if request.META.get('HTTP_USER_AGENT') else None
         }
         
-        # Non-blocking Firebase update
-        update_user_in_firebase_realtime_db(request.user, request.user.username, firebase_data)
-        print(f"🔥 Firebase dashboard tracking updated")
+        # Written with the next presence flush
+        record_activity(firebase_key_for_phone(request.user.username), rtdb=firebase_data, firestore=firebase_data)
         
     except Exception as firebase_error:
-        print(f"⚠️ Firebase dashboard update error (non-critical): {firebase_error}")
+        logger.warning(f"Firebase dashboard update error (non-critical): {firebase_error}")
     
     # Get dashboard data with enhanced error handling
     try:
@@ -1630,9 +1512,7 @@ def investment_plans(request):
         return render(request, 'myproject/dashboard.html', context)
         
     except Exception as e:
-        print(f"❌ Dashboard error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Dashboard error: {e}")
         
         # Fallback context in case of errors
         context = {
@@ -1663,7 +1543,6 @@ def investment_plans(request):
     from django.conf import settings
     
     if settings.DEBUG:
-        print("🔥 DEVELOPMENT MODE: Using Django ORM for investment plans")
         
         # Use regular Django authentication
         try:
@@ -1693,7 +1572,7 @@ def investment_plans(request):
                             is_active=True
                         )
                     plans = InvestmentPlan.objects.filter(is_active=True)
-                    print(f"✅ Created {len(default_plans)} investment plans")
+                    logger.info(f"Created {len(default_plans)} investment plans")
                 
                 return render(request, 'myproject/investment_plans.html', {'plans': plans})
             else:
@@ -1701,7 +1580,7 @@ def investment_plans(request):
                 return redirect('login')
                 
         except Exception as e:
-            print(f"❌ Investment plans error: {e}")
+            logger.error(f"Investment plans error: {e}")
             messages.error(request, 'Unable to load investment plans. Please try again.')
             return redirect('login')
     
@@ -1728,7 +1607,7 @@ def investment_plans(request):
                 duration_days=20,  # FIXED: 20 days duration
                 is_active=True
             )
-        print(f"✅ Created {len(default_plans)} investment plans with 20-day duration")
+        logger.info(f"Created {len(default_plans)} investment plans with 20-day duration")
         plans = InvestmentPlan.objects.filter(is_active=True)
     return render(request, 'myproject/investment_plans.html', {'plans': plans})
 
@@ -1781,17 +1660,17 @@ def make_investment(request, plan_id):
                 messages.error(request, 'Insufficient balance')
                 return render(request, 'myproject/make_investment.html', {'plan': plan, 'profile': profile})
             
-            # Create investment using Django user
-            investment = Investment.objects.create(
-                user=django_user,
-                plan=plan,
-                amount=amount,
-                end_date=timezone.now() + timezone.timedelta(days=plan.duration_days)
-            )
-            
-            # Update profile immediately with database transaction
+            # Create investment and update profile in one database transaction
             from django.db import transaction as db_transaction
             with db_transaction.atomic():
+                # Create investment using Django user
+                investment = Investment.objects.create(
+                    user=django_user,
+                    plan=plan,
+                    amount=amount,
+                    end_date=timezone.now() + timezone.timedelta(days=plan.duration_days)
+                )
+                
                 # Deduct balance and update totals
                 profile.balance -= amount
                 profile.total_invested += amount
@@ -1819,6 +1698,10 @@ def make_investment(request, plan_id):
                 profile.total_invested = total_invested
                 profile.total_earnings = total_earnings
                 profile.save()
+                
+                # Referral commissions (all levels) are paid by the commission worker
+                if profile.referred_by_id:
+                    enqueue_investment_commission(investment)
             
             # Create notification
             Notification.objects.create(
@@ -1828,33 +1711,6 @@ def make_investment(request, plan_id):
                 notification_type='investment'
             )
             
-            # Handle referral commission
-            if profile.referred_by:
-                commission_rate = Decimal('5.00')  # 5% commission
-                commission_amount = (amount * commission_rate) / 100
-                
-                referrer_profile = UserProfile.objects.get(user=profile.referred_by)
-                referrer_profile.balance += commission_amount
-                referrer_profile.save()
-                
-                ReferralCommission.objects.create(
-                    referrer=profile.referred_by,
-                    referred_user=django_user,
-                    investment=investment,
-                    commission_rate=commission_rate,
-                    commission_amount=commission_amount,
-                    level=1,
-                    commission_type='investment'
-                )
-                
-                Transaction.objects.create(
-                    user=profile.referred_by,
-                    transaction_type='referral_bonus',
-                    amount=commission_amount,
-                    status='completed',
-                    description=f'Referral commission from {django_user.username} investment'
-                )
-            
             messages.success(request, f'Investment of ₱{amount} created successfully!')
             return redirect('dashboard')
             
@@ -1969,15 +1825,14 @@ def transaction_history(request):
     user_phone = request.firebase_user.phone_number
     
     try:
-        print(f"🔍 Getting transaction summary for Firebase UID: {firebase_uid}")
+        log_event(logger, logging.INFO, 'transactions.view', firebase_uid=firebase_uid)
         
         # Find Django user by phone number to get transactions
         django_user = None
         try:
             django_user = User.objects.get(username=user_phone)
-            print(f"✅ Found Django user: {django_user.username}")
         except User.DoesNotExist:
-            print(f"❌ No Django user found for phone: {user_phone}")
+            log_event(logger, logging.INFO, 'transactions.no_user', phone=user_phone)
         
         # Initialize summary with real data
         summary = {
@@ -2017,12 +1872,7 @@ def transaction_history(request):
             
             summary['total_transactions'] = user_transactions.count()
             
-            print(f"💰 Real Summary totals:")
-            print(f"   Total Deposits: ₱{summary['total_deposits']}")
-            print(f"   Total Withdrawals: ₱{summary['total_withdrawals']}")
-            print(f"   Total Investments: ₱{summary['total_investments']}")
-            print(f"   Total Earnings: ₱{summary['total_earnings']}")
-            print(f"   Total Transactions: {summary['total_transactions']}")
+            log_event(logger, logging.DEBUG, 'transactions.summary', firebase_uid=firebase_uid, **summary)
         
         # Show real transactions with individual cards
         context = {
@@ -2031,13 +1881,10 @@ def transaction_history(request):
             'show_only_summary': False,  # Show individual transaction cards
         }
         
-        print(f"✅ Records page showing real data with {len(transactions_list)} transactions")
         return render(request, 'myproject/transaction_history.html', context)
         
     except Exception as e:
-        print(f"❌ Transaction history error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Transaction history error: {e}")
         
         # Even on error, show empty data but allow the page to load
         context = {
@@ -2055,7 +1902,6 @@ def transaction_history(request):
             },
             'show_only_summary': False,
         }
-        print(f"✅ Error fallback: showing empty data")
         return render(request, 'myproject/transaction_history.html', context)
 
 @firebase_login_required
@@ -2064,12 +1910,10 @@ def notifications(request):
     try:
         notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
         # Mark all as read
-        notifications.update(is_read=True)
+        mark_all_notifications_read(request.user)
         return render(request, 'myproject/notifications.html', {'notifications': notifications})
     except Exception as e:
-        print(f"Error in notifications view: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error in notifications view: {e}")
         messages.error(request, 'Unable to load notifications at this time.')
         return redirect('dashboard')
 
@@ -2077,8 +1921,7 @@ def notifications(request):
 def notification_detail(request, notification_id):
     """Notification detail view"""
     notification = get_object_or_404(Notification, id=notification_id, user=request.user)
-    notification.is_read = True
-    notification.save()
+    mark_notification_read(notification)
     return render(request, 'myproject/notification_detail.html', {'notification': notification})
 
 @firebase_login_required
@@ -2092,15 +1935,20 @@ def profile(request):
     try:
         # Get Firestore client directly
         from firebase_admin import firestore
-        db = firestore.client()
-        
-        # Get profile data from Firestore profiles collection
-        profile_ref = db.collection('profiles').document(firebase_uid)
-        profile_doc = profile_ref.get()
+        db = get_firestore_client()
+        
+        # Profile and team documents are independent; read them together
+        profile_path = f'profiles/{firebase_uid}'
+        team_path = f'teams/{firebase_uid}'
+        profile_ref = db.document(profile_path)
+        results = fan_out({
+            'profile': lambda: firestore_documents.get(profile_path),
+            'team': lambda: firestore_documents.get(team_path),
+        })
+        profile = results.get('profile')
         
-        if profile_doc.exists:
-            profile = profile_doc.to_dict()
-            print(f"✅ Profile found for: {firebase_uid}")
+        if profile is not None:
+            logger.debug(f"Profile found for: {firebase_uid}")
         else:
             # Auto-create new profile document
             profile = {
@@ -2113,14 +1961,14 @@ def profile(request):
                 'created_at': firestore.SERVER_TIMESTAMP
             }
             profile_ref.set(profile)
-            print(f"✅ New profile created for: {firebase_uid}")
+            firestore_documents.invalidate(profile_path)
+            logger.info(f"New profile created for: {firebase_uid}")
         
         # Get team statistics from Firestore
-        team_ref = db.collection('teams').document(firebase_uid)
-        team_doc = team_ref.get()
+        team_ref = db.document(team_path)
+        team_data = results.get('team')
         
-        if team_doc.exists:
-            team_data = team_doc.to_dict()
+        if team_data is not None:
             total_referrals = team_data.get('total_referrals', 0)
             active_referrals = team_data.get('active_referrals', 0)
             referral_earnings = team_data.get('total_earnings', 0)
@@ -2134,6 +1982,7 @@ def profile(request):
                 'created_at': firestore.SERVER_TIMESTAMP
             }
             team_ref.set(team_data)
+            firestore_documents.invalidate(team_path)
             total_referrals = 0
             active_referrals = 0
             referral_earnings = 0
@@ -2149,9 +1998,10 @@ def profile(request):
                 'updated_at': firestore.SERVER_TIMESTAMP
             }
             profile_ref.update(updates)
+            firestore_documents.invalidate(profile_path)
             profile.update(updates)
             messages.success(request, 'Profile updated successfully!')
-            print(f"✅ Profile updated for: {firebase_uid}")
+            logger.info(f"Profile updated for: {firebase_uid}")
         
         context = {
             'profile': profile,
@@ -2162,9 +2012,7 @@ def profile(request):
         return render(request, 'myproject/profile.html', context)
         
     except Exception as e:
-        print(f"❌ Profile error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Profile error: {e}")
         messages.error(request, 'Unable to load profile.')
         return redirect('dashboard')
 
@@ -2257,11 +2105,14 @@ def calculate_investment(request):
 
 def user_logout(request):
     """User logout view - Clear Firebase sessions"""
+    record_activity(request.session.get('firebase_key'), rtdb={'is_online': False})
+    
     # Clear Firebase session data (no tokens to worry about)
     request.session.pop('firebase_authenticated', None)
     request.session.pop('firebase_key', None)
     request.session.pop('is_authenticated', None)
-    request.session.pop('firebase_user_data', None)
+    request.session.pop(SESSION_PROFILE, None)
+    request.session.pop(LEGACY_SESSION_USER_DATA, None)
     request.session.pop('user_phone', None)
     request.session.pop('login_time', None)
     request.session.pop('login_method', None)
@@ -2309,11 +2160,7 @@ def contact(request):
 def api_notification_count(request):
     """API endpoint to get notification count for current user"""
     try:
-        profile = request.user.userprofile
-        unread_count = Notification.objects.filter(
-            user=request.user,
-            is_read=False
-        ).count()
+        unread_count = unread_notification_count(request.user)
         
         return JsonResponse({
             'count': unread_count,
@@ -2774,8 +2621,7 @@ def set_primary_account(request, account_id):
 @login_required
 def api_notification_count(request):
     """API endpoint for notification count"""
-    count = Notification.objects.filter(user=request.user, is_read=False).count()
-    return JsonResponse({'count': count})
+    return JsonResponse({'count': unread_notification_count(request.user)})
 
 @login_required  
 def gcash_webhook(request):
@@ -2809,20 +2655,32 @@ def team(request):
     user_phone = request.firebase_user.phone_number
     
     try:
-        print(f"🔍 Getting Firebase team data for UID: {firebase_uid}")
         
         # Get Firestore client directly
         from firebase_admin import firestore
-        db = firestore.client()
-        
-        # First get the user's referral code from profiles collection
-        user_profile_ref = db.collection('profiles').document(firebase_uid)
-        user_profile_doc = user_profile_ref.get()
+        db = get_firestore_client()
+        
+        # The referral code is on the Firestore profile, and is usually the
+        # one kept in the session: read the first page for that code
+        # alongside the profile and the team totals instead of after them
+        profile_path = f'profiles/{firebase_uid}'
+        user_profile_ref = db.document(profile_path)
+        session_referral_code = request.firebase_user.get('referral_code')
+        team_sort = request.GET.get('sort', DEFAULT_TEAM_SORT)
+        if team_sort not in TEAM_SORTS:
+            team_sort = DEFAULT_TEAM_SORT
+        reads = {
+            'profile': lambda: firestore_documents.get(profile_path),
+            'record': lambda: user_records.get(firebase_uid),
+        }
+        if session_referral_code:
+            reads['first_page'] = lambda: team_page(session_referral_code, team_sort)
+        results = fan_out(reads)
+        user_profile_data = results.get('profile')
         
         referral_code = None
         
-        if user_profile_doc.exists:
-            user_profile_data = user_profile_doc.to_dict()
+        if user_profile_data is not None:
             referral_code = user_profile_data.get('referral_code')
             
             # If no referral code exists, generate one
@@ -2837,7 +2695,8 @@ def team(request):
                         referral_code = new_code
                         # Update user profile with new code
                         user_profile_ref.update({'referral_code': referral_code})
-                        print(f"✅ Generated new referral code: {referral_code}")
+                        firestore_documents.invalidate(profile_path)
+                        log_event(logger, logging.INFO, 'team.referral_code_created', firebase_uid=firebase_uid, referral_code=referral_code)
                         break
         else:
             # Create new profile with referral code
@@ -2857,230 +2716,46 @@ def team(request):
                 'created_at': firestore.SERVER_TIMESTAMP
             }
             user_profile_ref.set(user_profile_data)
-            print(f"✅ Created new profile with referral code: {referral_code}")
+            firestore_documents.invalidate(profile_path)
+            log_event(logger, logging.INFO, 'team.referral_code_created', firebase_uid=firebase_uid, referral_code=referral_code)
         
-        print(f"🔑 Current user referral code: {referral_code}")
         
-        # Initialize counters
-        referrals_list = []
-        total_referrals = 0
-        active_referrals = 0
-        team_volume = 0.0
-        team_earnings = 0.0
-        referral_earnings = 0.0
+        # Only the first page is rendered; the rest is fetched from team_members_api
+        if referral_code == session_referral_code:
+            first_page, next_cursor = results.get('first_page')
+        else:
+            first_page, next_cursor = team_page(referral_code, team_sort)
         
-        # 🔥 PURE FIREBASE REALTIME DATABASE APPROACH - Primary source of truth
-        try:
-            from firebase_admin import db as firebase_db
-            ref = firebase_db.reference('/', get_firebase_app())
-            
-            # Try different database URLs if the first one fails
-            database_urls = [
-                'https://growthinvestment-bbfe2-default-rtdb.asia-southeast1.firebasedatabase.app',
-                'https://growthinvestment-bbfe2-default-rtdb.firebaseio.com'
-            ]
-            
-            all_users = {}
-            for db_url in database_urls:
-                try:
-                    # Reinitialize with specific URL
-                    import firebase_admin
-                    from firebase_admin import credentials
-                    
-                    # Get existing app
-                    app = get_firebase_app()
-                    
-                    # Try to get users directly
-                    if hasattr(app, '_database_cache'):
-                        app._database_cache.clear()
-                    
-                    ref = firebase_db.reference('/', app=app)
-                    users_ref = ref.child('users')
-                    all_users = users_ref.get() or {}
-                    
-                    if all_users:
-                        print(f"✅ Successfully connected to Firebase RTDB: {len(all_users)} users")
-                        break
-                    else:
-                        print(f"⚠️ Empty database at {db_url}")
-                        
-                except Exception as db_error:
-                    print(f"⚠️ Failed to connect to {db_url}: {db_error}")
-                    continue
-            
-            if not all_users:
-                print("❌ Could not connect to Firebase RTDB, falling back to Firestore only")
-                raise Exception("No RTDB data available")
-            
-            print(f"🔍 Checking Firebase RTDB with {len(all_users)} users for referral code: {referral_code}")
-            
-            # Track processed phones to avoid duplicates
-            processed_phones = set()
-            
-            for user_key, user_data in all_users.items():
-                if not user_data:
-                    continue
-                    
-                # Check if this user was referred by our referral code
-                user_referred_by = user_data.get('referred_by_code', '')
-                if user_referred_by == referral_code:
-                    phone_number = user_data.get('phone_number', '')
-                    
-                    # Skip duplicates
-                    if phone_number in processed_phones:
-                        continue
-                    processed_phones.add(phone_number)
-                    
-                    # Extract financial data - check multiple fields for robustness
-                    balance = float(user_data.get('balance', 0.0))
-                    total_invested = float(user_data.get('total_invested', 0.0))
-                    total_earnings = float(user_data.get('total_earnings', 0.0))
-                    
-                    # Also check transactions for invested amounts if not in main fields
-                    transactions = user_data.get('transactions', {})
-                    transaction_invested = 0.0
-                    transaction_earnings = 0.0
-                    
-                    for tx_id, tx_data in transactions.items():
-                        if isinstance(tx_data, dict):
-                            tx_type = tx_data.get('type', '')
-                            tx_amount = float(tx_data.get('amount', 0.0))
-                            tx_status = tx_data.get('status', '')
-                            
-                            if tx_status == 'completed':
-                                if tx_type in ['investment', 'deposit', 'add_funds']:
-                                    transaction_invested += tx_amount
-                                elif tx_type in ['daily_earning', 'profit', 'earning']:
-                                    transaction_earnings += tx_amount
-                    
-                    # Use the higher value between stored fields and calculated from transactions
-                    total_invested = max(total_invested, transaction_invested)
-                    total_earnings = max(total_earnings, transaction_earnings)
-                    
-                    # Count this referral
-                    total_referrals += 1
-                    
-                    # Check if user is active (has balance, investments, or recent activity)
-                    is_active = balance > 0 or total_invested > 0 or len(transactions) > 1
-                    if is_active:
-                        active_referrals += 1
-                    
-                    # Add to team totals - ONLY real investments, no fake volume
-                    team_volume += total_invested  # Only actual investments, not balance
-                    team_earnings += total_earnings
-                    
-                    # Get display info
-                    display_name = user_data.get('display_name') or user_data.get('username') or user_data.get('first_name', '') or phone_number
-                    date_joined = user_data.get('date_joined') or user_data.get('created_at')
-                    
-                    referral_info = {
-                        'uid': user_key,
-                        'phone': phone_number,
-                        'display_name': display_name,
-                        'balance': balance,
-                        'total_invested': total_invested,
-                        'total_earnings': total_earnings,
-                        'date_joined': date_joined,
-                        'is_active': is_active,
-                        'transaction_count': len(transactions)
-                    }
-                    
-                    referrals_list.append(referral_info)
-                    
-                    print(f"✅ Found referral: {phone_number}, Balance: ₱{balance}, Invested: ₱{total_invested}, Active: {is_active}")
-                
-        except Exception as rtdb_error:
-            print(f"❌ Firebase RTDB error: {rtdb_error}")
-            all_users = {}  # Reset for fallback
-            
-        # 🔥 FALLBACK: Also check Firestore as secondary source
-        try:
-            referred_users_query = db.collection('users').where('referred_by_code', '==', referral_code)
-            referred_users_docs = referred_users_query.get()
-            
-            print(f"� Also checking Firestore: {len(referred_users_docs)} referred users found")
-            
-            for referred_doc in referred_users_docs:
-                referred_data = referred_doc.to_dict()
-                referred_uid = referred_doc.id
-                phone_number = referred_data.get('phone_number', '')
-                
-                # Skip if already processed from RTDB
-                if phone_number in processed_phones:
-                    continue
-                processed_phones.add(phone_number)
-                
-                # Extract financial data
-                balance = float(referred_data.get('balance', 0.0))
-                total_invested = float(referred_data.get('total_invested', 0.0))
-                total_earnings = float(referred_data.get('total_earnings', 0.0))
-                
-                # Count this referral
-                total_referrals += 1
-                
-                # Check if user is active
-                is_active = balance > 0 or total_invested > 0
-                if is_active:
-                    active_referrals += 1
-                
-                # Add to team totals - ONLY real investments, no fake volume
-                team_volume += total_invested  # Only actual investments, not balance
-                team_earnings += total_earnings
-                
-                # Get display info
-                display_name = referred_data.get('display_name') or referred_data.get('username') or referred_data.get('phone_number', '')
-                date_joined = referred_data.get('date_joined') or referred_data.get('created_at')
-                
-                referrals_list.append({
-                    'uid': referred_uid,
-                    'phone': phone_number,
-                    'display_name': display_name,
-                    'balance': balance,
-                    'total_invested': total_invested,
-                    'total_earnings': total_earnings,
-                    'date_joined': date_joined,
-                    'is_active': is_active
-                })
-                
-                print(f"✅ Added Firestore referral: {phone_number}, Balance: ₱{balance}, Invested: ₱{total_invested}")
-                
-        except Exception as firestore_error:
-            print(f"⚠️ Firestore fallback error: {firestore_error}")
+        totals = team_header(results.get('record'), referral_code)
+        total_referrals = totals['team_size']
+        direct_referrals = totals['direct_referrals']
+        active_referrals = totals['active_referrals']
+        team_volume = totals['team_volume']
         
-        # Calculate referral earnings: ₱15 per confirmed referral
-        referral_earnings = total_referrals * 15.0
-        print(f"💰 Calculated referral earnings: {total_referrals} referrals × ₱15 = ₱{referral_earnings}")
+        # Calculate referral earnings: ₱15 per confirmed direct referral
+        referral_earnings = direct_referrals * 15.0
         
         # Calculate total balance: referral earnings + ₱100 free bonus
         free_bonus = 100.0
         total_balance = referral_earnings + free_bonus
-        print(f"💰 Total balance: ₱{referral_earnings} (referrals) + ₱{free_bonus} (bonus) = ₱{total_balance}")
         
         # 🔥 UPDATE BOTH FIREBASE RTDB AND FIRESTORE with calculated values for persistence
         try:
             # Update Firebase RTDB
-            if current_user_key:
-                rtdb_team_data = {
-                    'referral_code': referral_code,
-                    'total_referrals': total_referrals,
-                    'active_referrals': active_referrals,
-                    'team_volume': team_volume,
-                    'team_earnings': team_earnings,
-                    'referral_earnings': referral_earnings,
-                    'free_bonus': free_bonus,
-                    'balance': total_balance,  # Total withdrawable balance
-                    'last_team_update': firebase_db.ServerValue.TIMESTAMP
-                }
-                
-                # Update user's team stats in RTDB
-                users_ref.child(current_user_key).update(rtdb_team_data)
-                
-                # Also save detailed referrals list
-                users_ref.child(current_user_key).child('team_referrals').set({
-                    f"referral_{i}": ref_data for i, ref_data in enumerate(referrals_list)
-                })
-                
-                print(f"✅ Updated Firebase RTDB team data for {user_phone}")
+            rtdb_team_data = {
+                'referral_code': referral_code,
+                'total_referrals': direct_referrals,
+                'active_referrals': active_referrals,
+                'team_volume': team_volume,
+                'referral_earnings': referral_earnings,
+                'free_bonus': free_bonus,
+                'balance': total_balance,  # Total withdrawable balance
+                'last_team_update': RTDB_SERVER_TIMESTAMP
+            }
+            
+            # Update user's team stats in RTDB
+            get_database_reference(f'users/{firebase_uid}').update(rtdb_team_data)
+            invalidate_paths('rtdb', [f'users/{firebase_uid}'])
             
             # Update Firestore team document
             team_ref = db.collection('teams').document(firebase_uid)
@@ -3088,31 +2763,26 @@ def team(request):
                 'uid': firebase_uid,
                 'phone_number': user_phone,
                 'referral_code': referral_code,
-                'total_referrals': total_referrals,
+                'total_referrals': direct_referrals,
                 'active_referrals': active_referrals,
-                'total_earnings': team_earnings,
                 'team_volume': team_volume,
                 'referral_earnings': referral_earnings,
                 'free_bonus': free_bonus,
                 'total_balance': total_balance,
-                'referrals': referrals_list,
                 'updated_at': firestore.SERVER_TIMESTAMP
             }
             team_ref.set(team_data, merge=True)
-            print(f"✅ Updated Firestore team document")
+            firestore_documents.invalidate(f'teams/{firebase_uid}')
             
         except Exception as team_error:
-            print(f"❌ Error updating team documents: {team_error}")
-        
-        print(f"📊 Firebase Team Final Stats:")
-        print(f"   Referral Code: {referral_code}")
-        print(f"   Total Referrals: {total_referrals}")
-        print(f"   Active Members: {active_referrals}")
-        print(f"   Team Volume: ₱{team_volume} (real investments only)")
-        print(f"   Team Earnings: ₱{team_earnings}")
-        print(f"   Referral Earnings: ₱{referral_earnings} ({total_referrals} × ₱15)")
-        print(f"   Free Bonus: ₱{free_bonus}")
-        print(f"   Total Balance: ₱{total_balance}")
+            logger.warning(f"Error updating team documents: {team_error}")
+        
+        log_event(
+            logger, logging.INFO, 'team.view',
+            firebase_uid=firebase_uid, referral_code=referral_code,
+            total_referrals=total_referrals, active_referrals=active_referrals,
+            team_volume=team_volume, total_balance=total_balance,
+        )
         
         # Set withdrawable balance to total balance (referral earnings + free bonus)
         current_balance = total_balance
@@ -3127,9 +2797,12 @@ def team(request):
             'referral_earnings': referral_earnings,
             'free_bonus': free_bonus,
             'total_balance': total_balance,
-            'recent_referrals': referrals_list,
+            'recent_referrals': first_page,
+            'has_more_referrals': next_cursor is not None,
+            'team_next_cursor': next_cursor or '',
+            'team_sort': team_sort,
+            'team_page_size': TEAM_PAGE_SIZE,
             'team_total_invested': team_volume,
-            'team_total_earnings': team_earnings,
             'referral_link': f"{request.scheme}://{request.get_host()}/register/?ref={referral_code}",
             'firebase_uid': firebase_uid,
             'current_balance': current_balance,
@@ -3138,9 +2811,7 @@ def team(request):
         return render(request, 'myproject/team.html', context)
         
     except Exception as e:
-        print(f"❌ Firebase team error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Firebase team error: {e}")
         
         # Fallback with empty data but still generate referral code
         import random
@@ -3155,10 +2826,52 @@ def team(request):
             'referral_earnings': 0.0,
             'recent_referrals': [],
             'team_total_invested': 0.0,
-            'team_total_earnings': 0.0,
             'referral_link': f"{request.scheme}://{request.get_host()}/register/?ref={fallback_referral_code}",
         }
         return render(request, 'myproject/team.html', context)
+
+
+@require_GET
+@firebase_login_required
+def team_members_api(request):
+    """JSON pages of the current user's team members for the team page's "load more" list"""
+    try:
+        page_size = int(request.GET.get('page_size', TEAM_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid page'}, status=400)
+    sort = request.GET.get('sort', DEFAULT_TEAM_SORT)
+    if sort not in TEAM_SORTS:
+        sort = DEFAULT_TEAM_SORT
+    cursor = request.GET.get('cursor') or None
+    
+    try:
+        profile = firestore_documents.get(f'profiles/{request.firebase_user.firebase_key}')
+        referral_code = (profile or {}).get('referral_code')
+        page_members, next_cursor = team_page(referral_code, sort, cursor, page_size)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid page'}, status=400)
+    except Exception as e:
+        logger.error(f"Team members API error: {e}")
+        return JsonResponse({'success': False, 'error': 'Team members are unavailable'}, status=503)
+    
+    return JsonResponse({
+        'success': True,
+        'sort': sort,
+        'has_next': next_cursor is not None,
+        'next_cursor': next_cursor,
+        'members': [
+            {
+                'uid': member['uid'],
+                'display_name': member.get('display_name') or member['phone'],
+                'date_joined': member['date_joined'],
+                'joined_display': member['joined_display'],
+                'total_invested': member['total_invested'],
+                'is_active': member['is_active'],
+            }
+            for member in page_members
+        ],
+    })
+
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
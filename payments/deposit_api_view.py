@@ -13,12 +13,15 @@ from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.views import View
+from myproject.ratelimit import rate_limit
+
 from .la2568_service import la2568_service
 
 logger = logging.getLogger(__name__)
 
 
 @csrf_exempt
+@rate_limit('payment')
 @require_http_methods(["POST"])
 @login_required
 def create_deposit_api(request):
@@ -7,12 +7,13 @@ import hashlib
 import requests
 import logging
 import time
-import json
 from decimal import Decimal
 from typing import Dict, Optional, Any, Tuple
 from django.conf import settings
 from django.utils import timezone
 
+from myproject.structured_logging import log_event
+
 logger = logging.getLogger(__name__)
 
 
@@ -32,9 +33,7 @@ class LA2568PaymentService:
         self.timeout = self.config.get('TIMEOUT', 30)
         self.max_retries = self.config.get('MAX_RETRIES', 3)
         
-        logger.info(f"LA2568 Service initialized with merchant: {self.merchant_id} (length: {len(self.merchant_id)})")
-        logger.info(f"LA2568 Secret key: {self.secret_key[:20]}...")
-        logger.info(f"LA2568 Base URL: {self.base_url}")
+        log_event(logger, logging.DEBUG, 'la2568.init', merchant=self.merchant_id, base_url=self.base_url)
     
     def generate_signature(self, params: Dict[str, Any]) -> str:
         """
@@ -69,9 +68,7 @@ class LA2568PaymentService:
             # Generate MD5 hash and return uppercase
             signature = hashlib.md5(sign_string.encode('utf-8')).hexdigest().upper()
             
-            logger.debug(f"Generated signature for: {query_string}")
-            logger.debug(f"Sign string: {sign_string}")
-            logger.debug(f"Signature: {signature}")
+            log_event(logger, logging.DEBUG, 'la2568.signature', query=query_string)
             return signature
             
         except Exception as e:
@@ -98,8 +95,7 @@ class LA2568PaymentService:
                 signature = self.generate_signature(params)
                 params['sign'] = signature
                 
-                logger.info(f"LA2568 API Request (attempt {attempt + 1}): {url}")
-                logger.debug(f"Request params: {json.dumps(params, indent=2)}")
+                log_event(logger, logging.INFO, 'la2568.request', url=url, attempt=attempt + 1, order_id=params.get('order_id'))
                 
                 # Make request with form data (LA2568 expects application/x-www-form-urlencoded)
                 response = requests.post(
@@ -126,7 +122,7 @@ class LA2568PaymentService:
                         'raw_response': response.text
                     }
                 
-                logger.info(f"LA2568 API Response: {json.dumps(result, indent=2)}")
+                log_event(logger, logging.INFO, 'la2568.response', url=url, status=result.get('status'), result=result)
                 return result
                 
             except requests.exceptions.Timeout:
@@ -206,12 +202,11 @@ class LA2568PaymentService:
                 'return_url': return_url
             }
             
-            logger.info(f"🔥 LA2568 API Call: /api/deposit")
-            logger.info(f"   merchant: {params['merchant']}")
-            logger.info(f"   payment_type: {params['payment_type']}")
-            logger.info(f"   amount: {params['amount']}")
-            logger.info(f"   order_id: {params['order_id']}")
-            logger.info(f"   bank_code: {params['bank_code']}")
+            log_event(
+                logger, logging.INFO, 'la2568.deposit',
+                payment_type=params['payment_type'], amount=params['amount'],
+                order_id=order_id, bank_code=bank_code,
+            )
             
             # Make API request
             result = self.make_api_request('/api/deposit', params)
@@ -244,8 +239,10 @@ class LA2568PaymentService:
                 status_code = result.get('status', 'unknown')
                 
                 # Log detailed error information for debugging
-                logger.error(f"❌ LA2568 deposit failed - Status: {status_code}, Message: {error_msg}")
-                logger.error(f"Full response: {json.dumps(result, indent=2)}")
+                log_event(
+                    logger, logging.ERROR, 'la2568.deposit_failed',
+                    order_id=order_id, status=status_code, message=error_msg, result=result,
+                )
                 
                 # Detect specific conditions that indicate primary channel unavailability
                 primary_channel_unavailable_indicators = [
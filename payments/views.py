@@ -18,6 +18,8 @@ from django.db.models import Sum, Q
 from django.db import transaction as db_transaction
 from .models import Transaction as PaymentTransaction, PaymentLog
 from myproject.models import UserProfile, Transaction as InvestmentTransaction
+from myproject.ratelimit import rate_limit
+from myproject.structured_logging import log_event
 
 logger = logging.getLogger(__name__)
 
@@ -167,6 +169,7 @@ class GalaxyPaymentService:
 # Initialize Galaxy service
 galaxy_service = GalaxyPaymentService()
 
+@rate_limit('payment')
 @firebase_login_required
 def deposit_view(request):
     """Fixed deposit view with proper Galaxy API integration"""
@@ -191,7 +194,7 @@ def deposit_view(request):
                     email=request.firebase_user.email or '',
                     first_name=request.firebase_user.display_name or ''
                 )
-                print(f"✅ Created Django user for Firebase user: {user_phone}")
+                log_event(logger, logging.INFO, 'payments.user_created', phone=user_phone)
         else:
             messages.error(request, 'Authentication error. Please log in again.')
             return redirect('login')
@@ -217,7 +220,7 @@ def deposit_view(request):
             )
             profile.registration_bonus_claimed = True
             profile.save()
-            print(f"✅ Created UserProfile with ₱100 bonus for: {user_phone}")
+            log_event(logger, logging.INFO, 'payments.profile_created', phone=user_phone)
         else:
             # Check if existing user needs registration bonus
             if not getattr(profile, 'registration_bonus_claimed', False) and profile.balance == Decimal('0.00'):
@@ -235,12 +238,11 @@ def deposit_view(request):
                     amount=Decimal('100.00'),
                     description='Welcome bonus for new registration'
                 )
-                print(f"✅ Added ₱100 bonus to existing user: {user_phone}")
+                log_event(logger, logging.INFO, 'payments.bonus_added', phone=user_phone)
         
-        print(f"💰 Current user balance: ₱{profile.balance}")
 
     except Exception as profile_error:
-        print(f"❌ Error getting user profile: {profile_error}")
+        logger.error(f"Error getting user profile: {profile_error}")
         messages.error(request, 'Unable to access your profile. Please try again.')
         return redirect('dashboard')
 
@@ -250,7 +252,7 @@ def deposit_view(request):
             transaction_type='deposit'
         ).order_by('-created_at')[:5]
     except Exception as e:
-        print(f"⚠️ Error getting recent deposits: {e}")
+        logger.warning(f"Error getting recent deposits: {e}")
         recent_deposits = []
 
     payment_methods = {
@@ -365,7 +367,7 @@ def deposit_view(request):
                     return_url=return_url
                 )
                 
-                logger.info(f"Galaxy API response: {json.dumps(api_result, indent=2, default=str)}")
+                log_event(logger, logging.INFO, 'payments.galaxy_response', order_id=reference_id, result=api_result)
                 
                 # Process Galaxy API response
                 if api_result.get("status") == "1":  # Success
@@ -460,14 +462,14 @@ def deposit_view(request):
         profile.balance = Decimal(str(total_balance))
         profile.save()
         
-        print(f"💰 Smart Deposit balance calculation:")
-        print(f"   Confirmed referrals: {confirmed_referrals}")
-        print(f"   Referral earnings: ₱{referral_earnings}")
-        print(f"   Free bonus: ₱{free_bonus}")
-        print(f"   Total balance: ₱{total_balance}")
+        log_event(
+            logger, logging.DEBUG, 'deposit.balance',
+            confirmed_referrals=confirmed_referrals, referral_earnings=referral_earnings,
+            free_bonus=free_bonus, total_balance=total_balance,
+        )
         
     except Exception as balance_error:
-        print(f"⚠️ Error calculating balance: {balance_error}")
+        logger.warning(f"Error calculating balance: {balance_error}")
 
     return render(request, 'myproject/deposit.html', {
         'profile': profile,
@@ -943,6 +945,7 @@ def verify_with_galaxy_api(order_id, payment_method, amount):
             'error_code': 'NETWORK_ERROR'
         }
 
+@rate_limit('payment')
 @firebase_login_required
 def withdraw_view(request):
     """Withdraw view for users to request withdrawals"""
@@ -967,7 +970,7 @@ def withdraw_view(request):
                     email=request.firebase_user.email or '',
                     first_name=request.firebase_user.display_name or ''
                 )
-                print(f"✅ Created Django user for Firebase user: {user_phone}")
+                log_event(logger, logging.INFO, 'payments.user_created', phone=user_phone)
         else:
             messages.error(request, 'Authentication error. Please log in again.')
             return redirect('login')
@@ -993,7 +996,7 @@ def withdraw_view(request):
             )
             profile.registration_bonus_claimed = True
             profile.save()
-            print(f"✅ Created UserProfile with ₱100 bonus for: {user_phone}")
+            log_event(logger, logging.INFO, 'payments.profile_created', phone=user_phone)
         else:
             # Check if existing user needs registration bonus
             if not getattr(profile, 'registration_bonus_claimed', False) and profile.balance == Decimal('0.00'):
@@ -1011,9 +1014,8 @@ def withdraw_view(request):
                     amount=Decimal('100.00'),
                     description='Welcome bonus for new registration'
                 )
-                print(f"✅ Added ₱100 bonus to existing user: {user_phone}")
+                log_event(logger, logging.INFO, 'payments.bonus_added', phone=user_phone)
         
-        print(f"💰 Current user balance: ₱{profile.balance}")
 
         # 🔥 CALCULATE REFERRAL EARNINGS: ₱15 per confirmed referral
         referral_earnings = Decimal('0.00')
@@ -1025,12 +1027,8 @@ def withdraw_view(request):
             confirmed_referrals = ReferralCommission.objects.filter(referrer=user_for_profile).count()
             referral_earnings = Decimal(str(confirmed_referrals * 15))  # ₱15 per referral
             
-            print(f"💰 Confirmed referrals: {confirmed_referrals}")
-            print(f"💰 Referral earnings: ₱{referral_earnings} ({confirmed_referrals} × ₱15)")
-            print(f"💰 Free bonus: ₱{free_bonus}")
-            
         except Exception as ref_error:
-            print(f"⚠️ Error calculating referral earnings: {ref_error}")
+            logger.warning(f"Error calculating referral earnings: {ref_error}")
         
         # Calculate total withdrawable amount:
         # - Main balance (should be 0 initially, will be set to total)
@@ -1039,14 +1037,14 @@ def withdraw_view(request):
         main_balance = profile.balance - referral_earnings - free_bonus if profile.balance >= (referral_earnings + free_bonus) else Decimal('0.00')
         total_withdrawable = referral_earnings + free_bonus + main_balance
         
-        print(f"💰 Balance breakdown:")
-        print(f"   Main Balance: ₱{main_balance}")
-        print(f"   Referral Earnings: ₱{referral_earnings}")
-        print(f"   Free Bonus: ₱{free_bonus}")
-        print(f"   Total Withdrawable: ₱{total_withdrawable}")
+        log_event(
+            logger, logging.DEBUG, 'withdraw.balance',
+            main_balance=main_balance, referral_earnings=referral_earnings,
+            free_bonus=free_bonus, total_withdrawable=total_withdrawable,
+        )
 
     except Exception as profile_error:
-        print(f"❌ Error getting user profile: {profile_error}")
+        logger.error(f"Error getting user profile: {profile_error}")
         messages.error(request, 'Unable to access your profile. Please try again.')
         return redirect('dashboard')
 
@@ -1056,7 +1054,7 @@ def withdraw_view(request):
             transaction_type='withdrawal'
         ).order_by('-created_at')[:5]
     except Exception as e:
-        print(f"⚠️ Error getting recent withdrawals: {e}")
+        logger.warning(f"Error getting recent withdrawals: {e}")
         recent_withdrawals = []
 
     if request.method == "POST":
@@ -1,2 +1,2 @@
 #!/bin/bash
-gunicorn investmentdb.wsgi:application
+gunicorn investmentdb.wsgi:application --preload